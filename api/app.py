@@ -1,8 +1,25 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Query, WebSocket
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from server.server import start_server, stop_server, is_server_running
-from server.client_handler import clients_with_names, get_communication_messages
-from typing import List, Dict
+from server.server import start_server, stop_server, get_server_state
+from server.client_handler import (
+    get_clients_status,
+    get_communication_messages,
+    get_communication_head,
+)
+from server.events import event_broadcaster
+from server.journal import message_journal
+from server.response_cache import response_cache
+from server.result_spool import result_spool
+from server.worker_pool import worker_pool
+from server.dispatcher import device_dispatcher
+from database.sqlconnection import db_pool, db_breaker
+from database.patient_cache import patient_info_cache
+from database.worklist import worklist
+from database.result_writer import result_writer
+from log.log_config import get_logging_stats
+from typing import List, Dict, Optional
 
 
 app = FastAPI()
@@ -12,9 +29,124 @@ app = FastAPI()
 class ServerStatus(BaseModel):
     state: str
     text: str
+    lifecycle: str = Field(..., description="Server lifecycle (stopped/starting/running/stopping)")
     clients: dict
 
+class WorkerPoolStatus(BaseModel):
+    running: bool
+    workers: int = Field(..., description="Number of worker threads")
+    queue_size: int = Field(..., description="Messages allowed to wait for a worker")
+    active: int = Field(..., description="Messages being processed")
+    queued: int = Field(..., description="Messages waiting for a worker")
+    completed: int
+    failed: int
+    rejected: int = Field(..., description="Messages dropped because the queue was full")
+    timed_out: int
+
+class DeviceQueueStatus(BaseModel):
+    queued: int = Field(..., description="Messages of the device waiting to be processed")
+    processed: int
+    paused: int = Field(..., description="Times the reads paused because the queue was full")
+    failed: bool = Field(..., description="Sending a response failed, the connection is closing")
+
+class DatabasePoolStatus(BaseModel):
+    min_size: int
+    max_size: int
+    size: int = Field(..., description="Open connections")
+    idle: int
+    in_use: int
+    checkouts: int
+    created: int
+    closed: int
+    broken: int = Field(..., description="Connections dropped after a failure")
+    evicted: int = Field(..., description="Connections closed after being idle")
+    timeouts: int = Field(..., description="Checkouts that found no free connection")
+    wait_time_avg_ms: float
+    wait_time_max_ms: float
+
+class LoggingStatus(BaseModel):
+    queued: int = Field(..., description="Records waiting to be written")
+    queue_size: int
+    dropped: int = Field(..., description="Records dropped because the queue was full")
+
+class JournalStatus(BaseModel):
+    open: bool
+    segment: int = Field(..., description="Segment file being written")
+    pending: int = Field(..., description="Journaled messages not accepted yet")
+    written: int
+    syncs: int = Field(..., description="fsync calls, each covering a batch of records")
+    deleted_segments: int
+
+class ResponseCacheStatus(BaseModel):
+    size: int = Field(..., description="Responses cached")
+    max_size: int
+    ttl: float = Field(..., description="Seconds a response is kept")
+    hits: int = Field(..., description="Retransmitted messages answered from the cache")
+    misses: int
+    hit_ratio: float
+    evictions: int
+    expirations: int
+    in_flight: int = Field(..., description="Cached message types being processed")
+    joined: int = Field(..., description="Copies that waited for the copy being processed")
+
+class PatientInfoCacheStatus(BaseModel):
+    size: int = Field(..., description="Patients cached")
+    max_size: int
+    ttl: float = Field(..., description="Seconds a patient info is kept")
+    hits: int = Field(..., description="Sample queries answered without the database")
+    misses: int
+    hit_ratio: float
+    evictions: int
+    expirations: int
+    invalidations: int = Field(..., description="Patients dropped because a result was written")
+
+class WorklistStatus(BaseModel):
+    loaded: bool
+    size: int = Field(..., description="Pending tests in memory")
+    watermark: Optional[str] = Field(None, description="Newest request date loaded")
+    hits: int = Field(..., description="Sample queries answered from the worklist")
+    misses: int
+    hit_ratio: float
+    refreshes: int
+    failures: int = Field(..., description="Loads and refreshes that failed")
+    invalidations: int = Field(..., description="Patients dropped because a result was written")
+
+class ResultWriterStatus(BaseModel):
+    running: bool = Field(..., description="Results are written behind in batches")
+    ack_mode: str = Field(..., description="Results acknowledged after commit or after journal")
+    queued: int = Field(..., description="Results waiting for the next batch")
+    batches: int = Field(..., description="Transactions committed")
+    rows: int = Field(..., description="Results written")
+    failed: int
+    retrying: bool = Field(..., description="A batch waits for the database to be back")
+    retries: int
+    largest_batch: int
+    average_batch: float
+
+class DatabaseBreakerStatus(BaseModel):
+    state: str = Field(..., description="Circuit breaker state (closed/open/half_open)")
+    failures: int = Field(..., description="Consecutive connection failures")
+    failure_threshold: int
+    reset_timeout: float = Field(..., description="Seconds the breaker stays open before a retry")
+    trips: int = Field(..., description="Times the breaker opened")
+    rejected: int = Field(..., description="Database calls failed fast while open")
+
+class ResultSpoolStatus(BaseModel):
+    open: bool
+    pending: int = Field(..., description="Spooled results waiting for the database")
+    spooled: int
+    drained: int = Field(..., description="Spooled results written once the database was back")
+    rejected: int = Field(..., description="Spooled results not accepted when replayed")
+
+class SpooledResult(BaseModel):
+    id: int = Field(..., description="Spool id")
+    msg_id: Optional[str] = Field(None, description="MSH-10 message control id")
+    sender: str = Field(..., description="MSH-3 and MSH-4 of the analyzer")
+    created: Optional[str] = Field(None, description="When the result was spooled")
+    message: str
+
 class CommunicationMessage(BaseModel):
+    seq: int = Field(..., description="Increasing message sequence id")
     timestamp: str
     client_name: str = Field(..., description="Client identifier or name")
     client_address: str = Field(..., description="Client identifier or name")
@@ -24,6 +156,7 @@ class CommunicationMessage(BaseModel):
     class Config:
         json_schema_extra = {
             "example": {
+                "seq": 42,
                 "timestamp": "2024-01-01T12:00:00",
                 "client_name": "Device1",
                 "client_address": "Device_ip",
@@ -32,33 +165,133 @@ class CommunicationMessage(BaseModel):
             }
         }
 
+class CommunicationFeed(BaseModel):
+    head: int = Field(..., description="Sequence id of the newest message returned or stored, pass it as since on the next call")
+    messages: List[CommunicationMessage]
+
 # Endpoint to get server status
 @app.get("/server/status", response_model=ServerStatus)
 async def get_server_status():
-    state = "Online" if is_server_running() else "Offline"
-    text = "Server is running" if state == "Online" else "Server is offline"
-    clients = clients_with_names
-    return ServerStatus(state=state, text=text, clients=clients)
-
-# Endpoint to get communication messages
-@app.get("/server/messages", response_model=List[CommunicationMessage])
-async def get_messages():
-    messages = get_communication_messages()
+    return ServerStatus(**get_server_state(), clients=get_clients_status())
+
+# Endpoint to get the message worker pool state
+@app.get("/server/workers", response_model=WorkerPoolStatus)
+async def get_worker_pool_status():
+    return WorkerPoolStatus(**worker_pool.stats())
+
+# Endpoint to get the message queue of every connected device, keyed by "ip,port"
+@app.get("/server/devices", response_model=Dict[str, DeviceQueueStatus])
+async def get_device_queues_status():
+    return device_dispatcher.stats()
+
+# Endpoint to get the database connection pool state
+@app.get("/database/pool", response_model=DatabasePoolStatus)
+async def get_database_pool_status():
+    return DatabasePoolStatus(**db_pool.stats())
+
+# Endpoint to get the inbound message journal state
+@app.get("/server/journal", response_model=JournalStatus)
+async def get_journal_status():
+    return JournalStatus(**message_journal.stats())
+
+# Endpoint to get the counters of the response cache for retransmitted messages
+@app.get("/server/cache", response_model=ResponseCacheStatus)
+async def get_response_cache_status():
+    return ResponseCacheStatus(**response_cache.stats())
+
+# Endpoint to get the counters of the patient info cache for the sample queries
+@app.get("/database/cache", response_model=PatientInfoCacheStatus)
+async def get_patient_info_cache_status():
+    return PatientInfoCacheStatus(**patient_info_cache.stats())
+
+# Endpoint to get the state of the worklist preloaded for the sample queries
+@app.get("/database/worklist", response_model=WorklistStatus)
+async def get_worklist_status():
+    return WorklistStatus(**worklist.stats())
+
+# Endpoint to get the state of the write-behind result writer
+@app.get("/database/writer", response_model=ResultWriterStatus)
+async def get_result_writer_status():
+    return ResultWriterStatus(**result_writer.stats())
+
+# Endpoint to get the state of the database circuit breaker
+@app.get("/database/breaker", response_model=DatabaseBreakerStatus)
+async def get_database_breaker_status():
+    return DatabaseBreakerStatus(**db_breaker.stats())
+
+# Endpoint to get the state of the results spooled while the database is down
+@app.get("/server/spool", response_model=ResultSpoolStatus)
+async def get_result_spool_status():
+    return ResultSpoolStatus(**result_spool.stats())
+
+# Endpoint to list the spooled results acknowledged with AA but rejected when written
+@app.get("/server/spool/rejected", response_model=List[SpooledResult])
+async def get_rejected_spooled_results(limit: int = Query(100, ge=1)):
+    return result_spool.rejected_messages(limit)
+
+# Endpoint to get the log queue state
+@app.get("/server/logging", response_model=LoggingStatus)
+async def get_logging_status():
+    return LoggingStatus(**get_logging_stats())
+
+# Endpoint to get the communication messages newer than the since sequence id
+@app.get("/server/messages", response_model=CommunicationFeed)
+async def get_messages(since: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1)):
+    messages, head = get_communication_messages(since, limit)
     # Ensure all messages have valid client names
     for msg in messages:
         if msg["client_address"] is None:
             msg["client_address"] = "Unknown Client"
-    return messages
+    return CommunicationFeed(head=head, messages=messages)
+
+# WebSocket pushing the server, clients and message events as they happen
+@app.websocket("/ws/events")
+async def events_websocket(websocket: WebSocket):
+    await websocket.accept()
+    queue = event_broadcaster.subscribe()
+
+    async def send_events():
+        # Start with the current state, the events then report the changes
+        status = {
+            **get_server_state(),
+            "clients": get_clients_status(),
+            "head": get_communication_head(),
+        }
+        await websocket.send_json({"type": "status", "data": status})
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def receive_until_closed():
+        # The client sends nothing, receiving only detects the disconnection
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_until_closed())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.exception()  # The connection closed, a failed send or WebSocketDisconnect ends it
+    finally:
+        for task in tasks:
+            task.cancel()
+        event_broadcaster.unsubscribe(queue)
 
 # Endpoint to start the server
+# Returns once the socket is bound, a failed start (e.g. busy port) is reported as 409
 @app.post("/server/start")
 async def start_server_api():
-    await start_server()  # Start the server
-    return {"message": "Server started successfully."}
+    started, message = await start_server()  # Start the server in the background
+    return JSONResponse(
+        status_code=200 if started else 409,
+        content={"message": message, **get_server_state()},
+    )
 
 # Endpoint to stop the server
 @app.post("/server/stop")
 async def stop_server_api():
-    await stop_server()  # Stop the server
-    return {"message": "Server stopped successfully."}
+    stopped, message = await stop_server()  # Stop the server
+    return JSONResponse(
+        status_code=200 if stopped else 409,
+        content={"message": message, **get_server_state()},
+    )
 
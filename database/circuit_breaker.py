@@ -0,0 +1,130 @@
+import time
+from threading import Lock
+from log.logger import log_info, log_warning
+
+
+# Define the source for logging purposes
+SOURCE = "Database"
+
+BREAKER_CLOSED = "closed"  # The database is used normally
+BREAKER_OPEN = "open"  # The database is considered down, calls fail fast
+BREAKER_HALF_OPEN = "half_open"  # One call is let through to probe the database
+
+
+class DatabaseUnavailableError(ConnectionError):
+    """
+    Raised when the database cannot be reached, or is not tried because the
+    circuit breaker is open after repeated failures.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fails the database calls fast while the database is down.
+
+    After `failure_threshold` consecutive connection failures the breaker opens and
+    `check` raises DatabaseUnavailableError immediately instead of waiting through
+    another connect timeout. After `reset_timeout` seconds a single call is let
+    through: its success closes the breaker, its failure opens it again.
+
+    Example:
+        db_breaker.check()  # Raises DatabaseUnavailableError while open
+        try:
+            connection = connect()
+        except Exception:
+            db_breaker.record_failure()
+            raise
+        db_breaker.record_success()
+    """
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self._lock = Lock()
+        self.state = BREAKER_CLOSED
+        self._failures = 0  # Consecutive failures
+        self._opened_at = None
+        self._probing = False  # A half open probe call is in progress
+
+        self.trips = 0
+        self.rejected = 0
+
+    def is_available(self):
+        """
+        Returns True if a call would be let through now, without reserving the probe.
+        """
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            return not self._probing and self.clock() - self._opened_at >= self.reset_timeout
+
+    def check(self, probe=True):
+        """
+        Lets a call through, or raises DatabaseUnavailableError while the breaker is open.
+
+        Args:
+            probe (bool): Reserve the half open probe once `reset_timeout` has passed, the
+                caller must then report its outcome. Without it the call is only let
+                through, e.g. to reuse an already open connection.
+        """
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return
+
+            if not self._probing and self.clock() - self._opened_at >= self.reset_timeout:
+                if probe:
+                    self.state = BREAKER_HALF_OPEN
+                    self._probing = True
+                return
+
+            self.rejected += 1
+            retry_in = max(self.reset_timeout - (self.clock() - self._opened_at), 0)
+
+        raise DatabaseUnavailableError(f"Database unavailable, retrying in {retry_in:.0f} s.")
+
+    def record_success(self):
+        if self.state == BREAKER_CLOSED and not self._failures:
+            return  # Nothing to reset, skips the lock on every query
+
+        with self._lock:
+            closed = self.state != BREAKER_CLOSED
+            self.state = BREAKER_CLOSED
+            self._failures = 0
+            self._probing = False
+
+        if closed:
+            log_info("Database reachable again, circuit breaker closed.", source=SOURCE)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            opened = self.state == BREAKER_HALF_OPEN or (
+                self.state == BREAKER_CLOSED and self._failures >= self.failure_threshold
+            )
+            if opened:
+                self.state = BREAKER_OPEN
+                self._opened_at = self.clock()
+                self._probing = False
+                self.trips += 1
+
+        if opened:
+            log_warning(
+                f"Database unreachable after ({self._failures}) failures, failing fast for ({self.reset_timeout}) s.",
+                source=SOURCE,
+            )
+
+    def stats(self):
+        """
+        Returns the breaker state and counters.
+        """
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout": self.reset_timeout,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
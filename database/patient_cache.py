@@ -0,0 +1,83 @@
+from threading import Lock
+from cache.ttl_cache import TTLCache
+from setting.config import get_config
+
+
+class PatientInfoCache:
+    """
+    Patient info of the recently queried samples, keyed by patient id.
+
+    Analyzers query the same sample again on a rerun or a rack rescan, the cached
+    info (already translated to the HL7 values) answers those queries without the
+    database. The entry of a patient is dropped when a result is written for it.
+    Only patients found in the database are cached.
+
+    Example:
+        patient_info = patient_info_cache.lookup(patient_id, load_patient_info)
+    """
+
+    def __init__(self, max_size, ttl):
+        self._cache = TTLCache(max_size, ttl)
+        self._lock = Lock()
+        self._generation = 0  # Increased by each invalidation
+        self.invalidations = 0
+
+    def lookup(self, patient_id, load):
+        """
+        Returns the patient info from the cache, or loads and caches it.
+
+        Args:
+            patient_id: The patient id (ORC-3 / PID-3).
+            load (function): Called with no argument on a miss, returns the patient info
+                dict or None if the patient is not found.
+
+        Returns:
+            dict: A copy of the patient info the caller may modify, or None.
+        """
+        key = str(patient_id)
+
+        patient_info = self._cache.get(key)
+        if patient_info is not None:
+            return dict(patient_info)
+
+        generation = self._generation
+        patient_info = load()
+
+        if patient_info and type(patient_info) == dict:
+            with self._lock:
+                # Not cached if the patient was invalidated while it was being loaded
+                if generation == self._generation:
+                    self._cache.put(key, dict(patient_info))
+
+        return patient_info
+
+    def invalidate(self, patient_id):
+        """
+        Drops the cached info of a patient, e.g. after a result was written for it.
+        """
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._cache.pop(str(patient_id))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+    def stats(self):
+        """
+        Returns the cache counters and the invalidations by written results.
+        """
+        stats = self._cache.stats()
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+cfg = get_config()  # Load configuration from file
+
+# Shared cache of the patient info answered to the ORM^O01 sample queries
+patient_info_cache = PatientInfoCache(
+    cfg["PATIENT_INFO_CACHE_SIZE"],
+    cfg["PATIENT_INFO_CACHE_TTL"],
+)
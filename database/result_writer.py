@@ -0,0 +1,356 @@
+import queue
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from threading import Event, Lock, Thread
+from log.logger import log_info, log_error, log_warning
+from database.sqlconnection import db_pool, db_breaker, get_db_backend
+from database.circuit_breaker import DatabaseUnavailableError
+from setting.config import get_config
+
+
+# Define the source for logging purposes
+SOURCE = "Database"
+
+# When a result is acknowledged to the analyzer in write-behind mode
+ACK_AFTER_COMMIT = "commit"  # Once its batch is committed, AE if the write failed
+ACK_AFTER_JOURNAL = "journal"  # Once it is journaled and queued, before it is written
+ACK_MODES = (ACK_AFTER_COMMIT, ACK_AFTER_JOURNAL)
+
+
+class ResultWriter:
+    """
+    Write-behind queue for the result upserts.
+
+    The workers queue the statement of a result instead of running it. A writer
+    thread groups the queued results into batches of up to `batch_size` rows, or
+    what arrived within `batch_interval` seconds of the first one when acknowledged
+    after journal, and writes each batch with executemany in a single transaction
+    (fast_executemany on pyodbc).
+    Consecutive results built with the same SQL text share an executemany call,
+    so the results are written in the order they were queued.
+
+    When acknowledged after journal, the analyzer already got its AA: a batch that
+    fails because the database is unavailable is retried every `retry_interval`
+    seconds, holding back the later results, until it is written or the writer
+    stops. After commit the batch fails at once and the analyzer gets an AE.
+
+    Example:
+        committed = result_writer.submit(sql, values)
+        committed.result()  # True once committed, False if the write failed
+    """
+
+    def __init__(self, batch_size, batch_interval, ack_mode, retry_interval):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.ack_mode = ack_mode
+        self.retry_interval = retry_interval
+
+        self._queue = None
+        self._thread = None
+        self._lock = Lock()
+        self._stopping = Event()
+        self.is_retrying = False  # A batch waits for the database to be back
+
+        self.batches = 0
+        self.rows = 0
+        self.failed = 0
+        self.retries = 0
+        self.largest_batch = 0
+
+    @property
+    def is_running(self):
+        return self._thread is not None
+
+    def start(self, batch_size=None, batch_interval=None, ack_mode=None):
+        """
+        Starts the writer thread, optionally with new settings.
+        """
+        if self.is_running:
+            return
+
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if batch_interval is not None:
+            self.batch_interval = batch_interval
+        if ack_mode is not None:
+            self.ack_mode = ack_mode
+
+        self._stopping.clear()
+        self._queue = queue.Queue()
+        self._thread = Thread(target=self._writer, args=(self._queue,), name="ResultWriter", daemon=True)
+        self._thread.start()
+
+        log_info(
+            f"Result writer started, batches of ({self.batch_size}) rows every ({self.batch_interval * 1000:.0f}) ms,"
+            f" acknowledged after {self.ack_mode}.",
+            source=SOURCE,
+        )
+
+    def stop(self):
+        """
+        Writes the queued results and stops the writer thread.
+        """
+        if not self.is_running:
+            return
+
+        with self._lock:
+            # No submit can queue on it after this, see submit
+            result_queue = self._queue
+            self._queue = None
+
+        self._stopping.set()  # Ends a retry, the journal replays those results on the next start
+        result_queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+        # Statements queued while the writer was stopping
+        while True:
+            try:
+                item = result_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._write_row(item)
+
+        log_info("Result writer stopped.", source=SOURCE)
+
+    def submit(self, sql, values):
+        """
+        Queues a statement to be written with the next batch.
+
+        Args:
+            sql (str): The statement, see data_upsert_statement_for.
+            values (tuple): The statement parameters.
+
+        Returns:
+            concurrent.futures.Future: Set to True once the statement is committed,
+            False if it failed. None if the writer is not running.
+        """
+        future = Future()
+
+        # Under the lock, so stop does not take the queue between the check and the put
+        with self._lock:
+            if self._queue is None:
+                return None
+            self._queue.put((sql, values, future))
+
+        return future
+
+    def stats(self):
+        """
+        Returns the queue length and the batch counters.
+        """
+        with self._lock:
+            return {
+                "running": self.is_running,
+                "ack_mode": self.ack_mode,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "batches": self.batches,
+                "rows": self.rows,
+                "failed": self.failed,
+                "retrying": self.is_retrying,
+                "retries": self.retries,
+                "largest_batch": self.largest_batch,
+                "average_batch": self.rows / self.batches if self.batches else 0.0,
+            }
+
+    def _writer(self, result_queue):
+        """
+        Writer thread, collects the queued statements into batches and writes them.
+        """
+        running = True
+
+        while running:
+            batch = [result_queue.get()]
+
+            # The workers wait for their result to be committed after commit, lingering would
+            # only delay them: the results queued while a batch is written form the next one
+            linger = self.batch_interval if self.ack_mode == ACK_AFTER_JOURNAL else 0
+            deadline = time.monotonic() + linger
+
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(result_queue.get(timeout=timeout) if timeout > 0 else result_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+
+            if batch:
+                self._write_with_retry(batch)
+
+    def _write_with_retry(self, batch):
+        """
+        Writes a batch, retrying it while the database is unavailable when acknowledged after journal.
+        """
+        while not self._write_batch(batch):
+            if self.ack_mode != ACK_AFTER_JOURNAL or self._stopping.is_set():
+                self.is_retrying = False
+                self._fail(batch)
+                return
+
+            if not self.is_retrying:
+                log_warning(
+                    f"Database unavailable, retrying ({len(batch)}) acknowledged results every ({self.retry_interval}) s.",
+                    source=SOURCE,
+                )
+            self.is_retrying = True
+            with self._lock:
+                self.retries += 1
+            self._stopping.wait(self.retry_interval)
+
+        if self.is_retrying:
+            self.is_retrying = False
+            log_info(f"Database back, ({len(batch)}) held results written.", source=SOURCE)
+
+    def _write_batch(self, batch):
+        """
+        Writes a batch in one transaction. If it fails, each row is written on its own
+        so one bad row does not fail the rest of the batch.
+
+        Returns:
+            bool: False if nothing was written because the database is unavailable.
+        """
+        written = False
+        unavailable = False
+        runs = self._runs(batch)
+
+        try:
+            with db_pool.connection() as connection:
+                try:
+                    for sql, rows in runs:
+                        cursor = connection.statement_cursor(sql)
+                        if hasattr(cursor, "fast_executemany"):
+                            cursor.fast_executemany = True  # pyodbc sends the rows in one round trip
+                        cursor.executemany(sql, rows)
+                    connection.commit()
+                    written = True
+                except Exception as e:
+                    log_error(f"Error writing a batch of ({len(batch)}) results: {e}", source=SOURCE)
+                    for sql, _ in runs:
+                        connection.discard_statement_cursor(sql)  # Do not reuse a cursor that failed
+                    unavailable = self._is_unavailable(e)
+                    if unavailable:
+                        connection.mark_broken()
+                    else:
+                        connection.rollback()
+        except Exception as e:
+            unavailable = unavailable or isinstance(e, DatabaseUnavailableError)
+            log_error(f"Error writing a batch of ({len(batch)}) results: {e}", source=SOURCE)
+
+        if not written:
+            if unavailable:
+                return False  # Writing the rows one by one would fail the same way
+
+            for item in batch:
+                self._write_row(item)
+            return True
+
+        with self._lock:
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+        for _, _, future in batch:
+            future.set_result(True)
+        return True
+
+    def _fail(self, batch):
+        """
+        Fails the results of a batch that could not be written.
+        """
+        with self._lock:
+            self.failed += len(batch)
+
+        for _, _, future in batch:
+            future.set_result(False)
+
+    @staticmethod
+    def _is_unavailable(error):
+        """
+        Returns True if a write error means the database could not be reached.
+        """
+        if isinstance(error, DatabaseUnavailableError):
+            return True
+
+        if get_db_backend().is_connection_error(error):
+            db_breaker.record_failure()
+            return True
+        return False
+
+    def _write_row(self, item):
+        """
+        Writes a single queued statement in its own transaction.
+        """
+        sql, values, future = item
+        written = False
+
+        try:
+            with db_pool.connection() as connection:
+                try:
+                    connection.statement_cursor(sql).execute(sql, values)
+                    connection.commit()
+                    written = True
+                except Exception as e:
+                    log_error(f"Error writing result with values: {values}. Error: {e}", source=SOURCE)
+                    connection.discard_statement_cursor(sql)
+                    connection.rollback()
+        except Exception as e:
+            log_error(f"Error writing result with values: {values}. Error: {e}", source=SOURCE)
+
+        with self._lock:
+            if written:
+                self.batches += 1
+                self.rows += 1
+            else:
+                self.failed += 1
+
+        future.set_result(written)
+
+    @staticmethod
+    def _runs(batch):
+        """
+        Splits a batch into runs of consecutive statements with the same SQL text.
+
+        Returns:
+            list: (sql, rows) tuples in the queued order.
+        """
+        runs = []
+        for sql, values, _ in batch:
+            if runs and runs[-1][0] == sql:
+                runs[-1][1].append(values)
+            else:
+                runs.append((sql, [values]))
+        return runs
+
+
+def wait_committed(committed, timeout):
+    """
+    Waits for a result queued on the result writer to be written.
+
+    Args:
+        committed (concurrent.futures.Future): The future returned by submit.
+        timeout (float): Seconds to wait.
+
+    Returns:
+        bool: True once committed, False if the write failed,
+        None if it was not written within the timeout.
+    """
+    try:
+        return committed.result(timeout=timeout)
+    except FutureTimeoutError:
+        return None
+
+
+cfg = get_config()  # Load configuration from file
+
+# Shared write-behind queue of the results, started by the server when RESULT_WRITE_BEHIND is on
+result_writer = ResultWriter(
+    cfg["RESULT_BATCH_SIZE"],
+    cfg["RESULT_BATCH_INTERVAL"],
+    cfg["ACK_MODE"],
+    cfg["RESULT_RETRY_INTERVAL"],
+)
@@ -0,0 +1,44 @@
+"""
+The interface between the query layer and the database it runs on.
+
+A backend opens the connections used by the pool, names the SQL dialect the
+statements of sqlqueries.py are built in and runs the stored procedures the
+database does not provide itself. The backend is selected by `DB_TYPE`:
+"local" and "online" use SQL Server through pyodbc, "sqlite" a local SQLite file.
+"""
+
+# SQL dialects the statements are built in
+DIALECT_MSSQL = "mssql"
+DIALECT_SQLITE = "sqlite"
+
+
+class DatabaseBackend:
+    """
+    Base class of the database backends.
+
+    Subclasses set `dialect` and implement `connect`. A backend without stored
+    procedures returns a Python function from `get_procedure`, it is called with a
+    pooled connection and the parameter values and returns the rows as dictionaries.
+    """
+
+    name = None
+    dialect = None
+
+    def connect(self):
+        """
+        Opens a new DB-API connection, used as the connection factory of the pool.
+        """
+        raise NotImplementedError
+
+    def get_procedure(self, procedure_name):
+        """
+        Returns the function emulating a stored procedure, None to run it with EXEC.
+        """
+        return None
+
+    def is_connection_error(self, error):
+        """
+        Returns True if a query error means the database can no longer be reached,
+        as opposed to an error of the query itself.
+        """
+        return False
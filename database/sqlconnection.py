@@ -1,11 +1,28 @@
-import pyodbc
+import time
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from threading import Condition
 from log.logger import log_info, log_error, log_warning
 from setting import config
+from database.sqlbackend import DatabaseBackend, DIALECT_MSSQL
+from database.circuit_breaker import CircuitBreaker, DatabaseUnavailableError
+
+try:
+    import pyodbc
+except ImportError:  # Only needed for SQL Server, e.g. not when running on SQLite
+    pyodbc = None
 
 
 # Define the source for logging
 SOURCE = "Database"
 
+# Prepared statement cursors kept open per pooled connection
+STATEMENT_CURSOR_LIMIT = 16
+
+# SQLSTATE classes of the pyodbc errors raised when the server cannot be reached:
+# connection exceptions (08xxx) and timeouts (HYT00, HYT01)
+CONNECTION_SQLSTATES = ("08", "HYT")
+
 
 def get_db_connection():
     """
@@ -61,9 +78,12 @@ def get_db_connection():
         else:
             # Invalid DB_TYPE specified
             log_error(
-                "Invalid DB_TYPE specified. Use 'local' or 'online'.", source=SOURCE
+                "Invalid DB_TYPE specified. Use 'local', 'online' or 'sqlite'.", source=SOURCE
             )
-            raise ValueError("Invalid DB_TYPE specified. Use 'local' or 'online'.")
+            raise ValueError("Invalid DB_TYPE specified. Use 'local', 'online' or 'sqlite'.")
+
+        if pyodbc is None:
+            raise ConnectionError("pyodbc is not installed.")
 
         # Attempt to establish the connection
         connection = pyodbc.connect(connection_string)
@@ -79,3 +99,442 @@ def get_db_connection():
         # Log and re-raise exceptions for any other issues
         log_error(f"Failed to connect to database: {e}", source=SOURCE)
         raise ConnectionError(f"Failed to connect to database: {e}")
+
+
+class SqlServerBackend(DatabaseBackend):
+    """
+    SQL Server through pyodbc, the stored procedures run on the server.
+    """
+
+    name = "mssql"
+    dialect = DIALECT_MSSQL
+
+    def connect(self):
+        return get_db_connection()
+
+    def is_connection_error(self, error):
+        if pyodbc is None or not isinstance(error, pyodbc.Error) or not error.args:
+            return False
+        return str(error.args[0]).startswith(CONNECTION_SQLSTATES)
+
+
+def create_db_backend(db_type):
+    """
+    Creates the backend selected by the DB_TYPE setting.
+
+    Args:
+        db_type (str): "local" or "online" for SQL Server, "sqlite" for a local SQLite file.
+
+    Returns:
+        DatabaseBackend: The database backend.
+    """
+    if db_type == "sqlite":
+        # Imported on demand, SQL Server installations never load it
+        from database.sqlitebackend import SqliteBackend
+
+        cfg = config.get_config()  # Load configuration from file
+        return SqliteBackend(cfg["DB_SQLITE_PATH"])
+
+    return SqlServerBackend()
+
+
+def get_db_backend():
+    """
+    Returns the backend the queries currently run on.
+    """
+    return db_backend
+
+
+def set_db_backend(backend):
+    """
+    Switches the queries to another backend, e.g. SQLite for benchmarks.
+    The idle pooled connections of the previous backend are closed.
+    """
+    global db_backend
+    db_backend = backend
+    db_pool.configure(connect=backend.connect)
+    log_info(f"Using the {backend.name} database backend.", source=SOURCE)
+
+
+class PooledConnection:
+    """
+    A database connection checked out from the ConnectionPool.
+
+    Exposes the connection methods used by the query layer and remembers whether
+    the connection failed so the pool can replace it instead of reusing it.
+    It also keeps one open cursor per SQL text, so running the same statement again
+    on this connection reuses the statement pyodbc already prepared.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.broken = False
+        self._statement_cursors = OrderedDict()  # SQL text -> cursor, least recently used first
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def statement_cursor(self, sql):
+        """
+        Returns the cursor kept for the SQL text, creating it on first use.
+
+        pyodbc skips preparing a statement when a cursor executes the same SQL text
+        as its previous execute, so the cursor must not be closed by the caller.
+        """
+        cursor = self._statement_cursors.get(sql)
+
+        if cursor is not None:
+            self._statement_cursors.move_to_end(sql)
+            return cursor
+
+        cursor = self._statement_cursors[sql] = self.connection.cursor()
+
+        if len(self._statement_cursors) > STATEMENT_CURSOR_LIMIT:
+            _, oldest = self._statement_cursors.popitem(last=False)
+            self._close_cursor(oldest)
+
+        return cursor
+
+    def discard_statement_cursor(self, sql):
+        """
+        Closes the cursor kept for the SQL text, e.g. after it failed.
+        """
+        cursor = self._statement_cursors.pop(sql, None)
+        if cursor is not None:
+            self._close_cursor(cursor)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        try:
+            self.connection.rollback()
+        except Exception:
+            self.broken = True  # A connection that cannot roll back is not reusable
+            raise
+
+    def mark_broken(self):
+        """
+        Marks the connection as unusable so it is closed on checkin.
+        """
+        self.broken = True
+
+    def is_healthy(self):
+        """
+        Runs a trivial query to check the connection is still alive.
+        """
+        try:
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        while self._statement_cursors:
+            _, cursor = self._statement_cursors.popitem()
+            self._close_cursor(cursor)
+
+        try:
+            self.connection.close()
+        except Exception as e:
+            log_warning(f"Error closing database connection: {e}", source=SOURCE)
+
+    @staticmethod
+    def _close_cursor(cursor):
+        try:
+            cursor.close()
+        except Exception as e:
+            log_warning(f"Error closing database cursor: {e}", source=SOURCE)
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of database connections.
+
+    Connections are created on demand up to `max_size`, reused most recently used
+    first, tested on checkout after being idle for `health_check_after` seconds and
+    closed after `idle_timeout` seconds idle while more than `min_size` are open.
+    A connection that fails is dropped and replaced by a new one on the next checkout.
+    New connections are opened through the circuit breaker, so while the database
+    is down a checkout fails fast with DatabaseUnavailableError.
+
+    Example:
+        with db_pool.connection() as connection:
+            cursor = connection.cursor()
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size,
+        max_size,
+        idle_timeout,
+        checkout_timeout,
+        health_check_after,
+        breaker=None,
+    ):
+        self.connect = connect
+        self.breaker = breaker
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+
+        self._condition = Condition()
+        self._idle = deque()  # Idle connections, the most recently used on the right
+        self._size = 0  # Open connections (idle + checked out + being created)
+
+        self._checkouts = 0
+        self._created = 0
+        self._closed = 0
+        self._broken = 0
+        self._evicted = 0
+        self._timeouts = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def configure(self, connect=None, **settings):
+        """
+        Replaces the connection factory and/or pool settings, closing the idle connections.
+
+        Args:
+            connect (callable): Function returning a new database connection.
+            **settings: Any of min_size, max_size, idle_timeout, checkout_timeout, health_check_after.
+        """
+        with self._condition:
+            if connect is not None:
+                self.connect = connect
+            for name, value in settings.items():
+                if not hasattr(self, name):
+                    raise ValueError(f"Unknown pool setting: {name}")
+                setattr(self, name, value)
+            self._condition.notify_all()
+
+        self.close_idle()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the duration of a with-block.
+        The connection is dropped instead of reused if the block raises.
+        """
+        pooled = self.checkout()
+        try:
+            yield pooled
+        except Exception:
+            pooled.mark_broken()
+            raise
+        finally:
+            self.checkin(pooled)
+
+    def checkout(self):
+        """
+        Takes a connection from the pool, opening a new one if none is idle.
+        Fails fast while the circuit breaker is open, even with idle connections.
+
+        Returns:
+            PooledConnection: A connection ready for use.
+
+        Raises:
+            ConnectionError: If no connection is free within `checkout_timeout`.
+            DatabaseUnavailableError: If a new connection could not be established
+                or the circuit breaker is open.
+        """
+        if self.breaker is not None:
+            self.breaker.check(probe=False)
+
+        started = time.monotonic()
+        pooled = None
+
+        with self._condition:
+            expired = self._evict_idle()
+
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+
+                if self._size < self.max_size:
+                    self._size += 1  # Reserve the slot, the connection is opened outside the lock
+                    break
+
+                remaining = self.checkout_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    log_error(
+                        f"Timed out waiting for a database connection ({self.max_size} in use).",
+                        source=SOURCE,
+                    )
+                    self._close_all(expired)
+                    raise ConnectionError(
+                        "Timed out waiting for a free database connection."
+                    )
+                self._condition.wait(remaining)
+
+        self._close_all(expired)
+
+        if pooled is not None and time.monotonic() - pooled.last_used > self.health_check_after:
+            if not pooled.is_healthy():
+                log_warning("Dropping broken database connection from the pool.", source=SOURCE)
+                self._discard(pooled, reserve=True)
+                pooled = None
+
+        if pooled is None:
+            pooled = self._open()
+
+        waited = time.monotonic() - started
+        with self._condition:
+            self._checkouts += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+
+        return pooled
+
+    def checkin(self, pooled):
+        """
+        Returns a connection to the pool, or closes it if it is broken.
+        """
+        if pooled.broken:
+            log_warning("Database connection failed, it will be replaced.", source=SOURCE)
+            self._discard(pooled)
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._condition:
+            self._idle.append(pooled)
+            expired = self._evict_idle()
+            self._condition.notify()
+
+        self._close_all(expired)
+
+    def close_idle(self):
+        """
+        Closes every idle connection, connections in use are closed on checkin.
+        """
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._closed += len(idle)
+            self._condition.notify_all()
+
+        self._close_all(idle)
+
+    def stats(self):
+        """
+        Returns the pool size, usage counters and checkout wait times.
+        """
+        with self._condition:
+            checkouts = self._checkouts
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "checkouts": checkouts,
+                "created": self._created,
+                "closed": self._closed,
+                "broken": self._broken,
+                "evicted": self._evicted,
+                "timeouts": self._timeouts,
+                "wait_time_avg_ms": (self._wait_time_total / checkouts * 1000) if checkouts else 0.0,
+                "wait_time_max_ms": self._wait_time_max * 1000,
+            }
+
+    def _open(self):
+        """
+        Opens a new connection for a slot already reserved in `_size`.
+        """
+        try:
+            if self.breaker is not None:
+                self.breaker.check()
+
+            try:
+                connection = self.connect()
+            except Exception as e:
+                if self.breaker is not None:
+                    self.breaker.record_failure()
+                raise DatabaseUnavailableError(str(e)) from e
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+        with self._condition:
+            self._created += 1
+        return PooledConnection(connection)
+
+    def _discard(self, pooled, reserve=False):
+        """
+        Closes a broken connection. With `reserve` its slot is kept for a replacement.
+        """
+        pooled.close()
+        with self._condition:
+            self._broken += 1
+            self._closed += 1
+            if not reserve:
+                self._size -= 1
+                self._condition.notify()
+
+    def _evict_idle(self):
+        """
+        Removes connections idle for longer than `idle_timeout`, keeping `min_size` open.
+        Must be called with the lock held; the returned connections are closed by the caller.
+        """
+        expired = []
+        now = time.monotonic()
+        # The least recently used connections are on the left
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0].last_used > self.idle_timeout
+        ):
+            expired.append(self._idle.popleft())
+            self._size -= 1
+            self._evicted += 1
+            self._closed += 1
+        return expired
+
+    @staticmethod
+    def _close_all(connections):
+        """
+        Closes connections removed from the pool, outside the lock.
+        """
+        for pooled in connections:
+            pooled.close()
+
+
+cfg = config.get_config()  # Load configuration from file
+
+# Database selected by DB_TYPE
+db_backend = create_db_backend(cfg["DB_TYPE"])
+
+# Fails the queries fast while the database is down
+db_breaker = CircuitBreaker(
+    cfg["DB_BREAKER_FAILURE_THRESHOLD"],
+    cfg["DB_BREAKER_RESET_TIMEOUT"],
+)
+
+# Connection pool shared by every query
+db_pool = ConnectionPool(
+    db_backend.connect,
+    min_size=cfg["DB_POOL_MIN_SIZE"],
+    max_size=cfg["DB_POOL_MAX_SIZE"],
+    idle_timeout=cfg["DB_POOL_IDLE_TIMEOUT"],
+    checkout_timeout=cfg["DB_POOL_CHECKOUT_TIMEOUT"],
+    health_check_after=cfg["DB_POOL_HEALTH_CHECK_AFTER"],
+    breaker=db_breaker,
+)
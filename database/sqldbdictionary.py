@@ -17,10 +17,13 @@ Each schema definition is in the following format:
 """
 
 from log.logger import log_info
+from setting.config import get_config
 
 # Define source for logging
 SOURCE = "Database"
 
+cfg = get_config()  # Load configuration from file
+
 log_info("Loading database schema definitions...", source=SOURCE)
 
 # Define tables and columns for checking the existence of a patient record
@@ -116,6 +119,52 @@ log_info(
     source=SOURCE,
 )
 
+# Define tables and columns for looking up, in one query, everything a result message needs:
+# the requested test (TABLE_NAME), the patient info (JOIN) and whether a result exists (EXIST)
+RESULT_LOOKUP_SQL = {
+    "DB_NAME": "[patients]",
+    "TABLE_NAME": "[patienttest]",
+    "COLUMN_NAME": {"TEST_CODE": "[testcode]", "RESULT_STATE": "[resultfinsh]"},
+    "JOIN": {
+        "TABLE_NAME": "[patientinfo]",
+        "COLUMN_NAME": {"NAME": "[patientnamear]", "REQ_DATE": "[requestdate]"},
+        "ON": {"PATIENT_ID": "[patientid]"},
+    },
+    "EXIST": {
+        "TABLE_NAME": "[cbc]",
+        "ON": {"PATIENT_ID": "[patientid]"},
+    },
+    "CONDITION": {"PATIENT_ID": "[patientid]"},
+}
+log_info(
+    "Loaded SQL schema for the combined result message lookup.",
+    source=SOURCE,
+)
+
+# Define tables and columns for the worklist: the pending tests (TABLE_NAME) of the
+# TEST_CODES with their patient info (JOIN), loaded in one query and refreshed with
+# the rows whose WATERMARK column is at or after the newest one already loaded
+WORKLIST_SQL = {
+    "DB_NAME": "[patients]",
+    "TABLE_NAME": "[patienttest]",
+    "COLUMN_NAME": {"PATIENT_ID": "[patientid]", "TEST_DATE": "[requestdate]"},
+    "JOIN": {
+        "TABLE_NAME": "[patientinfo]",
+        "COLUMN_NAME": {
+            "NAME": "[patientnamear]",
+            "SEX": "[patientsex]",
+            "AGE": "[patientage]",
+            "AGE_UNIT": "[patientageunit]",
+            "REQ_DATE": "[requestdate]",
+        },
+        "ON": {"PATIENT_ID": "[patientid]"},
+    },
+    "TEST_CODES": ("[testcode]", (cfg["CBC_TEST_CODE"], cfg["HGB_TEST_CODE"])),
+    "CONDITION": {"RESULT_STATE": "[resultfinsh]"},
+    "WATERMARK": "[requestdate]",
+}
+log_info("Loaded SQL schema for the worklist of pending tests.", source=SOURCE)
+
 
 # Define the procedure name and parameter for patient info fetching
 PATIENT_SEARCH_SQL = {
@@ -0,0 +1,250 @@
+import sqlite3
+from datetime import date, datetime
+from threading import Lock
+from log.logger import log_info
+from database.sqlbackend import DatabaseBackend, DIALECT_SQLITE
+from setting.config import get_config
+
+
+# Define the source for logging
+SOURCE = "Database"
+
+cfg = get_config()  # Load configuration from file
+CBC_TEST_CODE = cfg["CBC_TEST_CODE"]
+HGB_TEST_CODE = cfg["HGB_TEST_CODE"]
+
+# Seconds a connection waits for another one to finish writing
+SQLITE_BUSY_TIMEOUT = 10
+
+# Format of the dates stored in the SQLite file, sorts like the dates themselves
+SQLITE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# The tables used by the server and the GUI, with the columns of sqldbdictionary.py
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patientinfo (
+    patientid TEXT PRIMARY KEY,
+    patientnamear TEXT,
+    patientsex TEXT,
+    patientage INTEGER,
+    patientageunit TEXT,
+    requestdate TEXT
+);
+
+CREATE TABLE IF NOT EXISTS patienttest (
+    patientid TEXT NOT NULL,
+    testcode INTEGER NOT NULL,
+    resultfinsh INTEGER NOT NULL DEFAULT 0,
+    requestdate TEXT
+);
+CREATE INDEX IF NOT EXISTS patienttest_patientid ON patienttest (patientid);
+
+CREATE TABLE IF NOT EXISTS cbc (
+    patientid TEXT PRIMARY KEY,
+    requestdate TEXT,
+    hgb REAL, rbc REAL, hct REAL, plt REAL, hgbper REAL,
+    mcv REAL, mch REAL, mchc REAL, pct REAL, mpv REAL,
+    wbc REAL, neut REAL, lymph REAL, mono REAL, eosino REAL, baso REAL,
+    othercell REAL, rdw REAL, pdw REAL, seg REAL, bandx REAL,
+    comment TEXT,
+    Juvenile REAL, Myelocytes REAL, Promyelocyte REAL, Blast REAL, NRBCWBC REAL
+);
+"""
+
+PATIENT_COLUMNS = """
+    p.patientid AS [Patient ID],
+    p.patientnamear AS [Name],
+    p.patientage AS [Age],
+    p.patientageunit AS [Age Unit],
+    p.patientsex AS [Gender]"""
+
+
+def to_sqlite_date(value):
+    """
+    Converts a date or datetime parameter to the text stored in the SQLite file.
+    """
+    if isinstance(value, date):  # Also a datetime
+        return value.strftime(SQLITE_DATE_FORMAT)
+    return value
+
+
+def from_sqlite_date(value):
+    """
+    Converts a stored date back to a datetime like pyodbc returns it, None if it is not a date.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def fetch_dicts(cursor):
+    """
+    Returns the rows of the last statement as dictionaries keyed by the column names.
+    """
+    columns = [column[0] for column in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    for row in rows:
+        if "Requested Date" in row:
+            row["Requested Date"] = from_sqlite_date(row["Requested Date"])
+    return rows
+
+
+def get_patient_info(connection, values):
+    """
+    Emulates the GetPatientInfo stored procedure: the patients with a CBC or HGB
+    request, filtered by id and/or name, request date range and result state.
+
+    Args:
+        connection: A pooled SQLite connection.
+        values (dict): PATIENT_ID, PATIENT_NAME, START_DATE, END_DATE and RESULT_FINISHED, None when not filtered.
+
+    Returns:
+        list: The patients as dictionaries, the oldest request first.
+    """
+    patient_id = values.get("PATIENT_ID")
+    patient_name = values.get("PATIENT_NAME")
+    start_date = to_sqlite_date(values.get("START_DATE"))
+    end_date = to_sqlite_date(values.get("END_DATE"))
+    result_finished = values.get("RESULT_FINISHED")
+
+    sql = f"""
+    SELECT {PATIENT_COLUMNS},
+        pt.requestdate AS [Requested Date],
+        CASE
+            WHEN pt.testcode = ? THEN 'CBC'
+            WHEN pt.testcode = ? THEN 'Hgb'
+            ELSE 'Unknown Test'
+        END AS [Requested Test],
+        CASE
+            WHEN pt.resultfinsh = 0 THEN 'Pending'
+            ELSE 'Completed'
+        END AS [Result State]
+    FROM patientinfo p
+    JOIN patienttest pt ON p.patientid = pt.patientid
+    WHERE pt.testcode IN (?, ?)"""
+    parameters = [CBC_TEST_CODE, HGB_TEST_CODE, CBC_TEST_CODE, HGB_TEST_CODE]
+
+    # Add the filters of the parameters provided, like the stored procedure
+    if patient_id and patient_name:
+        sql += " AND (p.patientid LIKE ? OR p.patientnamear LIKE ?)"
+        parameters += [f"%{patient_id}%", f"%{patient_name}%"]
+    elif patient_id:
+        sql += " AND p.patientid LIKE ?"
+        parameters.append(f"%{patient_id}%")
+    elif patient_name:
+        sql += " AND p.patientnamear LIKE ?"
+        parameters.append(f"%{patient_name}%")
+
+    if start_date is not None and end_date is not None:
+        sql += " AND pt.requestdate BETWEEN ? AND ?"
+        parameters += [start_date, end_date]
+    elif start_date is not None:
+        sql += " AND pt.requestdate >= ?"
+        parameters.append(start_date)
+    elif end_date is not None:
+        sql += " AND pt.requestdate <= ?"
+        parameters.append(end_date)
+
+    if result_finished is not None:
+        sql += " AND pt.resultfinsh = ?"
+        parameters.append(int(result_finished))
+
+    sql += " ORDER BY pt.requestdate ASC"
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, parameters)
+        return fetch_dicts(cursor)
+    finally:
+        cursor.close()
+
+
+def get_patient_cbc_result(connection, values):
+    """
+    Emulates the GetPatientCBCResult stored procedure: the patient info with its CBC results.
+
+    Args:
+        connection: A pooled SQLite connection.
+        values (dict): PATIENT_ID.
+
+    Returns:
+        list: The results as dictionaries, the latest first.
+    """
+    sql = f"""
+    SELECT {PATIENT_COLUMNS},
+        c.requestdate AS [Requested Date],
+        c.hgb AS [Hemoglobin (HGB)],
+        c.rbc AS [Red Blood Cells (RBC)],
+        c.hct AS [Hematocrit (HCT)],
+        c.mcv AS [Mean Corpuscular Volume (MCV)],
+        c.mch AS [Mean Corpuscular Hemoglobin (MCH)],
+        c.mchc AS [Mean Corpuscular Hemoglobin Concentration (MCHC)],
+        c.rdw AS [Red Cell Distribution Width (RDW)],
+        c.plt AS [Platelets (PLT)],
+        c.pct AS [Plateletcrit (PCT)],
+        c.mpv AS [Mean Platelet Volume (MPV)],
+        c.pdw AS [Platelet Distribution Width (PDW)],
+        c.wbc AS [White Blood Cells (WBC)],
+        c.neut AS [Neutrophils],
+        c.lymph AS [Lymphocytes],
+        c.mono AS [Monocytes],
+        c.eosino AS [Eosinophils],
+        c.baso AS [Basophils]
+    FROM patientinfo p
+    LEFT JOIN cbc c ON p.patientid = c.patientid
+    WHERE p.patientid = ?
+    ORDER BY c.requestdate DESC"""
+
+    cursor = connection.cursor()
+    try:
+        cursor.execute(sql, (values.get("PATIENT_ID"),))
+        return fetch_dicts(cursor)
+    finally:
+        cursor.close()
+
+
+class SqliteBackend(DatabaseBackend):
+    """
+    A local SQLite file, for benchmarks, load tests and running without SQL Server.
+
+    The tables are created on the first connection and the stored procedures used
+    by the GUI are emulated in Python.
+
+    Example:
+        set_db_backend(SqliteBackend("patients.sqlite3"))
+    """
+
+    name = "sqlite"
+    dialect = DIALECT_SQLITE
+
+    procedures = {
+        "GetPatientInfo": get_patient_info,
+        "GetPatientCBCResult": get_patient_cbc_result,
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self._schema_ready = False
+        self._lock = Lock()
+
+    def connect(self):
+        # The pool hands the connection to any worker thread, one at a time
+        connection = sqlite3.connect(
+            self.path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")  # Readers do not wait for the writer
+        connection.execute("PRAGMA synchronous=NORMAL")
+
+        with self._lock:
+            if not self._schema_ready:
+                connection.executescript(SQLITE_SCHEMA)
+                self._schema_ready = True
+                log_info(f"SQLite database ready at {self.path}.", source=SOURCE)
+
+        return connection
+
+    def get_procedure(self, procedure_name):
+        return self.procedures.get(procedure_name)
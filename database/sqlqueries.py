@@ -1,127 +1,436 @@
-from database.sqlqueriesExe import querie_exe
-from hl7msghandel.hl7fitsql import update_hl7_dictionary
+from collections import namedtuple
+from functools import lru_cache
+from database.sqlqueriesExe import querie_exe, procedure_exe
+from database.sqlconnection import get_db_backend
+from database.sqlbackend import DIALECT_SQLITE
+from hl7msghandel.hl7fitsql import apply_hl7_plan, Hl7Plan
 
 
 SOURCE = "Database"
 
+# Distinct statements kept by the statement cache
+STATEMENT_CACHE_SIZE = 128
 
-def data_insert_for(
-    db_schema: dict, hl7_dictionary: dict, hl7_message, sql_data=None, manual_data=None
-):
+# SQL text built once for a schema, with the order its parameters are bound in.
+# `columns` and `conditions` are the HL7 keys of the column and condition values
+# and `selected` the result keys of a SELECT (empty for other statements).
+Statement = namedtuple("Statement", ["sql", "columns", "conditions", "selected"])
+
+
+class _SchemaKey:
     """
-    this function generates an SQL query for inserting data into a table.
-    The function takes a database connection object and a database schema dictionary as input.
-    The function returns None that mean the job is done.
+    Hashable stand-in for a schema dictionary, compared by identity.
+
+    The schemas are module constants that are never changed, so the same dictionary
+    always builds the same statements and a lookup does not walk its content. The key
+    holds the schema, so its id cannot be reused while the statement is cached.
+    """
+
+    __slots__ = ("schema",)
+
+    def __init__(self, schema):
+        self.schema = schema
+
+    def __hash__(self):
+        return id(self.schema)
+
+    def __eq__(self, other):
+        return self.schema is other.schema
+
+
+def _table(table_name, dialect):
+    """
+    Returns the table reference of a schema table in the dialect.
+    """
+    if dialect == DIALECT_SQLITE:
+        return table_name  # SQLite has no schemas
+    return f"[dbo].{table_name}"
+
+
+def statement_cache_info():
+    """
+    Returns the hits, misses and size of the statement cache.
+    """
+    info = _build_statement.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+
+def get_statement(operation, db_schema: dict, present_columns=()):
+    """
+    Returns the cached statement of an operation on a schema.
+
+    The schema dictionaries are only read, the columns without a value in the message
+    are left out of the statement instead of being deleted from the schema. The
+    statement is built in the SQL dialect of the current database backend.
 
     Args:
-        connection (object): The database connection object.
+        operation (str): One of "insert", "update", "upsert", "select", "lookup", "worklist" or "delete".
         db_schema (dict): A dictionary containing the database schema dictionary as input.
+        present_columns (tuple): The HL7 keys of the columns that have a value.
 
     Returns:
-        None: This function does not return any value. It simply executes the SQL query and returns the None value.
+        Statement: The SQL text and the order of its parameters.
+    """
+    return _build_statement(
+        operation, _SchemaKey(db_schema), tuple(present_columns), get_db_backend().dialect
+    )
 
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _build_statement(operation, schema_key, present_columns, dialect):
+    """
+    Builds the statement of get_statement, once per operation, schema, column set and dialect.
     """
+    builder = _STATEMENT_BUILDERS[operation]
+    return builder(schema_key.schema, present_columns, dialect)
+
 
-    hl7_dictionary = update_hl7_dictionary(
-        hl7_message, hl7_dictionary, sql_data, manual_data
+def _bind_values(statement, hl7_values):
+    """
+    Orders the extracted HL7 values as the parameters of the statement.
+    """
+    hl7_column = dict(zip(hl7_values.columns, hl7_values.values))
+    hl7_msg_conditions = dict(
+        zip(hl7_values.condition_columns, hl7_values.condition_values)
+    )
+
+    return tuple(hl7_column[key] for key in statement.columns) + tuple(
+        hl7_msg_conditions[key] for key in statement.conditions
     )
 
+
+def _insert_statement(db_schema, present_columns, dialect):
     table_name = db_schema["TABLE_NAME"]
 
-    column_name = db_schema["COLUMN_NAME"]
+    # keep only the db schema columns that have a value in the hl7 message
+    column_name = {
+        key: value
+        for key, value in db_schema["COLUMN_NAME"].items()
+        if key in present_columns
+    }
 
-    hl7_column = hl7_dictionary["COLUMN_NAME"]
+    columns = ", ".join(column_name.values())
+    placeholders = ", ".join(["?" for _ in column_name])
+    sql = f"INSERT INTO {_table(table_name, dialect)} ({columns}) VALUES ({placeholders});"
+
+    return Statement(sql, tuple(column_name), (), ())
+
+
+def _update_statement(db_schema, present_columns, dialect):
+    table_name = db_schema["TABLE_NAME"]
+    condition = db_schema["CONDITION"]
+
+    # keep only the db schema columns that have a value in the hl7 message
+    column_name = {
+        key: value
+        for key, value in db_schema["COLUMN_NAME"].items()
+        if key in present_columns
+    }
+
+    set_clause = ",".join([f"{value} = ?" for value in column_name.values()])
 
-    db_schema_delete_extra_keys = []
+    condition_strings = [f"{value} = ? " for key, value in condition.items()]
+    condition_clause = "" + "and ".join(condition_strings)
 
-    for key in column_name.keys():
-        if key not in (hl7_column.keys()):
-            db_schema_delete_extra_keys.append(key)
-    for key in db_schema_delete_extra_keys:
-        del column_name[key]
+    sql = f"UPDATE {_table(table_name, dialect)} SET {set_clause} WHERE {condition_clause};"
 
-    # select the values holder from db schema for column
-    values_holder = tuple(hl7_column.keys())
+    return Statement(sql, tuple(column_name), tuple(condition), ())
 
-    # select the values from hl7 message ans assign to the values holder for column
-    values = tuple(str(hl7_column[value]) for value in values_holder)
+
+def _upsert_statement(db_schema, present_columns, dialect):
+    table_name = db_schema["TABLE_NAME"]
+    condition = db_schema["CONDITION"]
+
+    # keep only the db schema columns that have a value in the hl7 message
+    column_name = {
+        key: value
+        for key, value in db_schema["COLUMN_NAME"].items()
+        if key in present_columns
+    }
+
+    # the condition columns that are not already part of the columns
+    condition_name = {
+        key: value for key, value in condition.items() if value not in column_name.values()
+    }
+
+    if dialect == DIALECT_SQLITE:
+        return _sqlite_upsert_statement(table_name, condition, column_name, condition_name)
+
+    source_columns = ", ".join(
+        [f"? AS {value}" for value in column_name.values()]
+        + [f"? AS {value}" for value in condition_name.values()]
+    )
+
+    match_condition = " and ".join(
+        [f"target.{value} = source.{value}" for value in condition.values()]
+    )
+
+    set_clause = ", ".join(
+        [
+            f"target.{value} = source.{value}"
+            for value in column_name.values()
+            if value not in condition.values()
+        ]
+    )
 
     columns = ", ".join(column_name.values())
-    placeholders = ", ".join(["?" for _ in column_name])
-    sql = f"INSERT INTO [dbo].{table_name} ({columns}) VALUES ({placeholders});"
+    source_values = ", ".join([f"source.{value}" for value in column_name.values()])
 
-    data = (sql, values)
+    sql = (
+        f"MERGE {_table(table_name, dialect)} WITH (HOLDLOCK) AS target "
+        f"USING (SELECT {source_columns}) AS source ON {match_condition} "
+        f"WHEN MATCHED THEN UPDATE SET {set_clause} "
+        f"WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({source_values});"
+    )
 
-    return querie_exe(data)
+    return Statement(sql, tuple(column_name), tuple(condition_name), ())
 
 
-def data_update_for(
-    db_schema: dict, hl7_dictionary: dict, hl7_message, sql_data=None, manual_data=None
+def _sqlite_upsert_statement(table_name, condition, column_name, condition_name):
+    """
+    The upsert as an INSERT ... ON CONFLICT, SQLite has no MERGE.
+    The condition columns must have a unique index, the parameters are bound in the
+    same order as the MERGE: the columns, then the condition columns not among them.
+    """
+    insert_columns = list(column_name.values()) + list(condition_name.values())
+
+    columns = ", ".join(insert_columns)
+    placeholders = ", ".join(["?" for _ in insert_columns])
+    conflict_columns = ", ".join(condition.values())
+
+    set_clause = ", ".join(
+        [
+            f"{value} = excluded.{value}"
+            for value in column_name.values()
+            if value not in condition.values()
+        ]
+    )
+    on_conflict = f"DO UPDATE SET {set_clause}" if set_clause else "DO NOTHING"
+
+    sql = (
+        f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({conflict_columns}) {on_conflict};"
+    )
+
+    return Statement(sql, tuple(column_name), tuple(condition_name), ())
+
+
+def _select_statement(db_schema, present_columns, dialect):
+    table_name = db_schema["TABLE_NAME"]
+    column_name = db_schema["COLUMN_NAME"]
+    condition = db_schema["CONDITION"]
+
+    set_clause = ", ".join([f"{value}" for value in column_name.values()])
+
+    condition_strings = [f"{value} = ?" for key, value in condition.items()]
+    condition_clause = "" + " and ".join(condition_strings)
+
+    sql = f"SELECT {set_clause} FROM {_table(table_name, dialect)} WHERE {condition_clause};"
+
+    return Statement(sql, (), tuple(condition), tuple(column_name))
+
+
+def _lookup_statement(db_schema, present_columns, dialect):
+    table_name = db_schema["TABLE_NAME"]
+    column_name = db_schema["COLUMN_NAME"]
+    join = db_schema["JOIN"]
+    exist = db_schema["EXIST"]
+    condition = db_schema["CONDITION"]
+
+    # the joined row exists when its first join column is not null
+    join_key = next(iter(join["ON"].values()))
+
+    select_clause = [f"t.{value}" for value in column_name.values()]
+    select_clause.append(f"CASE WHEN j.{join_key} IS NULL THEN 0 ELSE 1 END")
+    select_clause += [f"j.{value}" for value in join["COLUMN_NAME"].values()]
+
+    exist_condition = " and ".join(
+        [f"e.{value} = t.{condition[key]}" for key, value in exist["ON"].items()]
+    )
+    select_clause.append(
+        f"CASE WHEN EXISTS (SELECT 1 FROM {_table(exist['TABLE_NAME'], dialect)} e WHERE {exist_condition}) THEN 1 ELSE 0 END"
+    )
+
+    join_condition = " and ".join(
+        [f"j.{value} = t.{condition[key]}" for key, value in join["ON"].items()]
+    )
+
+    condition_strings = [f"t.{value} = ?" for key, value in condition.items()]
+    condition_clause = "" + " and ".join(condition_strings)
+
+    from_clause = (
+        f"FROM {_table(table_name, dialect)} t "
+        f"LEFT JOIN {_table(join['TABLE_NAME'], dialect)} j ON {join_condition} WHERE {condition_clause}"
+    )
+
+    if dialect == DIALECT_SQLITE:
+        sql = f"SELECT {', '.join(select_clause)} {from_clause} LIMIT 1;"
+    else:
+        sql = f"SELECT TOP 1 {', '.join(select_clause)} {from_clause};"
+
+    # select the selected value variable in the order of the select clause
+    selected_value_variable = (
+        tuple(column_name.keys())
+        + ("PATIENT_EXIST",)
+        + tuple(join["COLUMN_NAME"].keys())
+        + ("RESULT_EXIST",)
+    )
+
+    return Statement(sql, (), tuple(condition), selected_value_variable)
+
+
+def _worklist_statement(db_schema, present_columns, dialect):
+    table_name = db_schema["TABLE_NAME"]
+    column_name = db_schema["COLUMN_NAME"]
+    join = db_schema["JOIN"]
+    condition = db_schema["CONDITION"]
+    test_column, test_codes = db_schema["TEST_CODES"]
+    watermark = db_schema["WATERMARK"]
+
+    select_clause = [f"t.{value}" for value in column_name.values()]
+    select_clause += [f"j.{value}" for value in join["COLUMN_NAME"].values()]
+
+    join_condition = " and ".join(
+        [f"j.{value} = t.{column_name[key]}" for key, value in join["ON"].items()]
+    )
+
+    # the test codes come from the configuration, like the codes of GetPatientInfo
+    condition_strings = [f"t.{test_column} IN ({', '.join(str(int(code)) for code in test_codes)})"]
+    condition_strings += [f"t.{value} = ?" for key, value in condition.items()]
+    conditions = tuple(condition)
+
+    # only the rows at or after the watermark when one is given
+    if "WATERMARK" in present_columns:
+        condition_strings.append(f"t.{watermark} >= ?")
+        conditions += ("WATERMARK",)
+
+    sql = (
+        f"SELECT {', '.join(select_clause)} FROM {_table(table_name, dialect)} t "
+        f"INNER JOIN {_table(join['TABLE_NAME'], dialect)} j ON {join_condition} "
+        f"WHERE {' and '.join(condition_strings)} ORDER BY t.{watermark};"
+    )
+
+    selected_value_variable = tuple(column_name.keys()) + tuple(join["COLUMN_NAME"].keys())
+
+    return Statement(sql, (), conditions, selected_value_variable)
+
+
+def _delete_statement(db_schema, present_columns, dialect):
+    table_name = db_schema["TABLE_NAME"]
+    condition = db_schema["CONDITION"]
+
+    condition_strings = [f"{value} = ?" for key, value in condition.items()]
+    condition_clause = "" + " and ".join(condition_strings)
+
+    sql = f"DELETE FROM {_table(table_name, dialect)} WHERE {condition_clause};"
+
+    return Statement(sql, (), tuple(condition), ())
+
+
+_STATEMENT_BUILDERS = {
+    "insert": _insert_statement,
+    "update": _update_statement,
+    "upsert": _upsert_statement,
+    "select": _select_statement,
+    "lookup": _lookup_statement,
+    "worklist": _worklist_statement,
+    "delete": _delete_statement,
+}
+
+
+def data_insert_for(
+    db_schema: dict, hl7_plan: Hl7Plan, hl7_message, sql_data=None, manual_data=None
 ):
     """
-    this function generates an SQL query for updating data in a table.
+    this function generates an SQL query for inserting data into a table.
     The function takes a database connection object and a database schema dictionary as input.
     The function returns None that mean the job is done.
+
     Args:
         connection (object): The database connection object.
         db_schema (dict): A dictionary containing the database schema dictionary as input.
+
     Returns:
         None: This function does not return any value. It simply executes the SQL query and returns the None value.
+
     """
-    hl7_dictionary = update_hl7_dictionary(
-        hl7_message, hl7_dictionary, sql_data, manual_data
-    )
 
-    table_name = db_schema["TABLE_NAME"]
-    column_name = db_schema["COLUMN_NAME"]
-    condition = db_schema["CONDITION"]
+    hl7_values = apply_hl7_plan(hl7_message, hl7_plan, sql_data, manual_data)
 
-    hl7_column = hl7_dictionary["COLUMN_NAME"]
+    statement = get_statement("insert", db_schema, hl7_values.columns)
 
-    db_schema_delete_extra_keys = []
+    data = (statement.sql, _bind_values(statement, hl7_values))
 
-    for key in column_name.keys():
-        if key not in (hl7_column.keys()):
-            db_schema_delete_extra_keys.append(key)
+    return querie_exe(data)
 
-        # if key in (condition.keys()):
-        #     db_schema_delete_extra_keys.append(key)
-        #     # delete where state volumn from db schema nad hl7 becouse we don't need to update it allready exists
-        #     del hl7_column[key]
 
-    for key in db_schema_delete_extra_keys:
-        # delete the extra data that didn't have value
-        del column_name[key]
+def data_update_for(
+    db_schema: dict, hl7_plan: Hl7Plan, hl7_message, sql_data=None, manual_data=None
+):
+    """
+    this function generates an SQL query for updating data in a table.
+    The function takes a database connection object and a database schema dictionary as input.
+    The function returns None that mean the job is done.
+    Args:
+        connection (object): The database connection object.
+        db_schema (dict): A dictionary containing the database schema dictionary as input.
+    Returns:
+        None: This function does not return any value. It simply executes the SQL query and returns the None value.
+    """
+    hl7_values = apply_hl7_plan(hl7_message, hl7_plan, sql_data, manual_data)
 
-    # select the values holder from db schema for column
-    column_values_holder = tuple(hl7_column.keys())
-    # select the values from hl7 message ans assign to the values holder for column
-    colmun_values = (str(hl7_column[value]) for value in column_values_holder)
+    statement = get_statement("update", db_schema, hl7_values.columns)
 
-    hl7_msg_conditions = hl7_dictionary["CONDITION"]
-    # select the values holder from db schema for condition
-    condition_values_holder = condition.keys()
-    # select the values from hl7 message ans assign to the values holder for condition
-    condition_values = (
-        str(hl7_msg_conditions[value]) for value in condition_values_holder
-    )
+    data = (statement.sql, _bind_values(statement, hl7_values))
 
-    values = tuple(colmun_values) + tuple(condition_values)
+    return querie_exe(data)
 
-    set_clause = ",".join([f"{value} = ?" for value in column_name.values()])
 
-    condition_strings = [f"{value} = ? " for key, value in condition.items()]
-    condition = "" + "and ".join(condition_strings)
+def data_upsert_for(
+    db_schema: dict, hl7_plan: Hl7Plan, hl7_message, sql_data=None, manual_data=None
+):
+    """
+    this function generates a single MERGE query that updates the row matching the condition
+    or inserts it when it does not exist yet.
+    It replaces the exist check followed by data_insert_for or data_update_for, so a result
+    costs one statement and the row lock is held until it is written.
+    Args:
+        db_schema (dict): A dictionary containing the database schema dictionary as input.
+        hl7_plan (Hl7Plan): The compiled HL7 plan with the values address in the message.
+    Returns:
+        None: This function does not return any value. It simply executes the SQL query and returns the None value.
+    """
+    data = data_upsert_statement_for(db_schema, hl7_plan, hl7_message, sql_data, manual_data)
 
-    sql = f"UPDATE [dbo].{table_name} SET {set_clause} WHERE {condition};"
+    return querie_exe(data)
 
-    data = (sql, values)
 
-    return querie_exe(data)
+def data_upsert_statement_for(
+    db_schema: dict, hl7_plan: Hl7Plan, hl7_message, sql_data=None, manual_data=None
+):
+    """
+    this function builds the MERGE query of data_upsert_for with its values without executing it,
+    e.g. to queue it on the result writer.
+    Args:
+        db_schema (dict): A dictionary containing the database schema dictionary as input.
+        hl7_plan (Hl7Plan): The compiled HL7 plan with the values address in the message.
+    Returns:
+        tuple: The SQL text and the values bound to it.
+    """
+    hl7_values = apply_hl7_plan(hl7_message, hl7_plan, sql_data, manual_data)
+
+    statement = get_statement("upsert", db_schema, hl7_values.columns)
+
+    return (statement.sql, _bind_values(statement, hl7_values))
 
 
 def data_select_for(
-    db_schema: dict, hl7_dictionary: dict, hl7_message, sql_data=None, manual_data=None
+    db_schema: dict, hl7_plan: Hl7Plan, hl7_message, sql_data=None, manual_data=None
 ):
     """
     this function generates an SQL query for selecting data from a table.
@@ -134,45 +443,41 @@ def data_select_for(
         select_value: The select value from select query.
     """
 
-    hl7_dictionary = update_hl7_dictionary(
-        hl7_message, hl7_dictionary, sql_data, manual_data
-    )
-
-    # select the table name from db schema
-    table_name = db_schema["TABLE_NAME"]
+    hl7_values = apply_hl7_plan(hl7_message, hl7_plan, sql_data, manual_data)
 
-    # select the column name from db schema
-    column_name = db_schema["COLUMN_NAME"]
+    statement = get_statement("select", db_schema)
 
-    # select the selected value variable from db schema
-    selected_value_variable = tuple(column_name.keys())
+    data = (statement.sql, _bind_values(statement, hl7_values), statement.selected)
 
-    # select the condition data from db schema
-    condition = db_schema["CONDITION"]
-
-    # select the target value from hl7 message
-    hl7_column = hl7_dictionary["CONDITION"]
-
-    # select the values holder from db schema
-    values_holder = tuple(condition.keys())
-    # select the values from hl7 message ans assign to the values holder
-    values = tuple(str(hl7_column[value]) for value in values_holder)
+    return querie_exe(data)
 
-    set_clause = ", ".join([f"{value}" for value in column_name.values()])
 
-    condition_strings = [f"{value} = ?" for key, value in condition.items()]
+def data_lookup_for(
+    db_schema: dict, hl7_plan: Hl7Plan, hl7_message, sql_data=None, manual_data=None
+):
+    """
+    this function generates one SQL query that selects the columns of a table together with
+    the columns of a joined table and whether a row exists in a third table.
+    It replaces separate select queries for the same condition with a single round trip.
+    Args:
+        db_schema (dict): A dictionary containing the database schema with "JOIN" and "EXIST" parts.
+        hl7_plan (Hl7Plan): The compiled HL7 plan with the condition address in the message.
+    Returns:
+        select_value: The select value from select query, with "PATIENT_EXIST" set when the
+        joined row was found and "RESULT_EXIST" set when a row exists in the "EXIST" table.
+    """
 
-    condition = "" + " and ".join(condition_strings)
+    hl7_values = apply_hl7_plan(hl7_message, hl7_plan, sql_data, manual_data)
 
-    sql = f"SELECT {set_clause} FROM [dbo].{table_name} WHERE {condition};"
+    statement = get_statement("lookup", db_schema)
 
-    data = (sql, values, selected_value_variable)
+    data = (statement.sql, _bind_values(statement, hl7_values), statement.selected)
 
     return querie_exe(data)
 
 
 def data_delete_for(
-    db_schema: dict, hl7_dictionary: dict, hl7_message, sql_data=None, manual_data=None
+    db_schema: dict, hl7_plan: Hl7Plan, hl7_message, sql_data=None, manual_data=None
 ):
     """
     this function generates an SQL query for deleting data from a table.
@@ -185,31 +490,34 @@ def data_delete_for(
         None: This function does not return any value. It simply executes the SQL query and returns the None value.
     """
 
-    hl7_dictionary = update_hl7_dictionary(
-        hl7_message, hl7_dictionary, sql_data, manual_data
-    )
-
-    table_name = db_schema["TABLE_NAME"]
-    condition = db_schema["CONDITION"]
+    hl7_values = apply_hl7_plan(hl7_message, hl7_plan, sql_data, manual_data)
 
-    # select the target value from hl7 message
-    hl7_column = hl7_dictionary["CONDITION"]
+    statement = get_statement("delete", db_schema)
 
-    # select the values holder from db schema
-    values_holder = tuple(condition.keys())
+    data = (statement.sql, _bind_values(statement, hl7_values))
 
-    # select the values from hl7 message ans assign to the values holder
-    values = tuple(str(hl7_column[value]) for value in values_holder)
+    return querie_exe(data)
 
-    condition_strings = [f"{value} = ?" for key, value in condition.items()]
 
-    condition = "" + " and ".join(condition_strings)
+def data_worklist_for(db_schema: dict, condition_data: dict, watermark=None):
+    """
+    this function selects every row of a worklist schema, or only the rows at or after
+    the watermark to refresh a worklist already loaded.
+    Args:
+        db_schema (dict): A dictionary containing the worklist schema with "JOIN", "TEST_CODES" and "WATERMARK" parts.
+        condition_data (dict): The values of the schema conditions by condition name.
+        watermark: The newest WATERMARK value already loaded, None to select every row.
+    Returns:
+        list or None: The rows as dictionaries, None if the query failed.
+    """
+    present_columns = () if watermark is None else ("WATERMARK",)
 
-    sql = f"DELETE FROM [dbo].{table_name} WHERE {condition};"
+    statement = get_statement("worklist", db_schema, present_columns)
 
-    data = (sql, values)
+    values = dict(condition_data, WATERMARK=watermark)
+    data = (statement.sql, tuple(values[key] for key in statement.conditions), statement.selected)
 
-    return querie_exe(data)
+    return querie_exe(data, fetch_all=True)
 
 
 async def exec_procedure_for(db_schema: dict, values: dict):
@@ -228,6 +536,9 @@ async def exec_procedure_for(db_schema: dict, values: dict):
     procedure_name = db_schema["PROCEDURE_NAME"]
     parameters = db_schema["PARAMETERS"]
 
+    # A backend without stored procedures (SQLite) runs them in Python
+    procedure = get_db_backend().get_procedure(procedure_name)
+
     # Construct the parameter string for the EXEC query
     parameters_string = ", ".join([f"@{param} = ?" for param in parameters])
 
@@ -240,6 +551,9 @@ async def exec_procedure_for(db_schema: dict, values: dict):
     # Convert empty strings to None (NULL in SQL)
     value = tuple(None if v == "" else v for v in value)
 
+    if procedure is not None:
+        return procedure_exe(procedure, dict(zip(parameters, value)))
+
     data = (sql, value)
 
     return querie_exe(data)
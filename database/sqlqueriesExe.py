@@ -1,30 +1,72 @@
 from log.logger import log_info, log_error
-from database.sqlconnection import get_db_connection
+from database.sqlconnection import db_pool, db_breaker, get_db_backend
+from database.circuit_breaker import DatabaseUnavailableError
 
 
 SOURCE = "Database"
 
 
-def querie_exe(data):
+def querie_exe(data, fetch_all=False):
     """
     Executes the provided SQL query with the given values. Handles SELECT, INSERT, UPDATE, and DELETE queries.
 
     Args:
         data (tuple): A tuple containing the SQL query and the values to be inserted, updated, fetched, or deleted.
                       Example: (query, values)
+        fetch_all (bool): For SELECT queries, return every row instead of the first one.
 
     Returns:
         result (dict or None):
             - For SELECT queries, returns a dictionary with column names as keys and corresponding values from the first row as values.
+              With fetch_all, returns a list of such dictionaries, one per row (empty if there are none).
             - For non-SELECT queries (INSERT, UPDATE, DELETE), returns None after committing the transaction.
+
+    Raises:
+        DatabaseUnavailableError: If the database cannot be reached, see db_breaker.
     """
     log_info("Starting query execution.", source=SOURCE)
 
-    # Establish database connection
-    connection = get_db_connection()
     sql = data[0]
     values = data[1]
-    cursor = connection.cursor()
+
+    # Borrow a database connection from the pool
+    with db_pool.connection() as connection:
+        return _execute(connection, sql, values, data, fetch_all)
+
+
+def procedure_exe(procedure, values):
+    """
+    Runs a stored procedure emulated in Python by the database backend, see exec_procedure_for.
+
+    Args:
+        procedure (callable): The backend function, called with a connection and the values.
+        values (dict): The procedure parameter values by parameter name.
+
+    Returns:
+        list or None: The rows as dictionaries, None if there are none or the procedure failed.
+    """
+    log_info(f"Starting procedure {procedure.__name__}.", source=SOURCE)
+
+    # Borrow a database connection from the pool
+    with db_pool.connection() as connection:
+        try:
+            return procedure(connection, values) or None
+
+        except Exception as e:
+            log_error(
+                f"Error executing procedure {procedure.__name__} with values: {values}. Error: {e}",
+                source=SOURCE,
+            )
+            connection.rollback()
+            return None
+
+
+def _execute(connection, sql, values, data, fetch_all=False):
+    """
+    Executes a query on a pooled connection, see querie_exe.
+    The cursor stays open on the connection so the prepared statement is reused.
+    """
+    cursor = connection.statement_cursor(sql)
 
     try:
         # Execute the SQL query
@@ -38,6 +80,9 @@ def querie_exe(data):
             log_info(
                 f"Executed SELECT query: {sql} with values: {values}", source=SOURCE
             )
+            if fetch_all:
+                return [dict(zip(selected_value_variable, row)) for row in results]
+
             if results:
                 # Assuming the first row contains the result we want to map to variables
                 selected_value = {
@@ -51,7 +96,6 @@ def querie_exe(data):
         # For EXEC queries, fetch the results and return them
         elif sql.strip().upper().startswith("EXEC"):
 
-            cursor.execute(sql, values)
             results = cursor.fetchall()
             log_info(f"Executed EXEC query: {sql} with values: {values}", source=SOURCE)
 
@@ -82,11 +126,17 @@ def querie_exe(data):
             f"Error executing query: {sql} with values: {values}. Error: {e}",
             source=SOURCE,
         )
-        connection.rollback()  # Rollback in case of error
+        connection.discard_statement_cursor(sql)  # Do not reuse a cursor that failed
+
+        # A lost connection is not a query error, the callers must not take it for "no rows"
+        if get_db_backend().is_connection_error(e):
+            connection.mark_broken()
+            db_breaker.record_failure()
+            raise DatabaseUnavailableError(str(e)) from e
+
+        db_breaker.record_success()  # The database answered, only the query failed
+        connection.rollback()  # Rollback in case of error, a failed rollback drops the connection
         return None
 
     finally:
-        cursor.close()  # Ensure the cursor is closed
-        # Optionally, close the connection here if it's not needed anymore
-        connection.close()  # Uncomment if you want to close the connection after each query
         log_info("Query execution finished.", source=SOURCE)
@@ -0,0 +1,224 @@
+import asyncio
+import time
+from threading import Lock
+from log.logger import log_info, log_error
+from database.sqlqueries import data_worklist_for
+from database.sqldbdictionary import WORKLIST_SQL
+from hl7msghandel.hl7dictionary import PATIENT_INFO_SQL_TO_HL7_DICT
+from setting.config import get_config
+
+
+# Define the source for logging purposes
+SOURCE = "Database"
+
+cfg = get_config()  # Load configuration from file
+TEST_FINISH_CODE = cfg["TEST_FINISH_CODE"]
+
+# The patient info items answered to a sample query
+PATIENT_INFO_KEYS = ("NAME", "SEX", "AGE", "AGE_UNIT", "REQ_DATE")
+
+
+class Worklist:
+    """
+    The patient info of every pending CBC / HGB test, kept in memory so the ORM^O01
+    sample queries are answered without a database round trip.
+
+    The worklist is loaded when the server starts, then refreshed with the tests
+    requested at or after the newest request date already loaded. A periodic full
+    reload drops the tests that are no longer pending and picks up edited patients.
+    The entry of a patient is dropped when a result is written for it, like the
+    patient info cache.
+
+    Example:
+        patient_info = worklist.get(patient_id)  # None when not loaded, query the database
+    """
+
+    def __init__(self, refresh_interval, reload_interval):
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+
+        self._entries = {}  # patient id -> patient info, translated to the HL7 values
+        self._lock = Lock()
+        self.watermark = None  # Newest request date loaded
+        self.loaded_at = None  # time.monotonic() of the last full load
+        self._generation = 0  # Increased by each invalidation
+        self._invalidated = {}  # patient id -> generation of its last invalidation
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.failures = 0
+        self.invalidations = 0
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def get(self, patient_id):
+        """
+        Returns a copy of the patient info of a pending test, or None if it is not in the worklist.
+        """
+        with self._lock:
+            patient_info = self._entries.get(str(patient_id))
+            if patient_info is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(patient_info)
+
+    def load(self):
+        """
+        Loads every pending test, replacing the worklist. Blocks on the database.
+
+        Returns:
+            bool: True if the worklist was loaded, False if the query failed.
+        """
+        generation = self._generation
+        rows = self._select(None)
+        if rows is None:
+            self.failures += 1
+            log_error("Error loading the worklist, sample queries use the database.", source=SOURCE)
+            return False
+
+        entries = {}
+        watermark = self._add_rows(entries, rows, None)
+
+        with self._lock:
+            self._drop_invalidated(entries, generation)
+            # The invalidations older than the query are in the loaded rows already
+            self._invalidated = {
+                patient_id: invalidated
+                for patient_id, invalidated in self._invalidated.items()
+                if invalidated > generation
+            }
+            self._entries = entries
+            self.watermark = watermark
+            self.loaded_at = time.monotonic()
+
+        log_info(f"Worklist loaded with ({len(entries)}) pending tests.", source=SOURCE)
+        return True
+
+    def refresh(self):
+        """
+        Adds the tests requested at or after the watermark. Blocks on the database.
+
+        Returns:
+            bool: True if the worklist was refreshed, False if the query failed.
+        """
+        if self.watermark is None:
+            return self.load()
+
+        generation = self._generation
+        rows = self._select(self.watermark)
+        if rows is None:
+            self.failures += 1
+            log_error("Error refreshing the worklist.", source=SOURCE)
+            return False
+
+        with self._lock:
+            self.watermark = self._add_rows(self._entries, rows, self.watermark)
+            self._drop_invalidated(self._entries, generation)
+            self.refreshes += 1
+
+        if rows:
+            log_info(f"Worklist refreshed with ({len(rows)}) tests.", source=SOURCE)
+        return True
+
+    def invalidate(self, patient_id):
+        """
+        Drops the entry of a patient, e.g. after a result was written for it. Its next
+        sample query is answered from the patient info cache or the database.
+        """
+        key = str(patient_id)
+
+        with self._lock:
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def _drop_invalidated(self, entries, generation):
+        """
+        Drops the entries of the patients invalidated while the rows were being selected,
+        the selected rows may predate the result written for them.
+        """
+        for patient_id, invalidated in self._invalidated.items():
+            if invalidated > generation:
+                entries.pop(patient_id, None)
+
+    @staticmethod
+    def _select(watermark):
+        """
+        Selects the pending tests requested at or after the watermark, None if the query
+        failed or the database is unreachable.
+        """
+        try:
+            return data_worklist_for(WORKLIST_SQL, {"RESULT_STATE": TEST_FINISH_CODE}, watermark)
+        except ConnectionError as e:
+            log_error(f"Error selecting the worklist: {e}", source=SOURCE)
+            return None
+
+    @staticmethod
+    def _add_rows(entries, rows, watermark):
+        """
+        Adds the selected rows to the entries and returns the newest request date.
+        """
+        for row in rows:
+            patient_info = {}
+            for key in PATIENT_INFO_KEYS:
+                value = row[key]
+                patient_info[key] = PATIENT_INFO_SQL_TO_HL7_DICT.get(value, value)
+            entries[str(row["PATIENT_ID"])] = patient_info
+
+            test_date = row["TEST_DATE"]
+            if test_date is not None and (watermark is None or test_date > watermark):
+                watermark = test_date
+
+        return watermark
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._invalidated = {}
+            self.watermark = None
+            self.loaded_at = None
+
+    async def run(self):
+        """
+        Loads the worklist and keeps it refreshed until cancelled, the database work
+        runs on a separate thread. A failed load or refresh is retried on the next interval.
+        """
+        while True:
+            try:
+                if not self.is_loaded or time.monotonic() - self.loaded_at >= self.reload_interval:
+                    await asyncio.to_thread(self.load)
+                else:
+                    await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                # Retried on the next interval, the task must outlive a database outage
+                self.failures += 1
+                log_error(f"Error updating the worklist: {e}", source=SOURCE)
+
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self):
+        """
+        Returns the worklist size, the watermark and the lookup and refresh counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "loaded": self.is_loaded,
+                "size": len(self._entries),
+                "watermark": None if self.watermark is None else str(self.watermark),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "invalidations": self.invalidations,
+            }
+
+
+# Shared worklist of the pending tests
+worklist = Worklist(cfg["WORKLIST_REFRESH_INTERVAL"], cfg["WORKLIST_RELOAD_INTERVAL"])
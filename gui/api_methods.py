@@ -1,10 +1,89 @@
 import httpx
+import json
+import asyncio
+import websockets
 from setting.config import get_config
 
 cfg = get_config() # Load configuration from file
 api_port = cfg['API_PORT']
 api_ip = cfg['API_IP']
 api_base_url = f"http://{api_ip}:{api_port}"
+api_events_url = f"ws://{api_ip}:{api_port}/ws/events"
+
+EVENTS_RECONNECT_DELAY = 5  # Seconds between attempts to reconnect the events WebSocket
+
+
+class ServerEvents:
+    """
+    A single subscription to the /ws/events WebSocket of the FastAPI API.
+
+    Every listener is called with each event dict ({"type": ..., "data": ...}). While
+    `connected` is False the views poll the API instead, the connection is retried
+    every EVENTS_RECONNECT_DELAY seconds and starts with a "status" event.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.listeners = []
+        self.connected = False
+        self.running = False
+
+    def add_listener(self, listener):
+        """
+        Registers a listener and starts the subscription if needed.
+        """
+        self.listeners.append(listener)
+        if not self.running:
+            self.running = True
+            self.page.run_task(self.receive_loop)
+
+    def remove_listener(self, listener):
+        """
+        Removes a listener, the subscription stops with the last one.
+        """
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+        if not self.listeners:
+            self.running = False
+
+    async def receive_loop(self):
+        """
+        Receives the events and passes them to the listeners until stopped.
+        """
+        while self.running:
+            try:
+                async with websockets.connect(api_events_url) as websocket:
+                    self.connected = True
+                    while self.running:
+                        try:
+                            raw_event = await asyncio.wait_for(
+                                websocket.recv(), EVENTS_RECONNECT_DELAY
+                            )
+                        except asyncio.TimeoutError:
+                            continue  # Check whether the subscription was stopped
+                        event = json.loads(raw_event)
+                        for listener in list(self.listeners):
+                            listener(event)
+            except Exception as e:
+                if self.connected:
+                    print(f"Events connection lost: {e}")
+            finally:
+                self.connected = False
+
+            if self.running:
+                await asyncio.sleep(EVENTS_RECONNECT_DELAY)
+
+
+def get_server_events(page):
+    """
+    Returns the events subscription of the page, creating it on first use.
+    Each page (browser tab) shares one WebSocket between its views.
+    """
+    server_events = page.session.get("server_events")
+    if server_events is None:
+        server_events = ServerEvents(page)
+        page.session.set("server_events", server_events)
+    return server_events
 
 
 async def fetch_server_status():
@@ -22,20 +101,23 @@ async def fetch_server_status():
         return {"state": "Error", "text": str(e), "clients": {}}
 
 
-async def fetch_communication_messages():
+async def fetch_communication_messages(since=0):
     """
-    Fetch communication messages from the FastAPI API.
+    Fetch the communication messages newer than the since sequence id from the FastAPI API.
+    Returns a dict with the new "messages" and the "head" sequence id to pass as since next time.
     """
     try:
         async with httpx.AsyncClient() as client:
-            response = await client.get(f"{api_base_url}/server/messages")
+            response = await client.get(
+                f"{api_base_url}/server/messages", params={"since": since}
+            )
             if response.status_code == 200:
                 return response.json()
             else:
-                return []
+                return {"head": since, "messages": []}
     except Exception as e:
         print(f"Error fetching messages: {e}")
-        return []
+        return {"head": since, "messages": []}
 
 
 async def toggle_server_state(current_state):
@@ -12,6 +12,7 @@ app_ver = cfg["VERSION"]
 server_status = {
     "state": "Offline",
     "text": "Server is offline",
+    "lifecycle": "stopped",
     "color": "red",
     "clients": {},
 }
@@ -55,8 +56,8 @@ def server_control(page: ft.Page):
         """
         result = await toggle_server_state(
             server_status["state"]
-        )  # Toggle server state using the API
-        await status_updater.periodic_status_check()  # Refresh status immediately after toggle
+        )  # Toggle server state using the API, returns once the server started or stopped
+        await status_updater.refresh_status()  # Refresh status immediately after toggle
 
     # Server status indicator
     status_indicator = ft.Container(
@@ -1,5 +1,5 @@
 import flet as ft
-from gui.api_methods import fetch_server_status, stop_server  # Import API methods
+from gui.api_methods import fetch_server_status, stop_server, get_server_events  # Import API methods
 from setting.config import get_config
 import asyncio
 
@@ -11,7 +11,8 @@ SUPPORTED_DEVICES = cfg["SUPPORTED_DEVICES"]
 
 class ServerStatusUpdater(ft.Text):
     """
-    A UI component that periodically fetches and updates server status and client avatars.
+    A UI component that updates server status and client avatars.
+    The changes are pushed by the events WebSocket, the status is polled only while it is down.
     """
 
     def __init__(
@@ -27,7 +28,10 @@ class ServerStatusUpdater(ft.Text):
     def did_mount(self):
         """Initializes the updater and starts periodic server status checks upon mounting."""
         self.running = True
+        self.status = None  # Last status shown
         if self.page:
+            self.server_events = get_server_events(self.page)
+            self.server_events.add_listener(self.on_server_event)
             self.page.run_task(self.periodic_status_check)
 
     def will_unmount(self):
@@ -35,6 +39,21 @@ class ServerStatusUpdater(ft.Text):
         Stops the server status updater by setting the running flag to False.
         """
         self.running = False
+        if self.page:
+            self.server_events.remove_listener(self.on_server_event)
+
+    def on_server_event(self, event):
+        """
+        Updates the status from an event pushed by the server.
+        """
+        if event["type"] == "status":
+            self.show_status(event["data"])
+        elif self.status is None:
+            return  # The first status of the connection is not received yet
+        elif event["type"] == "server":
+            self.show_status({**self.status, **event["data"]})
+        elif event["type"] == "clients":
+            self.show_status({**self.status, "clients": event["data"]})
 
     def client_connected_avatar(self, client_dict):
         """
@@ -95,29 +114,52 @@ class ServerStatusUpdater(ft.Text):
 
     async def periodic_status_check(self):
         """
-        Periodically checks and updates the server status and related UI components.
+        Periodically checks and updates the server status while the events WebSocket is down.
         """
         while self.running:
-            status = await fetch_server_status()  # Fetch status using the API
-            self.server_status.update(status)
-            self.status_indicator.bgcolor = (
-                "green" if status["state"] == "Online" else "red"
-            )
-            self.status_indicator.tooltip = (
-                f"State: {status['state']}\nDetails: {status['text']}"
-            )
+            if not self.server_events.connected:
+                await self.refresh_status()
+            await asyncio.sleep(5)
 
-            # Update the clients avatars container
-            self.clients_avatars.content = self.client_connected_avatar(
-                status["clients"]
-            )  # Update controls directly
-            self.server_button.text = (
-                "Stop Server" if status["state"] == "Online" else "Start Server"
-            )
+    async def refresh_status(self):
+        """
+        Fetches the server status once and updates the UI components.
+        """
+        status = await fetch_server_status()  # Fetch status using the API
+        self.show_status(status)
 
-            if self.page:
-                self.page.update()
-            await asyncio.sleep(5)
+    def show_status(self, status):
+        """
+        Updates the server status and related UI components.
+        """
+        if not self.running:
+            return
+
+        self.status = status
+        self.server_status.update(status)
+        self.status_indicator.bgcolor = (
+            "green" if status["state"] == "Online" else "red"
+        )
+        self.status_indicator.tooltip = (
+            f"State: {status['state']}\nDetails: {status['text']}"
+        )
+
+        # Update the clients avatars container
+        self.clients_avatars.content = self.client_connected_avatar(
+            status["clients"]
+        )  # Update controls directly
+        self.server_button.text = (
+            "Stop Server" if status["state"] == "Online" else "Start Server"
+        )
+
+        # The server cannot be toggled while it is starting or stopping
+        lifecycle = status.get("lifecycle")
+        self.server_button.disabled = lifecycle in ("starting", "stopping")
+        if self.server_button.disabled:
+            self.server_button.text = f"{lifecycle.capitalize()}..."
+
+        if self.page:
+            self.page.update()
 
 
 async def close_app(page: ft.Page):
@@ -1,10 +1,13 @@
 ﻿import flet as ft
 from datetime import datetime
-from gui.api_methods import fetch_communication_messages
+from gui.api_methods import fetch_communication_messages, get_server_events
 import asyncio
 from collections import defaultdict
 from log.logger import log_info, log_error
 
+# Messages kept in a device tab, the oldest are removed first
+MAX_TAB_MESSAGES = 100
+
 
 class MessageBubble(ft.Container):
     """A chat bubble to display a single message"""
@@ -108,21 +111,24 @@ class DeviceTab(ft.Container):
         self.scroll_position = e.pixels
         
     def update_messages(self, messages: list):
-        """Update messages in this tab"""
-        # Sort messages by timestamp
-        sorted_messages = sorted(messages, key=lambda x: x["timestamp"])
-        
-        # Check if messages have changed
-        if sorted_messages != self.messages:
-            current_scroll = self.scroll_position  # Save current scroll position
-            
-            self.messages = sorted_messages.copy()  # Make a copy to prevent reference issues
-            self.message_list.controls = [MessageBubble(msg) for msg in sorted_messages]
-            
-            # Restore scroll position after update
-            self.message_list.scroll_to(offset=current_scroll, duration=0)
-            return True
-        return False
+        """Append new messages to this tab, they arrive in sequence order"""
+        if not messages:
+            return False
+
+        current_scroll = self.scroll_position  # Save current scroll position
+
+        self.messages.extend(messages)
+        self.message_list.controls.extend(MessageBubble(msg) for msg in messages)
+
+        # Drop the oldest messages beyond the limit
+        extra = len(self.messages) - MAX_TAB_MESSAGES
+        if extra > 0:
+            del self.messages[:extra]
+            del self.message_list.controls[:extra]
+
+        # Restore scroll position after update
+        self.message_list.scroll_to(offset=current_scroll, duration=0)
+        return True
 
 class TabInfo:
     """Helper class to store tab information"""
@@ -140,6 +146,8 @@ class CommunicationView(ft.Column):
         self.message_cutoff_times = {}  # Track cutoff time for messages per device
         self.update_pending = False  # Flag to prevent multiple simultaneous updates
         self.last_selected_tab = None  # Track the last selected tab
+        self.last_seq = 0  # Sequence id of the last processed message
+        self.fetch_needed = asyncio.Event()  # Set when pushed messages were missed
         
         # Create tabs
         self.tabs = ft.Tabs(
@@ -154,8 +162,10 @@ class CommunicationView(ft.Column):
             self.tabs
         ]
         
-        # Start message updates
+        # Start message updates, pushed by the events WebSocket and polled while it is down
         if self.page:
+            self.server_events = get_server_events(self.page)
+            self.server_events.add_listener(self.on_server_event)
             self.page.run_task(self.update_loop)
     
     def on_tab_change(self, e):
@@ -180,6 +190,8 @@ class CommunicationView(ft.Column):
     def will_unmount(self):
         """Cleanup when view is unmounted"""
         self.running = False
+        if self.page:
+            self.server_events.remove_listener(self.on_server_event)
         self.device_tabs.clear()
         self.message_cutoff_times.clear()
     
@@ -313,29 +325,59 @@ class CommunicationView(ft.Column):
             log_error(f"Error updating device tabs: {e}")
             return False
     
+    def on_server_event(self, event):
+        """Show a message pushed by the server, or fetch the missed ones"""
+        if event["type"] == "status":
+            if event["data"]["head"] != self.last_seq:
+                self.fetch_needed.set()
+
+        elif event["type"] == "message":
+            msg = event["data"]
+
+            if msg["seq"] == self.last_seq + 1:
+                self.last_seq = msg["seq"]
+                if self.update_device_tabs([msg]):
+                    self.page.update()
+            elif msg["seq"] > self.last_seq:
+                self.fetch_needed.set()  # Events were dropped, fetch the gap
+
+    async def fetch_messages(self):
+        """Fetch and display the messages newer than the last processed one"""
+        feed = await fetch_communication_messages(self.last_seq)
+
+        if feed["head"] < self.last_seq:
+            # The server restarted and its sequence ids started over
+            self.last_seq = 0
+            feed = await fetch_communication_messages(0)
+
+        # Only new messages are returned, skip any pushed meanwhile
+        messages = [msg for msg in feed["messages"] if msg["seq"] > self.last_seq]
+        self.last_seq = max(self.last_seq, feed["head"])
+
+        if self.update_device_tabs(messages):
+            self.page.update()
+
     async def update_loop(self):
-        """Main update loop for fetching and displaying messages"""
-        last_messages = []  # Keep track of last processed messages
-        
+        """Main update loop fetching the messages while they are not pushed"""
         while self.running:
             try:
-                if not self.update_pending:
+                if not self.update_pending and (
+                    not self.server_events.connected or self.fetch_needed.is_set()
+                ):
                     self.update_pending = True
-                    messages = await fetch_communication_messages()
-                    
-                    # Only update if messages have changed
-                    if messages != last_messages:
-                        last_messages = messages.copy()
-                        if self.update_device_tabs(messages):
-                            self.page.update()
-                    
+                    self.fetch_needed.clear()
+                    await self.fetch_messages()
                     self.update_pending = False
                     
             except Exception as e:
                 log_error(f"Error in update loop: {e}")
                 self.update_pending = False
-            
-            await asyncio.sleep(5)
+
+            # Wake up early when pushed messages were missed
+            try:
+                await asyncio.wait_for(self.fetch_needed.wait(), 5)
+            except asyncio.TimeoutError:
+                pass
 
 def result_view(page: ft.Page):
     """Create the communication view"""
@@ -14,6 +14,7 @@
 # }
 
 from log.logger import log_info
+from hl7msghandel.hl7fitsql import compile_hl7_plan
 # Define SOURCE for logging purposes
 SOURCE = "HL7Message"
 log_info("Loading HL7 schema definitions...", source=SOURCE)
@@ -249,4 +250,34 @@ PATIENT_TEST_HL7 = {
         }
     }
 }
-log_info("Loaded HL7 message schema for patient requested test waiting list.", source=SOURCE)
\ No newline at end of file
+log_info("Loaded HL7 message schema for patient requested test waiting list.", source=SOURCE)
+
+# Define tables and columns for the combined result message lookup (ORU HL7)
+RESULT_LOOKUP_HL7 = {
+    "COLUMN_NAME" : {
+        "TEST_CODE" : 'SQL',
+        "RESULT_STATE" : 'SQL',
+        "PATIENT_EXIST" : 'SQL',
+        "NAME" : 'SQL',
+        "REQ_DATE" : 'SQL',
+        "RESULT_EXIST" : 'SQL'
+    },
+    "CONDITION" : {
+        "PATIENT_ID" : {
+            'S' : 'PID',
+            'N' : '0',
+            'F' : '3'
+        }
+    }
+}
+log_info("Loaded HL7 message schema for the combined result message lookup.", source=SOURCE)
+
+# Compile the HL7 dictionaries once into the extraction plans used by the queries
+RESULT_EXIST_PLAN = compile_hl7_plan(RESULT_EXIST_HL7)
+CBC_RESULT_PLAN = compile_hl7_plan(CBC_RESULT_HL7)
+HGB_RESULT_PLAN = compile_hl7_plan(HGB_RESULT_HL7)
+PATIENT_INFO_ORU_PLAN = compile_hl7_plan(PATIENT_INFO_ORU_HL7)
+PATIENT_INFO_ORM_PLAN = compile_hl7_plan(PATIENT_INFO_ORM_HL7)
+PATIENT_TEST_PLAN = compile_hl7_plan(PATIENT_TEST_HL7)
+RESULT_LOOKUP_PLAN = compile_hl7_plan(RESULT_LOOKUP_HL7)
+log_info("Compiled HL7 message schemas into extraction plans.", source=SOURCE)
\ No newline at end of file
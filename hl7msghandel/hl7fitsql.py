@@ -1,77 +1,112 @@
 from log.logger import log_info, log_error
-from copy import deepcopy
+from collections import namedtuple
 
 # Define the source for logging purposes
 SOURCE = "HL7Message"
 
+# Markers for dictionary items whose value is not read from the HL7 message
+SQL_FIELD = "SQL"
+MANUAL_FIELD = "MANUAL"
 
-def update_hl7_dictionary(hl7_message, hl7_dictionary, sql_data=None, manual_data=None):
+# Extraction plan compiled from an HL7 dictionary.
+# Each item of `columns` and `conditions` is a (column, segment, index, field) tuple,
+# with segment set to SQL_FIELD or MANUAL_FIELD (and index/field None) for values
+# supplied by the caller.
+Hl7Plan = namedtuple("Hl7Plan", ["columns", "conditions"])
+
+# Values extracted from an HL7 message with a plan, in plan order.
+# Columns without a value (SQL/MANUAL data not supplied) are left out.
+Hl7Values = namedtuple(
+    "Hl7Values", ["columns", "values", "condition_columns", "condition_values"]
+)
+
+
+def _compile_item(key, value):
+    """
+    Converts one HL7 dictionary item to a (column, segment, index, field) tuple.
+    """
+    if value in (SQL_FIELD, MANUAL_FIELD):
+        return (key, value, None, None)
+
+    return (key, value["S"], int(value["N"]), int(value["F"]))
+
+
+def compile_hl7_plan(hl7_dictionary):
     """
-    Updates the HL7 dictionary with the provided message and dictionary.
+    Compiles an HL7 dictionary from hl7dictionary.py into an immutable extraction plan.
 
     Args:
-        hl7_message: The HL7 message object from which the values are extracted.
-        hl7_dictionary: The HL7 dictionary that needs to be updated.
-        sql_data: Optional dictionary containing SQL data to update the dictionary (default is None).
-        manual_data: Optional dictionary containing manual data to update the dictionary (default is None).
+        hl7_dictionary: The HL7 dictionary with "COLUMN_NAME" and "CONDITION" items.
 
     Returns:
-        The updated HL7 dictionary.
+        Hl7Plan: The plan to pass to apply_hl7_plan.
     """
-    # Create a deep copy of the HL7 dictionary to avoid modifying the original
-    hl7_dictionary_copy = deepcopy(hl7_dictionary)
-
-    result_dictionary = hl7_dictionary_copy["COLUMN_NAME"]
-    condition_dictionary = hl7_dictionary_copy["CONDITION"]
-
-    result_dictionary_deleted_list = []
-
-    # Iterate through the result dictionary to update values
-    for key, value in result_dictionary.items():
-        if value == "SQL":
-            try:
-                # Update the result dictionary with SQL data if provided
-                if sql_data is not None:
-                    result_dictionary[key] = sql_data[key]
-            except Exception as e:
-                log_error(f"Error updating sql dictionary: {e}", source=SOURCE)
-
-        elif value == "MANUAL":
-            try:
-                # Update the result dictionary with manual data if provided
-                if manual_data is not None:
-                    result_dictionary[key] = manual_data[key]
-                result_dictionary_deleted_list.append(key)
-            except Exception as e:
-                log_error(f"Error updating manual dictionary: {e}", source=SOURCE)
+    columns = tuple(
+        _compile_item(key, value)
+        for key, value in hl7_dictionary["COLUMN_NAME"].items()
+    )
+    conditions = tuple(
+        _compile_item(key, value)
+        for key, value in hl7_dictionary["CONDITION"].items()
+    )
 
-        else:
-            try:
-                # Extract values from the HL7 message for other keys
-                segment = result_dictionary[key]["S"]
-                s_number = int(result_dictionary[key]["N"])
-                field = int(result_dictionary[key]["F"])
-                result_value = hl7_message.segments(segment)[s_number][field]
-                result_dictionary[key] = result_value
-            except Exception as e:
-                log_error(f"Error updating condition dictionary: {e}", source=SOURCE)
-
-    # Remove keys from the result dictionary that were marked for deletion
-    for result in result_dictionary_deleted_list:
-        try:
-            del result_dictionary[result]
-        except Exception as e:
-            log_error(f"Error deleting empty result dictionary: {e}", source=SOURCE)
+    return Hl7Plan(columns, conditions)
+
+
+def _to_sql_value(value):
+    """
+    Converts an extracted value to the string bound to the SQL query, keeping None as NULL.
+    """
+    return None if value is None else str(value)
 
-    # Update the condition dictionary with values from the HL7 message
-    for key in condition_dictionary.keys():
+
+def apply_hl7_plan(hl7_message, hl7_plan, sql_data=None, manual_data=None):
+    """
+    Extracts the values addressed by a plan from an HL7 message.
+
+    Args:
+        hl7_message (IndexedHl7Message): The HL7 message object from which the values are extracted.
+        hl7_plan (Hl7Plan): The compiled plan of the HL7 dictionary.
+        sql_data: Optional dictionary containing the values of the SQL items (default is None).
+        manual_data: Optional dictionary containing the values of the MANUAL items (default is None).
+
+    Returns:
+        Hl7Values: The column names and values and the condition names and values.
+    """
+    def message_value(column, segment, index, field):
         try:
-            segment = condition_dictionary[key]["S"]
-            s_number = int(condition_dictionary[key]["N"])
-            field = int(condition_dictionary[key]["F"])
-            condition_value = hl7_message.segments(segment)[s_number][field]
-            condition_dictionary[key] = condition_value
+            return _to_sql_value(hl7_message.segments(segment)[index][field])
         except Exception as e:
-            log_error(f"Error updating condition dictionary: {e}", source=SOURCE)
+            log_error(f"Error reading {column} from {segment}: {e}", source=SOURCE)
+            return None
+
+    columns = []
+    values = []
+
+    for column, segment, index, field in hl7_plan.columns:
+        if segment == SQL_FIELD:
+            if sql_data is None:
+                continue
+            if column not in sql_data:
+                log_error(f"Error updating sql dictionary: missing {column}", source=SOURCE)
+                continue
+            value = _to_sql_value(sql_data[column])
+
+        elif segment == MANUAL_FIELD:
+            if manual_data is None or column not in manual_data:
+                continue
+            value = _to_sql_value(manual_data[column])
+
+        else:
+            value = message_value(column, segment, index, field)
+
+        columns.append(column)
+        values.append(value)
+
+    condition_columns = tuple(item[0] for item in hl7_plan.conditions)
+    condition_values = tuple(
+        message_value(column, segment, index, field)
+        for column, segment, index, field in hl7_plan.conditions
+    )
 
-    return hl7_dictionary_copy
+    return Hl7Values(tuple(columns), tuple(values), condition_columns, condition_values)
@@ -0,0 +1,58 @@
+from hl7 import Sequence
+
+
+class IndexedHl7Message:
+    """
+    A parsed HL7 message with its segments indexed by segment name.
+
+    Wraps the `hl7.Message` built by parse_hl7_message so that `segments()` and
+    `segment()` are dictionary lookups instead of a scan of every segment.
+    Indexing, iteration, len() and str() behave like the wrapped message.
+    """
+
+    __slots__ = ("message", "_index")
+
+    def __init__(self, message):
+        self.message = message
+
+        # Build the index once, keeping the message order within each name
+        index = {}
+        for segment in message:
+            index.setdefault(str(segment[0][0]), Sequence()).append(segment)
+        self._index = index
+
+    def segments(self, segment_id):
+        """
+        Returns the segments identified by the segment_id (e.g. OBR, MSH, ORC, OBX).
+
+        Raises:
+            KeyError: If the message has no such segment, like hl7.Message.segments.
+        """
+        try:
+            return self._index[segment_id]
+        except KeyError:
+            raise KeyError(f"No {segment_id} segments") from None
+
+    def segment(self, segment_id):
+        """
+        Returns the first segment identified by the segment_id.
+        """
+        return self.segments(segment_id)[0]
+
+    def has_segment(self, segment_id):
+        """
+        Returns True if the message contains at least one segment_id segment.
+        """
+        return segment_id in self._index
+
+    def __len__(self):
+        return len(self.message)
+
+    def __iter__(self):
+        return iter(self.message)
+
+    def __getitem__(self, key):
+        return self.message[key]
+
+    def __str__(self):
+        return str(self.message)
@@ -1,26 +1,42 @@
 from hl7 import parse
 from log.logger import log_info, log_error
 from hl7msghandel.hl7validator import validate_hl7_message
+from hl7msghandel.hl7message import IndexedHl7Message
+from hl7msghandel.hl7tokenizer import tokenize_hl7_message
+from setting.config import get_config
 
 
 # Define the source for logging purposes
 SOURCE = "HL7Message"
 
+cfg = get_config()  # Load configuration from file
+HL7_FAST_PARSE = cfg["HL7_FAST_PARSE"]
+
 
 def parse_hl7_message(raw_message, message_direction):
     """
     Parses a raw HL7 message string into an hl7 message container.
+    ORU^R01 and ORM^O01 messages are tokenized lazily when HL7_FAST_PARSE is on,
+    the other message types are parsed with hl7.parse.
 
     Args:
-        raw_message (str): The raw HL7 message string.
+        raw_message (bytes or str): The raw HL7 message.
 
     Returns:
-        hl7.Message: Parsed HL7 message object, or None if parsing fails.
+        IndexedHl7Message or LazyHl7Message: Parsed HL7 message with its segments indexed by name, or None if parsing fails.
     """
     try:
 
         log_info(f"Parsing {message_direction} HL7 message.", source=SOURCE)
-        hl7_message = parse(raw_message)  # Parse HL7 into a container
+        hl7_message = None
+
+        if HL7_FAST_PARSE:
+            if isinstance(raw_message, bytes):
+                raw_message = raw_message.decode("utf-8")  # Decoded once, also for the hl7.parse fallback
+            hl7_message = tokenize_hl7_message(raw_message)
+
+        if hl7_message is None:
+            hl7_message = IndexedHl7Message(parse(raw_message))  # Parse HL7 into a container
         log_info(
             f"{message_direction} HL7 message parsed successfully: With ({(len(hl7_message))}) Segments.",
             source=SOURCE,
@@ -3,6 +3,13 @@ from setting.config import get_config, save_config
 from database.sqlqueries import *
 from database.sqldbdictionary import *
 from hl7msghandel.hl7dictionary import *
+from hl7msghandel.hl7parser import parse_hl7_message
+from hl7msghandel.hl7validator import validate_hl7_message
+from hl7msghandel.hl7template import ByteTemplate, TimestampCache
+from database.patient_cache import patient_info_cache
+from database.worklist import worklist
+from database.result_writer import result_writer, wait_committed, ACK_AFTER_COMMIT
+from database.circuit_breaker import DatabaseUnavailableError
 from datetime import datetime
 
 
@@ -15,6 +22,35 @@ HGB_TEST_CODE = cfg["HGB_TEST_CODE"]
 TEST_FINISH_CODE = cfg["TEST_FINISH_CODE"]
 APPLICATION_NAME = cfg["APPLICATION_NAME"]
 VERSION = cfg["VERSION"]
+RESPONSE_TIMEOUT = cfg["RESPONSE_TIMEOUT"]
+
+# Response templates, encoded once with the application name and version filled in
+RESPONSE_HEADER = "\x0bMSH|^~\\&|{application}|{version}|||{timestamp}||{msg_type}|{msg_id}|P|2.3.1|||||CHA|UTF-8|||\r"
+
+ACK_TEMPLATE = ByteTemplate(
+    RESPONSE_HEADER + "MSA|{ack_code}|{msg_id}||||0|\r\x1c\r",
+    application=APPLICATION_NAME,
+    version=VERSION,
+    msg_type="ACK^R01",
+)
+
+ORDER_RESPONSE_TEMPLATE = ByteTemplate(
+    RESPONSE_HEADER
+    + "MSA|AA|{msg_id}||||0|\r"
+    "PID|1||{patient_id}|{patient_name}|{patient_name}|||{patient_sex}|||||||||||||||||||||||\r"
+    "PV1|1||||||||||||||||||||||||||||||||||||||||||||||||||||\r"
+    "ORC|AF|{patient_id}|||||||||||||||||||||||\r"
+    "OBR|1|||||||||||||||||||||||||||||||Genrui||||||||||||||\r"
+    "OBX|2|IS|^Blood Mode^||WH||||||F|||||||\r"
+    "OBX|3|IS|^Test Mode^||CBC||||||F|||||||\r"
+    "OBX|5|IS|^Age^||{patient_age}|{patient_age_unit}|||||F|||||||\r\x1c\r",
+    application=APPLICATION_NAME,
+    version=VERSION,
+    msg_type="ORR^O02",
+)
+
+# MSH-7 of the responses, formatted once per second
+response_timestamp = TimestampCache()
 
 
 def time_now():
@@ -29,16 +65,20 @@ def generate_response_message(hl7_message):
     Generates a response message based on the incoming HL7 message type.
 
     Args:
-        hl7_message (hl7.Message): The parsed HL7 message object.
+        hl7_message (IndexedHl7Message): The parsed HL7 message object.
 
     Returns:
         str: Response HL7 message string.
+
+    Raises:
+        DatabaseUnavailableError: If the database cannot be reached, the message is
+            left to the caller, see generate_incoming_response.
     """
 
     try:
 
         # Access the first segment and ensure it's parsed correctly
-        hl7_msh = hl7_message.segments("MSH")[0]
+        hl7_msh = hl7_message.segment("MSH")
 
         if len(hl7_msh) <= 8:
             log_error("Insufficient MSH fields.", source=SOURCE)
@@ -60,16 +100,18 @@ def generate_response_message(hl7_message):
             sender_name_ver = None
 
         # accsess message id from MSH segment
-        msg_id = hl7_message.segments("MSH")[0][10]
+        msg_id = hl7_msh[10]
 
         log_info(f"Processing HL7 message type ({hl7_message_type})", source=SOURCE)
 
         if hl7_message_type == "ORU^R01":  # CBC device result_msg <<<
 
             # handel result message and generate ack message
+            response, committed = handel_result_message(hl7_message, msg_id)
             return {
-                "respose": handel_result_message(hl7_message, msg_id),
+                "respose": response,
                 "sender": sender_name_ver,
+                "committed": committed,
             }
 
         elif hl7_message_type == "ORM^O01":  # CBC device info_request_msg <<<
@@ -92,6 +134,8 @@ def generate_response_message(hl7_message):
                 source=SOURCE,
             )
             return {"respose": None, "sender": sender_name_ver}
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         log_error(f"Error generating HL7 response: {e}", source=SOURCE)
         return {"respose": None, "sender": None}
@@ -101,12 +145,21 @@ def handel_result_message(hl7_message, msg_id):
     """
     Handles the incoming result message and generates a response message.
     handel "ORU^R01" # CBC device result_msg <<<
+
+    Returns:
+        tuple: The ACK message and the future of the queued result write, None
+        when the result was written before returning or not written at all.
+
+    Raises:
+        DatabaseUnavailableError: If the database cannot be reached.
     """
 
     ack_code = True
+    committed = None
     try:
-        patient_requested = data_select_for(
-            PATIENT_TEST_SQL, PATIENT_TEST_HL7, hl7_message
+        # Get the requested test, the patient info and the result state in one query
+        patient_requested = data_lookup_for(
+            RESULT_LOOKUP_SQL, RESULT_LOOKUP_PLAN, hl7_message
         )
 
         test_code = None
@@ -123,67 +176,43 @@ def handel_result_message(hl7_message, msg_id):
                     source=SOURCE,
                 )
 
-            # Get patient info for request date from MSSQL
-            patient_info = data_select_for(
-                PATIENT_INFO_SQL, PATIENT_INFO_ORU_HL7, hl7_message
-            )
             request_date = {"REQ_DATE": time_now()}
 
             patient_name = None
 
-            if patient_info and type(patient_info) == dict:
+            if patient_requested["PATIENT_EXIST"]:
                 try:
-                    request_date["REQ_DATE"] = patient_info["REQ_DATE"]
-                    patient_name = patient_info["NAME"]
+                    request_date["REQ_DATE"] = patient_requested["REQ_DATE"]
+                    patient_name = patient_requested["NAME"]
                 except Exception as e:
                     log_error(
                         f"Error retrieving patient info from MSSQL: {e}", source=SOURCE
                     )
 
-                result_exist = data_select_for(
-                    RESULT_EXIST_SQL, RESULT_EXIST_HL7, hl7_message
-                )
+                result_exist = patient_requested["RESULT_EXIST"]
+
+                # insert the new record or update the existing one in a single statement
+                result_state = "updated" if result_exist else "saved"
 
                 if test_code == CBC_TEST_CODE and test_finish == TEST_FINISH_CODE:
-                    if not result_exist:
-                        # insert the new record
-                        data_insert_for(
-                            CBC_RESULT_SQL, CBC_RESULT_HL7, hl7_message, request_date
-                        )
-                        log_info(
-                            f"CBC result for : {patient_name} saved succsesfully",
-                            source=SOURCE,
-                        )
-                    else:
-                        # update the existing record
-                        data_update_for(
-                            CBC_RESULT_SQL, CBC_RESULT_HL7, hl7_message, request_date
-                        )
-                        log_info(
-                            f"CBC result for : {patient_name} updated succsesfully",
-                            source=SOURCE,
-                        )
+                    committed = write_result(
+                        CBC_RESULT_SQL, CBC_RESULT_PLAN, hl7_message, request_date
+                    )
+                    invalidate_patient_info(hl7_message.segment("PID")[3])
+                    log_info(
+                        f"CBC result for : {patient_name} {result_state} succsesfully",
+                        source=SOURCE,
+                    )
 
                 elif test_code == HGB_TEST_CODE and test_finish == TEST_FINISH_CODE:
-
-                    if not result_exist:
-                        # insert the new record
-                        data_insert_for(
-                            HGB_RESULT_SQL, HGB_RESULT_HL7, hl7_message, request_date
-                        )
-                        log_info(
-                            f"Haemoglobin result for : {patient_name} saved succsesfully",
-                            source=SOURCE,
-                        )
-                    else:
-                        # update the existing record
-                        data_update_for(
-                            HGB_RESULT_SQL, HGB_RESULT_HL7, hl7_message, request_date
-                        )
-                        log_info(
-                            f"Haemoglobin result for : {patient_name} updated succsesfully",
-                            source=SOURCE,
-                        )
+                    committed = write_result(
+                        HGB_RESULT_SQL, HGB_RESULT_PLAN, hl7_message, request_date
+                    )
+                    invalidate_patient_info(hl7_message.segment("PID")[3])
+                    log_info(
+                        f"Haemoglobin result for : {patient_name} {result_state} succsesfully",
+                        source=SOURCE,
+                    )
                 else:
                     log_error(
                         f"Unknown test code {test_code}, message NO.:{msg_id}.",
@@ -197,12 +226,51 @@ def handel_result_message(hl7_message, msg_id):
             log_info(f"This patient id didn't requested.", source=SOURCE)
             ack_code = False
 
+    except DatabaseUnavailableError:
+        raise
     except Exception as e:
         log_error(f"Error processing result message: {e}", source=SOURCE)
         ack_code = False
 
+    # In write-behind mode the ACK waits for the batch of the result unless acknowledged after the journal
+    if committed is not None and result_writer.ack_mode == ACK_AFTER_COMMIT:
+        ack_code = wait_committed(committed, RESPONSE_TIMEOUT)
+        if ack_code is None:
+            log_error(f"Result of message NO.:{msg_id} was not written in time.", source=SOURCE)
+            ack_code = False
+
     # "ACK^R01",       # >>> Interface result_msg_ack
-    return generate_ack_message(msg_id, ack_code)
+    return generate_ack_message(msg_id, ack_code), committed
+
+
+def write_result(db_schema, hl7_plan, hl7_message, request_date):
+    """
+    Writes a result, or queues it on the result writer in write-behind mode.
+
+    Returns:
+        concurrent.futures.Future: Set to True once the queued result is committed,
+        or None if the result was written directly.
+    """
+    committed = None
+
+    if result_writer.is_running:
+        committed = result_writer.submit(
+            *data_upsert_statement_for(db_schema, hl7_plan, hl7_message, request_date)
+        )
+
+    if committed is None:
+        data_upsert_for(db_schema, hl7_plan, hl7_message, request_date)
+
+    return committed
+
+
+def invalidate_patient_info(patient_id):
+    """
+    Drops the patient info kept in memory for a patient a result was written for,
+    so its next sample query is answered from the database.
+    """
+    worklist.invalidate(patient_id)
+    patient_info_cache.invalidate(patient_id)
 
 
 def handel_info_request_message(hl7_message, msg_id):
@@ -211,19 +279,19 @@ def handel_info_request_message(hl7_message, msg_id):
     handel "ORM^O01" # CBC device info_request_msg <<<
     """
 
-    patient_id = hl7_message.segments("ORC")[0][3]
+    patient_id = hl7_message.segment("ORC")[3]
 
-    # Get patient info from MSSQL
-    patient_info = data_select_for(PATIENT_INFO_SQL, PATIENT_INFO_ORM_HL7, hl7_message)
+    # Get patient info from the preloaded worklist, then from the cache, or from MSSQL on a miss
+    patient_info = worklist.get(patient_id) if worklist.is_loaded else None
+    if patient_info is None:
+        patient_info = patient_info_cache.lookup(
+            patient_id, lambda: select_patient_info(hl7_message)
+        )
 
     # set patient info to defult if patient info not found in db
-
-    if patient_info and type(patient_info) == dict:
-        for key in patient_info.keys():
-            if patient_info[key] in PATIENT_INFO_SQL_TO_HL7_DICT.keys():
-                patient_info[key] = PATIENT_INFO_SQL_TO_HL7_DICT[patient_info[key]]
-    else:
-        patient_info = DEFULT_PATIENT_INFO_HL7
+    # (a copy, the PATIENT_ID set below must not leak into the shared default)
+    if not patient_info or type(patient_info) != dict:
+        patient_info = DEFULT_PATIENT_INFO_HL7.copy()
 
     # add patient id to the patient info dict
     patient_info["PATIENT_ID"] = patient_id
@@ -232,6 +300,23 @@ def handel_info_request_message(hl7_message, msg_id):
     return generate_order_response(msg_id, patient_info)
 
 
+def select_patient_info(hl7_message):
+    """
+    Selects the patient info of an ORM^O01 query and translates the SQL values to HL7.
+
+    Returns:
+        dict: The patient info, or the query result as is if the patient was not found.
+    """
+    patient_info = data_select_for(PATIENT_INFO_SQL, PATIENT_INFO_ORM_PLAN, hl7_message)
+
+    if patient_info and type(patient_info) == dict:
+        for key in patient_info.keys():
+            if patient_info[key] in PATIENT_INFO_SQL_TO_HL7_DICT.keys():
+                patient_info[key] = PATIENT_INFO_SQL_TO_HL7_DICT[patient_info[key]]
+
+    return patient_info
+
+
 def generate_ack_message(msg_id, ack_code):
     """
     Generates a basic ACK response for the incoming HL7 message.
@@ -240,9 +325,8 @@ def generate_ack_message(msg_id, ack_code):
         hl7_message (hl7.Message): The parsed HL7 message object.
 
     Returns:
-        str: ACK HL7 message string.
+        bytes: ACK HL7 message, MLLP framed.
     """
-    msg_type = "ACK^R01"
     if ack_code == True:
         ack_code = "AA"  # Success code
         log_info(f"Server generate ack message with success code.", source=SOURCE)
@@ -252,7 +336,9 @@ def generate_ack_message(msg_id, ack_code):
 
     try:
 
-        ack_message = f"\x0bMSH|^~\\&|{APPLICATION_NAME}|{VERSION}|||{time_now()}||{msg_type}|{msg_id}|P|2.3.1|||||CHA|UTF-8|||\rMSA|{ack_code}|{msg_id}||||0|\r\x1c\r"
+        ack_message = ACK_TEMPLATE.render(
+            timestamp=response_timestamp.now(), msg_id=msg_id, ack_code=ack_code
+        )
 
         return ack_message
 
@@ -269,10 +355,8 @@ def generate_order_response(msg_id, patient_info: dict):
         hl7_message (hl7.Message): The parsed HL7 message object.
 
     Returns:
-        str: HL7 order response message string.
+        bytes: HL7 order response message, MLLP framed.
     """
-    msg_type = "ORR^O02"
-
     try:
 
         # access patient name from ORC segment order request mesage
@@ -282,7 +366,15 @@ def generate_order_response(msg_id, patient_info: dict):
         patient_age = patient_info["AGE"]
         patient_age_unit = patient_info["AGE_UNIT"]
 
-        response_message = f"\x0bMSH|^~\\&|{APPLICATION_NAME}|{VERSION}|||{time_now()}||{msg_type}|{msg_id}|P|2.3.1|||||CHA|UTF-8|||\rMSA|AA|{msg_id}||||0|\rPID|1||{patient_id}|{patient_name}|{patient_name}|||{patient_sex}|||||||||||||||||||||||\rPV1|1||||||||||||||||||||||||||||||||||||||||||||||||||||\rORC|AF|{patient_id}|||||||||||||||||||||||\rOBR|1|||||||||||||||||||||||||||||||Genrui||||||||||||||\rOBX|2|IS|^Blood Mode^||WH||||||F|||||||\rOBX|3|IS|^Test Mode^||CBC||||||F|||||||\rOBX|5|IS|^Age^||{patient_age}|{patient_age_unit}|||||F|||||||\r\x1c\r"
+        response_message = ORDER_RESPONSE_TEMPLATE.render(
+            timestamp=response_timestamp.now(),
+            msg_id=msg_id,
+            patient_id=patient_id,
+            patient_name=patient_name,
+            patient_sex=patient_sex,
+            patient_age=patient_age,
+            patient_age_unit=patient_age_unit,
+        )
 
         log_info(f"Generate order response message successfully.", source=SOURCE)
 
@@ -291,3 +383,43 @@ def generate_order_response(msg_id, patient_info: dict):
     except Exception as e:
         log_error(f"Error generating order response: {e}", source=SOURCE)
         return None
+
+
+def validate_response_templates():
+    """
+    Renders the ACK and ORR responses with sample values and checks that they
+    parse and validate, instead of parsing every response sent at runtime.
+    Called once when the server starts.
+
+    Returns:
+        bool: True if all the response templates are valid, False otherwise.
+    """
+    msg_id = "1"
+    sample_patient_info = dict(DEFULT_PATIENT_INFO_HL7, PATIENT_ID="100000")
+
+    templates = (
+        ("ACK^R01", "AA", generate_ack_message(msg_id, True)),
+        ("ACK^R01", "AE", generate_ack_message(msg_id, False)),
+        ("ORR^O02", "AA", generate_order_response(msg_id, sample_patient_info)),
+    )
+
+    for msg_type, ack_code, response in templates:
+        try:
+            hl7_message = parse_hl7_message(response, "Response template")
+
+            if not validate_hl7_message(hl7_message, "Response template"):
+                raise ValueError("validation failed")
+
+            hl7_msh = hl7_message.segment("MSH")
+            hl7_msa = hl7_message.segment("MSA")
+            if str(hl7_msh[9]) != msg_type or str(hl7_msh[10]) != msg_id:
+                raise ValueError(f"MSH-9/MSH-10 are {hl7_msh[9]}/{hl7_msh[10]}")
+            if str(hl7_msa[1]) != ack_code or str(hl7_msa[2]) != msg_id:
+                raise ValueError(f"MSA-1/MSA-2 are {hl7_msa[1]}/{hl7_msa[2]}")
+
+        except Exception as e:
+            log_error(f"Invalid {msg_type} {ack_code} response template: {e}", source=SOURCE)
+            return False
+
+    log_info("HL7 response templates validated successfully.", source=SOURCE)
+    return True
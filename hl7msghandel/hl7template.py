@@ -0,0 +1,96 @@
+import time
+from datetime import datetime
+from string import Formatter
+
+# Timestamp format of the MSH-7 field of the generated messages
+HL7_TIMESTAMP_FORMAT = "%Y%m%d%H%M%S"
+
+
+class TimestampCache:
+    """
+    The current HL7 timestamp as encoded bytes, formatted again only when the second changes.
+    Safe to share between the worker threads, a race only formats the same second twice.
+    """
+
+    def __init__(self, timestamp_format=HL7_TIMESTAMP_FORMAT):
+        self.timestamp_format = timestamp_format
+        self._cached = (None, b"")  # (second, encoded timestamp)
+
+    def now(self):
+        second = int(time.time())
+        cached = self._cached
+        if cached[0] != second:
+            cached = (second, datetime.fromtimestamp(second).strftime(self.timestamp_format).encode())
+            self._cached = cached
+        return cached[1]
+
+
+class ByteTemplate:
+    """
+    A message template compiled once into pre-encoded static parts and named fields.
+
+    The template uses str.format placeholders, the ones given in static_values are
+    filled in when the template is compiled. Rendering only encodes the remaining
+    fields and splices them between the static parts.
+
+    Example:
+        ack = ByteTemplate("MSA|{ack_code}|{msg_id}|\\r")
+        ack.render(ack_code="AA", msg_id="12")  # b"MSA|AA|12|\\r"
+    """
+
+    __slots__ = ("parts", "fields", "_format")
+
+    def __init__(self, template, **static_values):
+        parts = []  # Encoded static parts, None where a field is spliced in
+        fields = []  # Field names, in the order of the None parts
+        literal = ""
+
+        for text, field_name, _, _ in Formatter().parse(template):
+            literal += text
+            if field_name is None:
+                continue
+            if field_name in static_values:
+                literal += str(static_values[field_name])
+                continue
+
+            if literal:
+                parts.append(literal.encode())
+                literal = ""
+            parts.append(None)
+            fields.append(field_name)
+
+        if literal:
+            parts.append(literal.encode())
+
+        self.parts = tuple(parts)
+        self.fields = tuple(fields)
+
+        # The same template as a bytes %-format, rendered in one C call by render
+        self._format = b"".join(b"%s" if part is None else part.replace(b"%", b"%%") for part in parts)
+
+    def render_parts(self, **values):
+        """
+        Returns the message as a list of bytes buffers, e.g. for writer.writelines.
+
+        Args:
+            **values: The value of each field, bytes are used as is, other values
+                as their str() encoded to UTF-8.
+
+        Raises:
+            KeyError: If a field of the template has no value.
+        """
+        field_values = iter(self._encode_values(values))
+        return [next(field_values) if part is None else part for part in self.parts]
+
+    def render(self, **values):
+        """
+        Returns the message as a single bytes object, see render_parts.
+        """
+        return self._format % self._encode_values(values)
+
+    def _encode_values(self, values):
+        encoded = []
+        for name in self.fields:
+            value = values[name]
+            encoded.append(value if value.__class__ is bytes else str(value).encode())
+        return tuple(encoded)
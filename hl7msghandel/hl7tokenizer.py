@@ -0,0 +1,163 @@
+"""
+Lazy tokenizer for the HL7 messages read on the hot path of the server.
+
+`hl7.parse` splits every segment down to the components of each field, while
+the server only reads a few fields by position (MSH-3/4/9/10, PID-3, ORC-3,
+OBX-5). `tokenize_hl7_message` keeps the decoded message as a single string,
+splits it into segments once, and splits a segment into its fields the first
+time one of them is read. The fields are returned as plain strings, which is
+what `str()` of the hl7 field gives.
+"""
+
+# Message types parsed with the tokenizer, the others go through hl7.parse
+FAST_PARSE_MESSAGE_TYPES = frozenset({"ORU^R01", "ORM^O01"})
+
+SEGMENT_SEPARATOR = "\r"
+HEADER_SEGMENTS = ("MSH", "FHS", "BHS")
+
+
+class LazySegment:
+    """
+    One segment of a LazyHl7Message, split into fields on first access.
+
+    Indexed like `hl7.Segment`: index 0 is the segment name and, for MSH, index 1
+    is the field separator so that segment[n] is always the HL7 field n.
+    """
+
+    __slots__ = ("text", "separator", "_fields")
+
+    def __init__(self, text, separator):
+        self.text = text
+        self.separator = separator
+        self._fields = None
+
+    @property
+    def fields(self):
+        fields = self._fields
+        if fields is None:
+            fields = self.text.split(self.separator)
+            if fields[0] in HEADER_SEGMENTS:
+                # MSH-1 is the separator itself, not a value between two separators
+                fields.insert(1, self.separator)
+            self._fields = fields
+        return fields
+
+    @property
+    def name(self):
+        return self.text[:3]
+
+    def __getitem__(self, index):
+        return self.fields[index]
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"LazySegment({self.text!r})"
+
+
+class LazyHl7Message:
+    """
+    An HL7 message tokenized on demand, API compatible with IndexedHl7Message
+    for `segments()`, `segment()`, `has_segment()`, indexing, iteration, len() and str().
+    """
+
+    __slots__ = ("text", "_segments", "_index")
+
+    def __init__(self, text):
+        self.text = text
+
+        separator = text[3]
+        segments = [LazySegment(line, separator) for line in text.split(SEGMENT_SEPARATOR)]
+
+        # Index the segments by name, keeping the message order within each name
+        index = {}
+        for segment in segments:
+            index.setdefault(segment.name, []).append(segment)
+
+        self._segments = segments
+        self._index = index
+
+    def segments(self, segment_id):
+        """
+        Returns the segments identified by the segment_id (e.g. OBR, MSH, ORC, OBX).
+
+        Raises:
+            KeyError: If the message has no such segment, like hl7.Message.segments.
+        """
+        try:
+            return self._index[segment_id]
+        except KeyError:
+            raise KeyError(f"No {segment_id} segments") from None
+
+    def segment(self, segment_id):
+        """
+        Returns the first segment identified by the segment_id.
+        """
+        return self.segments(segment_id)[0]
+
+    def has_segment(self, segment_id):
+        """
+        Returns True if the message contains at least one segment_id segment.
+        """
+        return segment_id in self._index
+
+    def __len__(self):
+        return len(self._segments)
+
+    def __iter__(self):
+        return iter(self._segments)
+
+    def __getitem__(self, key):
+        return self._segments[key]
+
+    def __str__(self):
+        return self.text + SEGMENT_SEPARATOR
+
+
+def read_message_type(text):
+    """
+    Returns MSH-9 of a decoded message without splitting the whole header, or None.
+    """
+    if text[:3] != "MSH" or len(text) < 4:
+        return None
+
+    separator = text[3]
+    start = 0
+    for _ in range(8):  # MSH-9 follows the 8th separator, MSH-1 being the first one
+        start = text.find(separator, start) + 1
+        if start == 0:
+            return None
+
+    end = text.find(separator, start)
+    line_end = text.find(SEGMENT_SEPARATOR, start)
+    if end == -1 or (line_end != -1 and line_end < end):
+        return None
+    return text[start:end]
+
+
+def tokenize_hl7_message(raw_message, encoding="utf-8"):
+    """
+    Tokenizes a message of one of the FAST_PARSE_MESSAGE_TYPES.
+
+    Args:
+        raw_message (bytes or str): The raw HL7 message, without the MLLP framing.
+        encoding (str): The encoding of a bytes message, as for hl7.parse.
+
+    Returns:
+        LazyHl7Message: The tokenized message, or None if the message type is not
+        handled by the tokenizer and the message must be parsed with hl7.parse.
+    """
+    if isinstance(raw_message, bytes):
+        raw_message = raw_message.decode(encoding)
+    text = raw_message.strip()  # Strips the MLLP markers and line ends like hl7.parse
+
+    if read_message_type(text) not in FAST_PARSE_MESSAGE_TYPES:
+        return None
+    return LazyHl7Message(text)
@@ -10,7 +10,7 @@ def validate_hl7_message(hl7_message, message_direction):
     Validates an HL7 message.
 
     Args:
-        hl7_message (hl7.Message): The parsed HL7 message object.
+        hl7_message (IndexedHl7Message): The parsed HL7 message object.
 
     Returns:
         bool: True if the message is valid, False otherwise.
@@ -24,12 +24,12 @@ def validate_hl7_message(hl7_message, message_direction):
 
 
         # Validate the MSH segment
-        if str(hl7_message.segments('MSH')[0][0]) != "MSH":
+        if not hl7_message.has_segment('MSH'):
             log_error(f"Invalid {message_direction} HL7 message: Missing or incorrect MSH segment.", source=SOURCE)
             return False
 
         # Extract message type from MSH segment
-        msg_type = str(hl7_message.segments('MSH')[0][9])  # MSH-9: Message Type
+        msg_type = str(hl7_message.segment('MSH')[9])  # MSH-9: Message Type
 
 
         # Validate required segments based on message type
@@ -37,8 +37,8 @@ def validate_hl7_message(hl7_message, message_direction):
 
         if len(required_segments) > 0:
             for segment in required_segments:
-                if segment not in [str(seg[0]) for seg in hl7_message.segments(segment)[0]]:
-                    
+                if not hl7_message.has_segment(segment):
+
                     log_error(f"Invalid {message_direction} HL7 message Type: {msg_type}: Missing required segment {segment}.", source=SOURCE)
                     return False
 
@@ -1,7 +1,10 @@
 import logging
 import logging.handlers
 import os
+import atexit
+import queue
 import datetime
+from threading import Lock
 
 
 
@@ -10,6 +13,103 @@ import datetime
 LOG_DIR = 'logs'
 LOG_FILE_NAME = 'HealthMesh_log'
 APPLICATION_NAME = "HealthMesh"
+LOG_QUEUE_SIZE = 10000  # Records waiting for the log writer thread before INFO and DEBUG are dropped
+LOG_QUEUE_RESERVE = 1000  # Extra room kept for WARNING and above when the queue is full
+
+# Background thread writing the queued records, see configure_logging
+_listener = None
+_queue_handler = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks the caller.
+
+    Records are put on a bounded queue and written to the file and console by a
+    QueueListener thread. When the queue holds `size` records new INFO and DEBUG
+    records are dropped and counted instead of waiting for the writer, warnings and
+    errors still use the `reserve` room left above it. The number of dropped records
+    is logged as a warning once the queue is half empty again.
+    """
+
+    def __init__(self, size=LOG_QUEUE_SIZE, reserve=LOG_QUEUE_RESERVE):
+        super().__init__(queue.Queue(maxsize=size + reserve))
+        self.size = size
+        self._lock = Lock()
+        self.dropped = 0
+        self._reported = 0  # Dropped records already reported in the log
+
+    def enqueue(self, record):
+        if record.levelno < logging.WARNING and self.queue.qsize() >= self.size:
+            self._drop()
+            return
+
+        try:
+            if self._reported != self.dropped and self.queue.qsize() < self.size // 2:
+                self._report_dropped(record)
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._drop()
+
+    def stats(self):
+        """
+        Returns the queued and dropped record counts.
+        """
+        return {
+            "queued": self.queue.qsize(),
+            "queue_size": self.size,
+            "dropped": self.dropped,
+        }
+
+    def _drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def _report_dropped(self, record):
+        with self._lock:
+            dropped = self.dropped - self._reported
+            self._reported = self.dropped
+
+        warning = logging.makeLogRecord(
+            {
+                "name": record.name,
+                "levelno": logging.WARNING,
+                "levelname": logging.getLevelName(logging.WARNING),
+                "msg": f"{dropped} log records dropped, the log queue was full.",
+                "source": "Logging",
+            }
+        )
+        self.queue.put_nowait(warning)
+
+
+class _LogListener(logging.handlers.QueueListener):
+    """
+    QueueListener that waits for room to enqueue its stop sentinel.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def get_logging_stats():
+    """
+    Returns the state of the log queue, see DroppingQueueHandler.stats.
+    """
+    if _queue_handler is None:
+        return {"queued": 0, "queue_size": LOG_QUEUE_SIZE, "dropped": 0}
+
+    return _queue_handler.stats()
+
+
+def stop_logging():
+    """
+    Writes the queued records and stops the log writer thread.
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()  # Processes the records still in the queue before returning
+        _listener = None
 
 
 
@@ -17,10 +117,13 @@ APPLICATION_NAME = "HealthMesh"
 def configure_logging():
     """
     Configures logging with file rotation, console output, and a custom GUI handler.
+    The logger only puts records on a bounded queue, the file and console handlers
+    run on a QueueListener thread so logging never blocks the server event loop.
 
     Args:
         output_text_widget (ctk.Text): The text widget in your GUI to display log messages.
     """
+    global _listener, _queue_handler
 
     # Ensure the log directory exists
     if not os.path.exists(LOG_DIR):
@@ -35,6 +138,7 @@ def configure_logging():
 
 
     if logger.handlers:  # Check if handlers already exist
+        stop_logging()  # Flush the records of the previous configuration
         logger.handlers.clear()  # Remove all existing handlers
     
     logger.setLevel(logging.DEBUG)  # Set the base logging level
@@ -57,10 +161,17 @@ def configure_logging():
     console_handler.setFormatter(formatter)
 
 
-    # Add handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Write the records on a background thread, the logger only enqueues them
+    _queue_handler = DroppingQueueHandler()
+    _listener = _LogListener(
+        _queue_handler.queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+
+    # Add the queue handler to the logger
+    logger.addHandler(_queue_handler)
+
+    return logger
 
- 
 
-    return logger
\ No newline at end of file
+atexit.register(stop_logging)
@@ -1,8 +1,14 @@
 from server.incoming_data import handle_incoming_data
 from server.outcoming_data import send_outgoing_data
+from server.mllp_framer import MLLPFramer
+from server.events import event_broadcaster
+from server.journal import message_journal
+from server.dispatcher import device_dispatcher
+from server.response_cache import is_accepted_response, result_committed
 from log.logger import log_info, log_error
 from datetime import datetime
 from collections import deque
+from itertools import count
 
 
 # Dictionary to store active clients (address -> writer)
@@ -14,21 +20,23 @@ clients_with_names = {}
 # Queue to store communication messages
 communication_messages = deque(maxlen=100)  # Store last 100 messages
 
+# Sequence ids of the communication messages, increasing for the process lifetime
+communication_sequence = count(1)
+communication_head = 0  # Sequence id of the newest message
+
 # Define the source for logging purposes
 SOURCE = "Server"
 
 # Buffer size limit for reading data from the client
 BUFFER_SIZE_LIMIT = 4096
 
-# Constants for HL7 messages
-MESSAGE_END_MARKER = b"\x1c"
-MESSAGE_START_MARKER = b"\x0b"
-
 
 def add_communication_message(client_address, message, direction):
     """
-    Add a message to the communication queue
+    Add a message to the communication queue with the next sequence id
     """
+    global communication_head
+
     client_name = clients_with_names.get(client_address)
     if client_name is None:
         # If no name is assigned, use the address as string
@@ -38,7 +46,10 @@ def add_communication_message(client_address, message, direction):
         else:
             client_name = str(client_address)
             
+    communication_head = next(communication_sequence)
+
     msg = {
+        "seq": communication_head,
         "timestamp": datetime.now().isoformat(),
         "client_name": client_name,
         "client_address": str(client_address),  # Store address as string"
@@ -46,18 +57,127 @@ def add_communication_message(client_address, message, direction):
         "direction": direction
     }
     communication_messages.append(msg)
+    event_broadcaster.publish("message", msg)
+
+
+def get_communication_head():
+    """
+    Get the sequence id of the newest communication message
+    """
+    return communication_head
+
+
+def get_clients_status():
+    """
+    Get the connected clients and their names, keyed by "ip,port" like /server/status
+    """
+    return {
+        ",".join(str(part) for part in client_address): client_name
+        for client_address, client_name in clients_with_names.items()
+    }
 
 
-def get_communication_messages():
+def set_client_name(client_address, client_name):
     """
-    Get all stored communication messages
+    Set the name of a connected client and notify the event subscribers when it changed
     """
-    return list(communication_messages)
+    if client_address in clients_with_names and clients_with_names[client_address] == client_name:
+        return
+
+    clients_with_names[client_address] = client_name
+    event_broadcaster.publish("clients", get_clients_status())
+
+
+def get_communication_messages(since=0, limit=None):
+    """
+    Get the stored communication messages newer than a sequence id
+
+    Args:
+        since (int): Sequence id of the last message the caller already has.
+        limit (int): Maximum number of messages to return, the oldest first.
+
+    Returns:
+        tuple: The messages and the sequence id to pass as since on the next call:
+        the newest stored message, or the last returned one when limit cut the list.
+    """
+    messages = []
+
+    # Walk back from the newest message, only the new ones are visited
+    for msg in reversed(communication_messages):
+        if msg["seq"] <= since:
+            break
+        messages.append(msg)
+
+    messages.reverse()
+
+    if limit is not None and len(messages) > limit:
+        messages = messages[:limit]
+        return messages, messages[-1]["seq"]  # The next call continues after the cut
+
+    return messages, communication_head
+
+
+async def journal_message(message):
+    """
+    Journal a message before it is processed, so it is replayed if the processing does not finish
+
+    Returns:
+        int: The journal record id, or None if the message is not journaled.
+    """
+    if not message_journal.is_open or not message_journal.accepts(message):
+        return None
+
+    try:
+        return await message_journal.write_message(message)
+    except Exception as e:
+        log_error(f"Error journaling message: {e}", source=SOURCE)
+        return None
+
+
+async def respond_to_message(client_address, writer, message, journal_id):
+    """
+    Processes a received message and sends its response, called by the device
+    dispatcher in the order the messages of the client were received.
+
+    Args:
+        client_address (tuple): The address of the client.
+        writer (StreamWriter): StreamWriter for sending data to the client.
+        message (bytes): The received HL7 message.
+        journal_id (int): The journal record id of the message, or None.
+    """
+    # Process the incoming data and get a response
+    handel_response = await handle_incoming_data(message)
+
+    if journal_id is not None:
+        message_journal.mark(
+            journal_id,
+            is_accepted_response(handel_response),
+            result_committed(handel_response),
+        )
+
+    # Send the response back to the client if available
+    if handel_response != None:
+        response = handel_response[0]  # Extract the response from the tuple
+        set_client_name(
+            client_address, handel_response[1]
+        )  # Update the client name if available
+
+        # Log outgoing message
+        add_communication_message(client_address, response, "server")
+
+        await send_outgoing_data(writer, response)
+    else:
+        log_info(
+            f"No response generated for {client_address}: {message}",
+            source=SOURCE,
+        )
 
 
 async def handle_client_connection(reader, writer):
     """
     Manages individual client connections.
+    The messages are framed and journaled here and processed in order by the
+    device dispatcher, see DeviceDispatcher.
 
     Args:
         reader (StreamReader): StreamReader for reading client data.
@@ -67,45 +187,32 @@ async def handle_client_connection(reader, writer):
     log_info(f"Client connected: {client_address}", source=SOURCE)
     add_communication_message(client_address, "Connected", "info")
 
-    clients_with_names.update(
-        {client_address: None}
-    )  # Initialize the client with no name
+    set_client_name(client_address, None)  # Initialize the client with no name
 
     # Register the client in the active clients dictionary
     clients[client_address] = writer
 
-    buffer = bytearray()  # Use bytearray for efficient appending
-    messages = []  # List to store extracted messages
+    framer = MLLPFramer()  # Extracts complete HL7 frames from the stream
+
+    # Processes the messages of this client in order while the next ones are read
+    device = device_dispatcher.open(
+        client_address,
+        lambda item: respond_to_message(client_address, writer, *item),
+    )
+    drain = False  # Answer the queued messages before closing
+    connected = True
 
     try:
-        while True:
+        while connected:
             # Read data in chunks
             data = await reader.read(BUFFER_SIZE_LIMIT)  # Adjust the size as needed
 
             if not data:
+                drain = True
                 break  # End of stream
 
-            buffer.extend(data)  # Accumulate data in the buffer
-
-            # Process messages from the buffer
-            while True:
-                start_index = buffer.find(MESSAGE_START_MARKER)
-                end_index = buffer.find(MESSAGE_END_MARKER, start_index)
-
-                if start_index == -1 or end_index == -1:
-                    break  # No more complete messages
-
-                # Extract the message
-                message = buffer[
-                    start_index : end_index + 1
-                ]  # +1 to skip the start marker
-
-                messages.append(bytes(message))  # Store the message as bytes
-
-                # Remove the processed part from the buffer
-                del buffer[: end_index + 1]  # +1 to skip the end marker
-
-            for message in messages:
+            # Process every complete message received so far
+            for message in framer.feed(data):
                 log_info(
                     f"({len(message)})of Data received from ({client_address})",
                     source=SOURCE,
@@ -114,32 +221,21 @@ async def handle_client_connection(reader, writer):
                 # Log incoming message
                 add_communication_message(client_address, message, "device")
 
-                # Process the incoming data and get a response
-                handel_response = handle_incoming_data(message)
-
-                # Send the response back to the client if available
-                if handel_response != None:
-                    response = handel_response[0]  # Extract the response from the tuple
-                    clients_with_names.update(
-                        {client_address: handel_response[1]}
-                    )  # Update the client name if available
-                    
-                    # Log outgoing message
-                    add_communication_message(client_address, response, "server")
-                    
-                    await send_outgoing_data(writer, response)
-                else:
-                    log_info(
-                        f"No response generated for {client_address}: {message}",
-                        source=SOURCE,
-                    )
-
-                messages.pop(messages.index(message))
+                # Journal the message first so a crash does not lose it
+                journal_id = await journal_message(message)
+
+                # Waits while the queue of the client is full, pausing the reads
+                if not await device_dispatcher.put(device, (message, journal_id)):
+                    connected = False  # Sending a response failed
+                    break
 
     except Exception as e:
         log_error(f"Error with client {client_address}: {e}", source=SOURCE)
         add_communication_message(client_address, f"Error: {str(e)}", "error")
     finally:
+        # Unanswered journaled messages are replayed on the next start
+        await device_dispatcher.close(device, drain)
+
         # Handle client disconnection
         log_info(f"Client disconnected: {client_address}", source=SOURCE)
         add_communication_message(client_address, "Disconnected", "info")
@@ -147,3 +243,4 @@ async def handle_client_connection(reader, writer):
         await writer.wait_closed()
         clients.pop(client_address, None)
         clients_with_names.pop(client_address, None)
+        event_broadcaster.publish("clients", get_clients_status())
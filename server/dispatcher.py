@@ -0,0 +1,136 @@
+import asyncio
+from log.logger import log_error
+from setting.config import get_config
+
+
+# Define the source for logging purposes
+SOURCE = "Server"
+
+
+class DeviceQueue:
+    """
+    The messages of one connected analyzer waiting to be processed, in arrival order.
+    """
+
+    def __init__(self, key, queue_size):
+        self.key = key
+        self.queue = asyncio.Queue(queue_size)
+        self.task = None  # Task processing the queue
+        self.failed = False  # The handler raised, the remaining messages are discarded
+
+        self.processed = 0
+        self.paused = 0  # Times the reads paused because the queue was full
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "processed": self.processed,
+            "paused": self.paused,
+            "failed": self.failed,
+        }
+
+
+class DeviceDispatcher:
+    """
+    Processes the messages of each analyzer in order while the analyzers run in parallel.
+
+    Every connection gets a FIFO queue and a task that hands its messages to the
+    handler one at a time, so the responses go out in the order the messages came
+    in. The read loop only frames and queues, it is free to read the next frame
+    while the previous one is processed. When `queue_size` messages of a device
+    are waiting, `put` blocks and the connection is no longer read: the socket
+    buffers fill up and TCP pauses the analyzer.
+
+    Example:
+        device = device_dispatcher.open(client_address, handle_message)
+        if not await device_dispatcher.put(device, message):
+            ...  # The handler failed, close the connection
+        await device_dispatcher.close(device)
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._devices = {}  # client address -> DeviceQueue
+
+    def open(self, key, handler):
+        """
+        Creates the queue of a connection and starts processing it.
+
+        Args:
+            key: The client address.
+            handler (coroutine function): Called with each queued item, in order.
+
+        Returns:
+            DeviceQueue: The queue to pass to put and close.
+        """
+        device = DeviceQueue(key, self.queue_size)
+        device.task = asyncio.create_task(self._process(device, handler))
+        self._devices[key] = device
+        return device
+
+    async def put(self, device, item):
+        """
+        Queues an item, waiting while the queue of the device is full.
+
+        Returns:
+            bool: False if the handler failed and the connection should be closed.
+        """
+        if device.failed:
+            return False
+
+        if device.queue.full():
+            device.paused += 1
+        await device.queue.put(item)
+        return not device.failed
+
+    async def close(self, device, drain=True):
+        """
+        Stops processing the queue of a connection.
+
+        Args:
+            drain (bool): Process the queued items first, otherwise they are dropped.
+        """
+        self._devices.pop(device.key, None)
+
+        if drain and not device.task.done():
+            await device.queue.put(None)
+            await device.task
+        else:
+            device.task.cancel()
+            try:
+                await device.task
+            except asyncio.CancelledError:
+                pass
+
+    async def _process(self, device, handler):
+        """
+        Hands the queued items to the handler until the None sentinel.
+        """
+        while True:
+            item = await device.queue.get()
+            if item is None:
+                break
+            if device.failed:
+                continue  # Keep emptying the queue so a waiting put returns
+
+            try:
+                await handler(item)
+                device.processed += 1
+            except Exception as e:
+                log_error(f"Error processing a message of {device.key}: {e}", source=SOURCE)
+                device.failed = True
+
+    def stats(self):
+        """
+        Returns the queue of every connected device, keyed by "ip,port" like /server/status.
+        """
+        return {
+            ",".join(str(part) for part in key) if isinstance(key, tuple) else str(key): device.stats()
+            for key, device in self._devices.items()
+        }
+
+
+cfg = get_config()  # Load configuration from file
+
+# Dispatcher of the messages of every client connection
+device_dispatcher = DeviceDispatcher(cfg["DEVICE_QUEUE_SIZE"])
@@ -0,0 +1,85 @@
+import asyncio
+from log.logger import log_warning
+
+# Define the source for logging purposes
+SOURCE = "Server"
+
+# Events waiting for a slow subscriber before the oldest are dropped
+EVENT_QUEUE_SIZE = 256
+
+
+class EventBroadcaster:
+    """
+    Pushes server events to every subscriber, e.g. the /ws/events WebSocket.
+
+    Each subscriber gets its own bounded asyncio queue. A subscriber that does not
+    keep up loses its oldest events instead of slowing down the server, the events
+    carry the message sequence id so it can fetch what it missed.
+    Must be used from the event loop thread of the server.
+
+    Example:
+        queue = event_broadcaster.subscribe()
+        event = await queue.get()
+    """
+
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self):
+        """
+        Registers a new subscriber.
+
+        Returns:
+            asyncio.Queue: The queue receiving the events as {"type": ..., "data": ...} dicts.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        """
+        Removes a subscriber registered with subscribe.
+        """
+        self._subscribers.discard(queue)
+
+    def publish(self, event_type, data):
+        """
+        Sends an event to every subscriber without waiting.
+
+        Args:
+            event_type (str): The event type, e.g. "message", "clients" or "server".
+            data: The JSON serializable event data.
+        """
+        if not self._subscribers:
+            return
+
+        event = {"type": event_type, "data": data}
+        self.published += 1
+
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()  # Drop the oldest event of the slow subscriber
+                self.dropped += 1
+                if self.dropped % self.queue_size == 1:
+                    log_warning(
+                        f"Event subscriber is too slow, {self.dropped} events dropped.",
+                        source=SOURCE,
+                    )
+            queue.put_nowait(event)
+
+    def stats(self):
+        """
+        Returns the subscriber and event counts.
+        """
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+# Shared broadcaster of the server events
+event_broadcaster = EventBroadcaster()
@@ -1,63 +1,191 @@
-from log.logger import log_info, log_error
+import asyncio
+from log.logger import log_info, log_error, log_warning
 from hl7msghandel.hl7parser import parse_hl7_message
-from hl7msghandel.hl7responder import generate_response_message
-from threading import Thread
-import queue
+from hl7msghandel.hl7responder import generate_response_message, generate_ack_message
+from database.circuit_breaker import DatabaseUnavailableError
+from server.worker_pool import worker_pool, WorkerPoolFullError
+from server.response_cache import response_cache, is_accepted_response
+from server.result_spool import result_spool, describe_spooled
+from database.result_writer import wait_committed
+from setting.config import get_config
 
 # Define the source for logging purposes
 SOURCE = "Server"
 
-def handle_incoming_data(message):
+cfg = get_config()  # Load configuration from file
+RESPONSE_TIMEOUT = cfg["RESPONSE_TIMEOUT"]
+HL7_VALIDATE_RESPONSES = cfg["HL7_VALIDATE_RESPONSES"]
+RESULT_SPOOL_DRAIN_BATCH = cfg["RESULT_SPOOL_DRAIN_BATCH"]
 
+# Message type spooled while the database is down
+RESULT_MESSAGE_TYPE = "ORU^R01"
+
+
+def generate_incoming_response(message):
     """
-    Handles and processes data received from a client.
+    Parses an incoming message and generates its response.
+    Runs on a worker thread because it blocks on the database.
 
     Args:
-        message (str): The incoming message from the client.
+        message (bytes): The incoming message from the client.
+
+    Returns:
+        dict: The generated response and the sender name.
+    """
+    # Parse the message and generate the response using the parsed message
+    msg = parse_hl7_message(message, "Incomming")
+
+    # Results queue behind the spooled ones until the spool is drained, keeping their order
+    if result_spool.has_pending and is_result_message(msg):
+        return spool_result(message, msg)
 
-    Returns: 
-        str: The response to be sent back to the client.
+    try:
+        handel_response = generate_response_message(msg)
+    except DatabaseUnavailableError as e:
+        if is_result_message(msg):
+            return spool_result(message, msg)
+        log_error(f"Message not answered, the database is unavailable: {e}", source=SOURCE)
+        return {"respose": None, "sender": None}
+
+    # The response templates are validated when the server starts, see validate_response_templates
+    if HL7_VALIDATE_RESPONSES and handel_response["respose"] is not None:
+        parse_hl7_message(handel_response["respose"], "Response")
+
+    return handel_response
+
+
+def is_result_message(hl7_message):
+    """
+    Returns True if the message is a result that can be spooled while the database is down.
     """
+    if hl7_message is None or not result_spool.is_open:
+        return False
     try:
-        # Create a simple response to echo back to the client
-        msg = parse_hl7_message(message, "Incomming")
+        return str(hl7_message.segment("MSH")[9]) == RESULT_MESSAGE_TYPE
+    except Exception:
+        return False
+
+
+def spool_result(message, hl7_message):
+    """
+    Commits a result message to the spool and acknowledges it, see ResultSpool.
+
+    Returns:
+        dict: The AA response and the sender name, or no response if it could not be spooled.
+    """
+    hl7_msh = hl7_message.segment("MSH")
+
+    try:
+        result_spool.add(message)
+    except Exception as e:
+        log_error(f"Error spooling result message NO.:{hl7_msh[10]}: {e}", source=SOURCE)
+        return {"respose": None, "sender": None}
+
+    log_warning(f"Result message NO.:{hl7_msh[10]} spooled until the database is back.", source=SOURCE)
+    return {
+        "respose": generate_ack_message(hl7_msh[10], True),
+        "sender": f"{hl7_msh[3]} {hl7_msh[4]}",
+    }
+
+
+def drain_spooled_results():
+    """
+    Processes the spooled results oldest first, until the spool is empty, the
+    database is unavailable again or a result is not written within the response
+    timeout. Blocks on the database.
 
+    Returns:
+        list: The spooled results rejected when processed, see describe_spooled.
+        They were acknowledged with AA when spooled.
+    """
+    processed = 0
+    rejected = []
 
-        # Use a Queue to get the response from the thread
-        response_queue = queue.Queue()
+    while True:
+        batch = result_spool.pending(RESULT_SPOOL_DRAIN_BATCH)
+        if not batch:
+            break
 
-        # Define a function to generate the response in a separate thread
-        def threaded_response_generation(queue):
+        for spool_id, message in batch:
+            msg = parse_hl7_message(message, "Spooled")
             try:
-                # Generate the response using the parsed message
-                response = generate_response_message(msg)
-                response_queue.put(response)  # Put the result in the queue
-            except Exception as e:
-                log_error(f"Error generating response in thread: {e}", source=SOURCE)
-                response_queue.put(None)  # Put None in case of error
-
-        # Start the thread
-        response_thread = Thread(target=threaded_response_generation, args=(response_queue,))
-        response_thread.start()
-
-        # Get the response from the queue (blocking with timeout)
+                handel_response = generate_response_message(msg) if msg is not None else None
+            except DatabaseUnavailableError as e:
+                # Left in the spool, drained again once the circuit breaker closes
+                log_warning(f"Spool drain stopped, the database is unavailable: {e}", source=SOURCE)
+                return rejected
+
+            accepted = False
+            if handel_response is not None and handel_response["respose"] is not None:
+                accepted = is_accepted_response((handel_response["respose"],))
+                committed = handel_response.get("committed")
+                if accepted and committed is not None:
+                    accepted = wait_committed(committed, RESPONSE_TIMEOUT)
+                    if accepted is None:
+                        # Still queued on the result writer, replayed on a later drain
+                        log_warning(f"Spool drain stopped, result ({spool_id}) was not written in time.", source=SOURCE)
+                        return rejected
+
+            result_spool.mark(spool_id, accepted)
+            processed += 1
+            if not accepted:
+                rejected.append(describe_spooled(spool_id, message))
+
+    if processed:
+        log_info(
+            f"Spool drained, ({processed}) results processed, ({len(rejected)}) rejected.",
+            source=SOURCE,
+        )
+    return rejected
+
+
+async def handle_incoming_data(message):
+
+    """
+    Handles and processes data received from a client.
+    A retransmitted copy of a recently accepted message gets the same response
+    again without being processed, see ResponseCache.
+
+    Args:
+        message (bytes): The incoming message from the client.
+
+    Returns:
+        tuple: The response to be sent back to the client and the sender name, or None.
+    """
+    return await response_cache.respond(message, process_incoming_data)
+
+
+async def process_incoming_data(message):
+    """
+    Processes a message on the shared worker pool so the event loop keeps
+    serving the other connections meanwhile.
+
+    Args:
+        message (bytes): The incoming message from the client.
+
+    Returns:
+        tuple: The response to be sent back to the client, the sender name and the
+        future of the queued result write (or None), or None.
+    """
+    try:
         try:
-            handel_response = response_queue.get(timeout=10)  # Adjust timeout as needed
-            response = handel_response["respose"]
-            sender_name_ver = handel_response["sender"]
-            parse_hl7_message(response, "Response")
-        except queue.Empty:
-            log_error("Timeout waiting for response from thread.", source=SOURCE)
+            handel_response = await worker_pool.run(
+                generate_incoming_response, message, timeout=RESPONSE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            log_error("Timeout waiting for response from worker.", source=SOURCE)
             return None  # Or a suitable timeout response
+        except WorkerPoolFullError as e:
+            log_error(f"Message dropped: {e}", source=SOURCE)
+            return None
+
+        response = handel_response["respose"]
+        sender_name_ver = handel_response["sender"]
 
         if response is None:
             return None # Handle the error case
 
-        return response,sender_name_ver
-    
+        return response,sender_name_ver,handel_response.get("committed")
+
     except Exception as e:
         log_error(f"Error handling incoming data>: {e}", source=SOURCE)
-
-
-
-
@@ -0,0 +1,516 @@
+import asyncio
+import os
+import queue
+import struct
+import zlib
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import Future
+from threading import Lock, Thread
+from log.logger import log_info, log_error, log_warning
+from setting.config import get_config
+
+
+# Define the source for logging purposes
+SOURCE = "Journal"
+
+# Record header: payload length, record type, CRC32 of the payload
+RECORD_HEADER = struct.Struct(">IBI")
+MESSAGE_HEADER = struct.Struct(">QH")  # Record id, MSH-10 length, followed by MSH-10 and the message
+MARK_RECORD = struct.Struct(">QB")  # Record id, processing status
+
+RECORD_MESSAGE = 1
+RECORD_MARK = 2
+
+STATUS_ACCEPTED = 1  # Processed and answered with AA, the message is no longer needed
+STATUS_FAILED = 2  # Processing failed, the message is replayed on the next start
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".journal"
+
+# A pending message kept in memory until it is accepted
+JournalEntry = namedtuple("JournalEntry", ["record_id", "segment", "msg_id", "message"])
+
+
+def split_msh(message):
+    """
+    Splits the MSH segment of a raw message into its fields without parsing the message.
+
+    Args:
+        message (bytes): The HL7 message, with or without the MLLP markers.
+
+    Returns:
+        list: The raw fields, fields[1] is MSH-2 so MSH-n is fields[n - 1]. Empty without MSH.
+    """
+    start = message.find(b"MSH")
+    if start == -1:
+        return []
+
+    end = message.find(b"\r", start)
+    return message[start : end if end != -1 else len(message)].split(b"|")
+
+
+def read_msh_fields(message):
+    """
+    Reads MSH-9 (message type) and MSH-10 (message control id) from a raw message
+    without parsing it.
+
+    Args:
+        message (bytes): The HL7 message, with or without the MLLP markers.
+
+    Returns:
+        tuple: The message type and message id as str, None when missing.
+    """
+    fields = split_msh(message)
+
+    msg_type = fields[8].decode(errors="replace") if len(fields) > 8 else None
+    msg_id = fields[9].decode(errors="replace") if len(fields) > 9 else None
+    return msg_type, msg_id
+
+
+def read_sender(message):
+    """
+    Reads the sender of a raw message, MSH-3 (sending application) and MSH-4 (sending
+    facility) joined by a space like the sender name of the responses.
+
+    Args:
+        message (bytes): The HL7 message, with or without the MLLP markers.
+
+    Returns:
+        str: The sender, empty parts when missing.
+    """
+    fields = split_msh(message)
+
+    return " ".join(
+        fields[index].decode(errors="replace") if len(fields) > index else "" for index in (2, 3)
+    )
+
+
+class MessageJournal:
+    """
+    Append-only journal of the inbound messages, written before they are processed.
+
+    Records are length prefixed and checksummed and appended to segment files that
+    rotate at `segment_size` bytes. A writer thread writes the queued records and
+    calls fsync once per batch, so concurrent connections share the fsync cost.
+    A message stays pending until it is marked accepted; a segment is deleted once
+    none of its messages is pending. Pending messages found on open are replayed
+    with `pending_messages`, up to `replay_limit` failed attempts each.
+    MSH-10 message ids of the retained segments are indexed by sender for `find`,
+    control ids are only unique per sender.
+
+    Example:
+        record_id = await journal.write_message(message)
+        journal.mark(record_id, accepted=True)
+    """
+
+    def __init__(
+        self,
+        directory,
+        segment_size,
+        fsync_batch,
+        replay_limit,
+        message_types,
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync_batch = fsync_batch
+        self.replay_limit = replay_limit
+        self.message_types = set(message_types)
+
+        self._lock = Lock()
+        self._queue = None
+        self._thread = None
+        self._file = None
+        self._segment = 0  # Number of the segment being written
+        self._next_id = 1
+
+        self._pending = {}  # record id -> JournalEntry
+        self._failures = Counter()  # record id -> failed attempts
+        self._segment_pending = Counter()  # segment -> pending messages
+        self._segment_ids = defaultdict(list)  # segment -> (sender, MSH-10) keys written to it
+        self._index = {}  # (sender, MSH-10) -> (record id, segment) of the latest message
+
+        self.written = 0
+        self.syncs = 0
+        self.deleted_segments = 0
+
+    @property
+    def is_open(self):
+        return self._thread is not None
+
+    def accepts(self, message):
+        """
+        Returns True if the message type is journaled.
+        """
+        msg_type, _ = read_msh_fields(message)
+        return msg_type in self.message_types
+
+    def open(self):
+        """
+        Loads the existing segments, then starts the writer thread.
+        """
+        if self.is_open:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+        self._queue = queue.Queue()
+        self._thread = Thread(target=self._writer, name="MessageJournal", daemon=True)
+        self._thread.start()
+
+        log_info(
+            f"Message journal opened with ({len(self._pending)}) pending messages.",
+            source=SOURCE,
+        )
+
+    def close(self):
+        """
+        Writes the queued records and stops the writer thread.
+        """
+        if not self.is_open:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._queue = None
+        log_info("Message journal closed.", source=SOURCE)
+
+    async def write_message(self, message):
+        """
+        Journals a message and waits until it is on disk.
+
+        Args:
+            message (bytes): The received HL7 message.
+
+        Returns:
+            int: The record id to pass to mark.
+        """
+        _, msg_id = read_msh_fields(message)
+
+        with self._lock:
+            record_id = self._next_id
+            self._next_id += 1
+
+        future = Future()
+        self._queue.put((RECORD_MESSAGE, record_id, msg_id or "", bytes(message), future))
+        await asyncio.wrap_future(future)
+        return record_id
+
+    def mark(self, record_id, accepted, committed=None):
+        """
+        Records the processing result of a message without waiting for the disk.
+        A failed result is replayed on the next start, losing this record only causes a replay.
+
+        Args:
+            record_id (int): The record id returned by write_message.
+            accepted (bool): True if the message was answered with AA.
+            committed (concurrent.futures.Future): The queued result write of an accepted
+                message, the message stays pending until it is committed.
+        """
+        if not self.is_open:
+            return
+
+        if accepted and committed is not None:
+            committed.add_done_callback(lambda future: self.mark(record_id, future.result()))
+            return
+
+        status = STATUS_ACCEPTED if accepted else STATUS_FAILED
+        self._queue.put((RECORD_MARK, record_id, status, None, None))
+
+    def pending_messages(self):
+        """
+        Returns the pending messages that can still be replayed, oldest first.
+
+        Returns:
+            list: (record id, message) tuples.
+        """
+        with self._lock:
+            return [
+                (entry.record_id, entry.message)
+                for entry in sorted(self._pending.values())
+                if self._failures[entry.record_id] < self.replay_limit
+            ]
+
+    def find(self, msg_id, sender):
+        """
+        Looks up the latest journaled message of a sender with an MSH-10 message id.
+
+        Args:
+            msg_id (str): The MSH-10 message control id.
+            sender (str): MSH-3 and MSH-4 joined by a space, see read_sender.
+
+        Returns:
+            dict: The record id and whether it is still pending, or None if not journaled.
+        """
+        with self._lock:
+            found = self._index.get((sender, msg_id))
+            if found is None:
+                return None
+
+            record_id, _ = found
+            return {"record_id": record_id, "pending": record_id in self._pending}
+
+    def stats(self):
+        """
+        Returns the journal counters.
+        """
+        with self._lock:
+            return {
+                "open": self.is_open,
+                "segment": self._segment,
+                "pending": len(self._pending),
+                "written": self.written,
+                "syncs": self.syncs,
+                "deleted_segments": self.deleted_segments,
+            }
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+    def _segments(self):
+        """
+        Returns the numbers of the segment files on disk, in order.
+        """
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                number = name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]
+                if number.isdigit():
+                    segments.append(int(number))
+        return sorted(segments)
+
+    def _load(self):
+        """
+        Rebuilds the pending messages and the index from the segment files.
+        """
+        self._pending = {}
+        self._failures = Counter()
+        self._segment_pending = Counter()
+        self._segment_ids = defaultdict(list)
+        self._index = {}
+
+        segments = self._segments()
+
+        for segment in segments:
+            self._segment = segment
+            path = self._segment_path(segment)
+
+            with open(path, "rb") as file:
+                data = file.read()
+
+            valid_end = self._load_records(segment, data)
+
+            if valid_end < len(data):
+                # A record was cut by a crash, drop the partial tail
+                log_warning(
+                    f"Truncating {len(data) - valid_end} bytes at the end of {path}.",
+                    source=SOURCE,
+                )
+                with open(path, "r+b") as file:
+                    file.truncate(valid_end)
+
+        # Messages given up after too many failed replays are no longer pending
+        for record_id in [
+            record_id
+            for record_id in self._pending
+            if self._failures[record_id] >= self.replay_limit
+        ]:
+            entry = self._pending[record_id]
+            log_error(
+                f"Message ({entry.msg_id}) failed {self._failures[record_id]} times and will not be replayed.",
+                source=SOURCE,
+            )
+            self._resolve(record_id)
+
+        self._open_segment(segments[-1] if segments else 1)
+
+        # Segments left with only mark records or without pending messages
+        for segment in segments:
+            if segment not in self._segment_ids and segment != self._segment:
+                self._segment_ids[segment] = []
+        self._delete_done_segments()
+
+    def _load_records(self, segment, data):
+        """
+        Applies the records of a segment, returns the offset after the last valid record.
+        """
+        offset = 0
+        size = len(data)
+
+        while offset + RECORD_HEADER.size <= size:
+            length, record_type, checksum = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            payload = data[start : start + length]
+
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+
+            if record_type == RECORD_MESSAGE:
+                record_id, id_length = MESSAGE_HEADER.unpack_from(payload)
+                id_end = MESSAGE_HEADER.size + id_length
+                msg_id = payload[MESSAGE_HEADER.size : id_end].decode(errors="replace")
+                self._add(JournalEntry(record_id, segment, msg_id, payload[id_end:]))
+                self._next_id = max(self._next_id, record_id + 1)
+
+            elif record_type == RECORD_MARK:
+                record_id, status = MARK_RECORD.unpack(payload)
+                self._apply_mark(record_id, status)
+
+            offset = start + length
+
+        return offset
+
+    def _add(self, entry):
+        self._pending[entry.record_id] = entry
+        self._segment_pending[entry.segment] += 1
+        segment_keys = self._segment_ids[entry.segment]
+
+        if entry.msg_id:
+            key = (read_sender(entry.message), entry.msg_id)
+            segment_keys.append(key)
+
+            previous = self._index.get(key)
+            self._index[key] = (entry.record_id, entry.segment)
+
+            # A resent message replaces the pending copy with the same sender and MSH-10 id
+            if previous is not None and previous[0] in self._pending:
+                self._resolve(previous[0])
+
+    def _apply_mark(self, record_id, status):
+        if record_id not in self._pending:
+            return
+
+        if status == STATUS_ACCEPTED:
+            self._resolve(record_id)
+        else:
+            self._failures[record_id] += 1
+
+    def _resolve(self, record_id):
+        entry = self._pending.pop(record_id)
+        self._failures.pop(record_id, None)
+        self._segment_pending[entry.segment] -= 1
+
+    def _open_segment(self, segment):
+        self._segment = segment
+        self._file = open(self._segment_path(segment), "ab")
+
+    def _rotate(self):
+        """
+        Closes the full segment and continues in a new one.
+        """
+        self._sync()
+        self._file.close()
+        self._open_segment(self._segment + 1)
+
+    def _delete_done_segments(self):
+        """
+        Deletes the closed segments without pending messages, oldest first.
+
+        A segment also holds the marks of messages written to older segments, so it
+        is only deleted once every older segment is deleted: otherwise a kept older
+        segment would load again without the marks that resolved its messages.
+        """
+        for segment in sorted(self._segment_ids):
+            if segment == self._segment or self._segment_pending[segment] > 0:
+                break
+
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log_error(f"Error deleting journal segment {segment}: {e}", source=SOURCE)
+                break
+
+            for key in self._segment_ids.pop(segment):
+                if self._index.get(key, (None, None))[1] == segment:
+                    del self._index[key]
+            self._segment_pending.pop(segment, None)
+            self.deleted_segments += 1
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.syncs += 1
+
+    def _writer(self):
+        """
+        Writer thread, writes the queued records in batches with one fsync per batch.
+        """
+        running = True
+
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.fsync_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                running = False
+                batch = [item for item in batch if item is not None]
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                log_error(f"Error writing the message journal: {e}", source=SOURCE)
+                for item in batch:
+                    future = item[4]
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+
+        self._file.close()
+        self._file = None
+
+    def _write_batch(self, batch):
+        """
+        Writes a batch of queued records, syncs them and applies them to the pending state.
+        """
+        if not batch:
+            return
+
+        for record_type, record_id, value, message, _ in batch:
+            if self._file.tell() >= self.segment_size:
+                self._rotate()
+
+            if record_type == RECORD_MESSAGE:
+                msg_id = value.encode()
+                payload = MESSAGE_HEADER.pack(record_id, len(msg_id)) + msg_id + message
+                segment = self._segment
+            else:
+                payload = MARK_RECORD.pack(record_id, value)
+
+            self._file.write(
+                RECORD_HEADER.pack(len(payload), record_type, zlib.crc32(payload)) + payload
+            )
+
+            if record_type == RECORD_MESSAGE:
+                with self._lock:
+                    self._add(JournalEntry(record_id, segment, value, message))
+
+        self._sync()
+
+        with self._lock:
+            for record_type, record_id, value, _, future in batch:
+                if record_type == RECORD_MESSAGE:
+                    self.written += 1
+                    future.set_result(record_id)
+                else:
+                    self._apply_mark(record_id, value)
+
+            self._delete_done_segments()
+
+
+cfg = get_config()  # Load configuration from file
+
+# Shared journal of the inbound messages, opened by the server
+message_journal = MessageJournal(
+    cfg["JOURNAL_DIR"],
+    cfg["JOURNAL_SEGMENT_SIZE"],
+    cfg["JOURNAL_FSYNC_BATCH"],
+    cfg["JOURNAL_REPLAY_LIMIT"],
+    cfg["JOURNAL_MESSAGE_TYPES"],
+)
@@ -0,0 +1,90 @@
+# Constants for HL7 messages (MLLP block markers)
+MESSAGE_START_MARKER = b"\x0b"
+MESSAGE_END_MARKER = b"\x1c"
+
+
+# Returned by feed when the data completes no frame, shared to skip an allocation per read
+NO_FRAMES = ()
+
+
+class MLLPFramer:
+    """
+    Incremental MLLP framer that extracts complete HL7 frames from a byte stream.
+
+    Only the reads of an incomplete frame are kept, as a list of pieces joined once
+    its end marker arrives, so a frame split over many small reads is copied once
+    instead of on every read. A read without an end marker costs a single search,
+    and the frames of a read that completes them are sliced straight out of it.
+
+    Example:
+        framer = MLLPFramer()
+        for frame in framer.feed(data):
+            handle(frame)
+    """
+
+    def __init__(self):
+        self._pieces = []  # The reads of the incomplete frame, from its start marker
+
+    @property
+    def pending(self):
+        """
+        Number of buffered bytes that do not belong to a complete frame yet.
+        """
+        return sum(map(len, self._pieces))
+
+    def feed(self, data):
+        """
+        Buffers received data and returns every frame it completes.
+        Bytes outside a frame (e.g. the trailing carriage return) are dropped.
+
+        Args:
+            data (bytes): A chunk read from the client connection.
+
+        Returns:
+            list: Each complete HL7 frame (bytes) including the start and end markers,
+            or NO_FRAMES when the data completes none.
+        """
+        end_index = data.find(MESSAGE_END_MARKER)
+        pieces = self._pieces
+
+        if end_index == -1:
+            # No frame completes in this chunk
+            if pieces:
+                pieces.append(data)
+            else:
+                start_index = data.find(MESSAGE_START_MARKER)
+                if start_index != -1:
+                    pieces.append(data[start_index:] if start_index else data)
+            return NO_FRAMES
+
+        find = data.find
+
+        if pieces:
+            # The buffered frame ends in this chunk
+            pieces.append(data[: end_index + 1])
+            frames = [b"".join(pieces)]
+            pieces.clear()
+            start_index = find(MESSAGE_START_MARKER, end_index + 1)
+        else:
+            frames = []
+            start_index = find(MESSAGE_START_MARKER, 0, end_index)
+            if start_index == -1:
+                start_index = find(MESSAGE_START_MARKER, end_index + 1)
+
+        while start_index != -1:
+            end_index = find(MESSAGE_END_MARKER, start_index)
+
+            if end_index == -1:
+                pieces.append(data[start_index:])  # Kept until its end marker arrives
+                break
+
+            frames.append(data[start_index : end_index + 1])
+            start_index = find(MESSAGE_START_MARKER, end_index + 1)
+
+        return frames
+
+    def reset(self):
+        """
+        Drops all buffered data.
+        """
+        self._pieces.clear()
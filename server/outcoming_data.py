@@ -11,11 +11,17 @@ async def send_outgoing_data(writer, response):
 
     Args:
         writer (StreamWriter): StreamWriter for the target client.
-        response (str): The message to send.
+        response (bytes, str or list): The message to send, a list of bytes buffers is
+            written with writelines without being joined first.
     """
     try:
-        # Encode the response and write it to the client
-        writer.write(response.encode())
+        # The responses are built as bytes, other messages are encoded here
+        if isinstance(response, list):
+            writer.writelines(response)
+        elif isinstance(response, str):
+            writer.write(response.encode())
+        else:
+            writer.write(response)
         await writer.drain()
         log_info(
             f"Response succdesfully sent to : {writer.get_extra_info('peername')}",
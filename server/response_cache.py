@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+from cache.ttl_cache import TTLCache
+from server.journal import split_msh
+from log.logger import log_info
+from setting.config import get_config
+
+# Define the source for logging purposes
+SOURCE = "Server"
+
+
+def is_accepted_response(handel_response):
+    """
+    Check whether handle_incoming_data answered the message with an AA acknowledgment
+    """
+    if handel_response is None:
+        return False
+
+    response = handel_response[0]
+    marker = b"MSA|AA|" if isinstance(response, bytes) else "MSA|AA|"
+    return marker in response
+
+
+def result_committed(handel_response):
+    """
+    Returns the future of the queued result write of a response, None if the result
+    was written before the response or there was no result, see ResultWriter.
+    """
+    if handel_response is None or len(handel_response) < 3:
+        return None
+    return handel_response[2]
+
+
+class ResponseCache:
+    """
+    Responses of the recently processed messages, so a retransmitted message is
+    answered again without being processed a second time.
+
+    Analyzers resend a result when its ACK is slow. The copy is recognised by the
+    sender (MSH-3), the message control id (MSH-10) and a hash of the whole message,
+    and gets the response of the first copy, also when it arrives while the first
+    copy is still being processed. Only accepted (AA) responses are kept, a message
+    that failed is processed again when it is resent.
+    Must be used from the event loop thread of the server.
+
+    Example:
+        handel_response = await response_cache.respond(message, handle_message)
+    """
+
+    def __init__(self, max_size, ttl, message_types):
+        self.message_types = set(message_types)
+        self._cache = TTLCache(max_size, ttl)
+        self._in_flight = {}  # key -> future of the response of the copy being processed
+        self.joined = 0  # Copies that waited for the copy being processed
+
+    def message_key(self, message):
+        """
+        Returns the cache key of a message, None if its responses are not cached.
+        """
+        if self._cache.max_size <= 0:
+            return None
+
+        fields = split_msh(message)
+        if len(fields) <= 9 or fields[8].decode(errors="replace") not in self.message_types:
+            return None
+
+        payload_hash = hashlib.blake2b(message, digest_size=16).digest()
+        return fields[2], fields[9], payload_hash
+
+    async def respond(self, message, process):
+        """
+        Returns the cached response of a message, or processes it and caches the response.
+
+        Args:
+            message (bytes): The incoming message.
+            process (coroutine function): Processes the message and returns its response.
+
+        Returns:
+            The response of process for this message or an identical earlier one.
+        """
+        key = self.message_key(message)
+        if key is None:
+            return await process(message)
+
+        handel_response = self._cache.get(key)
+        if handel_response is not None:
+            log_info(
+                f"Message {key[1].decode(errors='replace')} was already processed, sending the same response.",
+                source=SOURCE,
+            )
+            return handel_response
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.joined += 1
+            log_info(
+                f"Message {key[1].decode(errors='replace')} is being processed, waiting for its response.",
+                source=SOURCE,
+            )
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        handel_response = None
+
+        try:
+            handel_response = await process(message)
+            if is_accepted_response(handel_response):
+                self._cache.put(key, handel_response)
+            return handel_response
+        finally:
+            del self._in_flight[key]
+            future.set_result(handel_response)  # None for the waiting copies if processing was cancelled
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        """
+        Returns the cache counters and the copies that waited for the one being processed.
+        """
+        stats = self._cache.stats()
+        stats["in_flight"] = len(self._in_flight)
+        stats["joined"] = self.joined
+        return stats
+
+
+cfg = get_config()  # Load configuration from file
+
+# Shared cache of the responses to the inbound messages
+response_cache = ResponseCache(
+    cfg["RESPONSE_CACHE_SIZE"],
+    cfg["RESPONSE_CACHE_TTL"],
+    cfg["RESPONSE_CACHE_MESSAGE_TYPES"],
+)
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+import time
+from datetime import datetime
+from threading import Lock
+from log.logger import log_info, log_warning
+from server.journal import read_msh_fields, read_sender
+from setting.config import get_config
+
+
+# Define the source for logging purposes
+SOURCE = "Spool"
+
+SPOOL_PENDING = "pending"  # Waiting for the database to be written
+SPOOL_REJECTED = "rejected"  # Replayed once the database was back, but not accepted
+
+SPOOL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created REAL NOT NULL
+)
+"""
+
+
+class ResultSpool:
+    """
+    Local SQLite outbox of the result messages received while the database is down.
+
+    A result that cannot reach the database is committed to the outbox and answered
+    with AA, so the analyzer does not stall or give up on it. Once the database is
+    back the spooled messages are processed again oldest first, see
+    drain_spooled_results. The whole message is spooled, not the SQL statement:
+    the result rows are built from a lookup that itself needs the database.
+
+    The AA of a spooled result is not final: the patient and test lookup only runs
+    when it is drained. A result rejected then (e.g. unknown patient, test not
+    requested) was already acknowledged to the analyzer. It is kept with status
+    rejected, listed by `rejected_messages` (/server/spool/rejected) and published
+    as a "spool" event, for the laboratory to enter by hand.
+
+    Example:
+        result_spool.add(message)
+        for spool_id, message in result_spool.pending(100):
+            result_spool.mark(spool_id, accepted=True)
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        self._lock = Lock()
+        self._connection = None
+        self._pending = 0  # Messages in the outbox with status pending
+
+        self.spooled = 0
+        self.drained = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self):
+        return self._connection is not None
+
+    @property
+    def has_pending(self):
+        return self._pending > 0
+
+    def open(self):
+        """
+        Opens the outbox, creating it if needed.
+        """
+        if self.is_open:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Used by the worker threads and the drain thread, serialized by the lock
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute(SPOOL_SCHEMA)
+        pending = connection.execute(
+            "SELECT COUNT(*) FROM outbox WHERE status = ?", (SPOOL_PENDING,)
+        ).fetchone()[0]
+
+        with self._lock:
+            self._connection = connection
+            self._pending = pending
+
+        log_info(f"Result spool opened with ({pending}) pending results.", source=SOURCE)
+
+    def close(self):
+        with self._lock:
+            connection = self._connection
+            self._connection = None
+
+        if connection is not None:
+            connection.close()
+            log_info("Result spool closed.", source=SOURCE)
+
+    def add(self, message):
+        """
+        Commits a message to the outbox.
+
+        Args:
+            message (bytes): The received HL7 message.
+
+        Returns:
+            int: The spool id to pass to mark.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO outbox (message, status, created) VALUES (?, ?, ?)",
+                (bytes(message), SPOOL_PENDING, time.time()),
+            )
+            self._pending += 1
+            self.spooled += 1
+            return cursor.lastrowid
+
+    def pending(self, limit):
+        """
+        Returns up to `limit` pending messages, oldest first.
+
+        Returns:
+            list: (spool id, message) tuples.
+        """
+        with self._lock:
+            if self._connection is None:
+                return []
+            return self._connection.execute(
+                "SELECT id, message FROM outbox WHERE status = ? ORDER BY id LIMIT ?",
+                (SPOOL_PENDING, limit),
+            ).fetchall()
+
+    def mark(self, spool_id, accepted):
+        """
+        Removes a drained message from the outbox, or keeps it as rejected.
+
+        Args:
+            spool_id (int): The spool id returned by add.
+            accepted (bool): True if the message was answered with AA and written.
+        """
+        with self._lock:
+            if self._connection is None:
+                return  # Closed while draining, the message is drained again on the next start
+            if accepted:
+                self._connection.execute("DELETE FROM outbox WHERE id = ?", (spool_id,))
+                self.drained += 1
+            else:
+                self._connection.execute(
+                    "UPDATE outbox SET status = ? WHERE id = ?", (SPOOL_REJECTED, spool_id)
+                )
+                self.rejected += 1
+            self._pending -= 1
+
+        if not accepted:
+            log_warning(f"Spooled result ({spool_id}) was not accepted, kept as rejected.", source=SOURCE)
+
+    def rejected_messages(self, limit=100):
+        """
+        Returns the spooled results that were not accepted when drained, newest first.
+
+        Returns:
+            list: The spool id, MSH-10, sender, spool time and message of each.
+        """
+        with self._lock:
+            if self._connection is None:
+                return []
+            rows = self._connection.execute(
+                "SELECT id, message, created FROM outbox WHERE status = ? ORDER BY id DESC LIMIT ?",
+                (SPOOL_REJECTED, limit),
+            ).fetchall()
+
+        return [describe_spooled(spool_id, message, created) for spool_id, message, created in rows]
+
+    def stats(self):
+        """
+        Returns the outbox length and the spool counters.
+        """
+        with self._lock:
+            return {
+                "open": self.is_open,
+                "pending": self._pending,
+                "spooled": self.spooled,
+                "drained": self.drained,
+                "rejected": self.rejected,
+            }
+
+
+def describe_spooled(spool_id, message, created=None):
+    """
+    Describes a spooled result for the API and the "spool" events.
+    """
+    _, msg_id = read_msh_fields(message)
+
+    return {
+        "id": spool_id,
+        "msg_id": msg_id,
+        "sender": read_sender(message),
+        "created": datetime.fromtimestamp(created).isoformat() if created is not None else None,
+        "message": bytes(message).decode(errors="replace"),
+    }
+
+
+cfg = get_config()  # Load configuration from file
+
+# Shared outbox of the results received while the database is down, opened by the server
+result_spool = ResultSpool(cfg["RESULT_SPOOL_PATH"])
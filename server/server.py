@@ -1,6 +1,16 @@
 import asyncio
 from server.client_handler import handle_client_connection
-from log.logger import log_info, log_error
+from server.response_cache import is_accepted_response, result_committed
+from server.incoming_data import handle_incoming_data, drain_spooled_results
+from server.journal import message_journal
+from server.result_spool import result_spool
+from server.worker_pool import worker_pool
+from database.worklist import worklist
+from database.sqlconnection import db_breaker
+from database.result_writer import result_writer, ACK_AFTER_JOURNAL, ACK_AFTER_COMMIT
+from server.events import event_broadcaster
+from hl7msghandel.hl7responder import validate_response_templates
+from log.logger import log_info, log_error, log_warning
 from setting.config import get_config
 import socket
 from threading import Lock
@@ -8,16 +18,27 @@ from threading import Lock
 # Define the source for logging purposes
 SOURCE = "Server"
 
+# Server lifecycle states
+SERVER_STOPPED = "stopped"
+SERVER_STARTING = "starting"
+SERVER_RUNNING = "running"
+SERVER_STOPPING = "stopping"
 
-
-
+SERVER_STATE_TEXT = {
+    SERVER_STOPPED: "Server is offline",
+    SERVER_STARTING: "Server is starting",
+    SERVER_RUNNING: "Server is running",
+    SERVER_STOPPING: "Server is stopping",
+}
 
 
 # Server state variables
-server_running = False
+server_state = SERVER_STOPPED
+server_error = None  # Why the last start failed, shown while the server is stopped
+server_task = None  # Background task running run_server
 server_tasks = []  # Track client tasks
 stop_event = None  # Event to stop the server
-status_lock = Lock()  # Thread-safe lock for server_running
+status_lock = Lock()  # Thread-safe lock for server_state
 
 
 def is_valid_ip(ip):
@@ -36,57 +57,127 @@ def is_server_running():
     Safely check if the server is running.
     """
     with status_lock:
-        return server_running
+        return server_state == SERVER_RUNNING
 
 
-async def set_server_running(state):
+def set_server_state(state, error=None):
     """
-    Safely set the server running state.
+    Safely set the server lifecycle state and notify the event subscribers.
     """
-    global server_running
+    global server_state, server_error
     with status_lock:
-        server_running = state
+        changed = server_state != state or server_error != error
+        server_state = state
+        server_error = error
 
+    if changed:
+        event_broadcaster.publish("server", get_server_state())
 
-async def run_server():
+
+def get_server_state():
     """
-    Starts the TCP server and manages incoming client connections.
+    Get the server state and its description as shown by /server/status.
     """
-    cfg = get_config()  # Load configuration from file
-    SERVER_HOST = cfg['SERVER_HOST']
-    SERVER_PORT = cfg['SERVER_PORT']
-    
-    global stop_event, server_tasks
+    with status_lock:
+        lifecycle = server_state
+        error = server_error
 
-    if is_server_running():
-        log_info("Server is already running", source=SOURCE)
-        return
+    state = "Online" if lifecycle == SERVER_RUNNING else "Offline"
+    text = SERVER_STATE_TEXT[lifecycle]
+    if error:
+        text = f"{text}: {error}"
 
-    # Create a new stop_event for the current event loop
-    stop_event = asyncio.Event()
+    return {"state": state, "text": text, "lifecycle": lifecycle}
+
+
+async def run_server(ready, host=None, port=None):
+    """
+    Starts the TCP server and manages incoming client connections.
+
+    Args:
+        ready (asyncio.Future): Set to (started, message) once the socket is bound or the start failed.
+        host (str): Address to listen on instead of SERVER_HOST, e.g. for the analyzer simulator.
+        port (int): Port to listen on instead of SERVER_PORT.
+    """
+    cfg = get_config()  # Load configuration from file
+    SERVER_HOST = host or cfg['SERVER_HOST']
+    SERVER_PORT = port or cfg['SERVER_PORT']
+    WORKER_COUNT = cfg['WORKER_COUNT']
+    WORKER_QUEUE_SIZE = cfg['WORKER_QUEUE_SIZE']
+    JOURNAL_ENABLED = cfg['JOURNAL_ENABLED']
+    WORKLIST_ENABLED = cfg['WORKLIST_ENABLED']
+    RESULT_WRITE_BEHIND = cfg['RESULT_WRITE_BEHIND']
+    ACK_MODE = cfg['ACK_MODE']
+    RESULT_SPOOL_ENABLED = cfg['RESULT_SPOOL_ENABLED']
+    RESULT_SPOOL_DRAIN_INTERVAL = cfg['RESULT_SPOOL_DRAIN_INTERVAL']
+
+    error = None
+    replay_task = None
+    worklist_task = None
+    drain_task = None
 
     # Validate the IP address and port
     if not is_valid_ip(SERVER_HOST):
-        log_error(f"Invalid IP address: {SERVER_HOST}", source=SOURCE)
-        return
-    if not (1 <= SERVER_PORT <= 65535):
-        log_error(f"Invalid port: {SERVER_PORT}. Port must be in the range 1–65535.", source=SOURCE)
+        error = f"Invalid IP address: {SERVER_HOST}"
+    elif not (1 <= SERVER_PORT <= 65535):
+        error = f"Invalid port: {SERVER_PORT}. Port must be in the range 1–65535."
+    elif not validate_response_templates():
+        error = "Invalid HL7 response templates, see the log for details."
+
+    if error:
+        log_error(error, source=SOURCE)
+        set_server_state(SERVER_STOPPED, error)
+        ready.set_result((False, error))
         return
 
-
-    await set_server_running(True)
-
+    # Start the shared pool that processes the messages of all clients
+    worker_pool.start(WORKER_COUNT, WORKER_QUEUE_SIZE)
 
     try:
+        if JOURNAL_ENABLED:
+            try:
+                message_journal.open()
+            except Exception as e:
+                # Keep receiving messages, only without crash protection
+                log_error(f"Error opening the message journal: {e}", source=SOURCE)
+
+        if RESULT_WRITE_BEHIND:
+            if ACK_MODE == ACK_AFTER_JOURNAL and not message_journal.is_open:
+                # Without the journal an acknowledged result that is not written yet is lost on a crash
+                log_warning("Results are acknowledged after commit, the message journal is not open.", source=SOURCE)
+                ACK_MODE = ACK_AFTER_COMMIT
+            result_writer.start(ack_mode=ACK_MODE)
+
+        if RESULT_SPOOL_ENABLED:
+            try:
+                result_spool.open()
+            except Exception as e:
+                # Keep receiving messages, results are not answered while the database is down
+                log_error(f"Error opening the result spool: {e}", source=SOURCE)
+
         server = await asyncio.start_server(client_connected, SERVER_HOST, SERVER_PORT)
         log_info(f"Server started at {SERVER_HOST}:{SERVER_PORT}", source=SOURCE)
 
+        set_server_state(SERVER_RUNNING)
+        ready.set_result((True, f"Server started at {SERVER_HOST}:{SERVER_PORT}"))
+
+        if message_journal.is_open:
+            replay_task = asyncio.create_task(replay_journal())
+
+        if WORKLIST_ENABLED:
+            # Preload the pending tests, the sample queries use the database until it is loaded
+            worklist_task = asyncio.create_task(worklist.run())
+
+        if result_spool.is_open:
+            drain_task = asyncio.create_task(drain_result_spool(RESULT_SPOOL_DRAIN_INTERVAL))
+
         async with server:
             await stop_event.wait()  # Wait for the stop event
             log_info("Server is shutting down...", source=SOURCE)
+            set_server_state(SERVER_STOPPING)
 
             # Cancel all client tasks
-            for task in server_tasks:
+            for task in list(server_tasks):
                 task.cancel()
                 try:
                     await task
@@ -97,23 +188,86 @@ async def run_server():
             await server.wait_closed()
             log_info("Server has shut down gracefully.", source=SOURCE)
 
-
-
     except OSError as e:
         if e.errno == 98:  # Address already in use
-            log_error(f"Port {SERVER_PORT} is busy.", source=SOURCE)
+            error = f"Port {SERVER_PORT} is busy."
         elif e.errno == 99:  # Cannot assign requested address
-            log_error(f"Invalid address or unavailable network: {SERVER_HOST}:{SERVER_PORT}", source=SOURCE)
+            error = f"Invalid address or unavailable network: {SERVER_HOST}:{SERVER_PORT}"
         else:
-            log_error(f"Unexpected error: {e}", source=SOURCE)
+            error = f"Unexpected error: {e}"
+        log_error(error, source=SOURCE)
     except Exception as e:
-        log_error(f"Unhandled error: {e}", source=SOURCE)
+        error = f"Unhandled error: {e}"
+        log_error(error, source=SOURCE)
     finally:
-        await set_server_running(False)
+        if replay_task is not None:
+            replay_task.cancel()
+        if worklist_task is not None:
+            worklist_task.cancel()
+        if drain_task is not None:
+            drain_task.cancel()
+        worklist.clear()
+        worker_pool.shutdown()
+        result_writer.stop()  # Before the journal, the written results are marked in it
+        message_journal.close()
+        result_spool.close()
+        set_server_state(SERVER_STOPPED, error)
+
+        if not ready.done():
+            # The start failed before the socket was bound
+            ready.set_result((False, error or "Server stopped before it started"))
+
+
+async def replay_journal():
+    """
+    Processes again the journaled messages whose processing did not finish before the
+    last stop, e.g. after a crash or while the database was down. The responses are
+    not sent, the analyzer stopped waiting for them.
+    """
+    pending = message_journal.pending_messages()
+    if not pending:
+        return
 
+    log_info(f"Replaying ({len(pending)}) journaled messages.", source=SOURCE)
+    accepted = 0
 
+    for record_id, message in pending:
+        handel_response = await handle_incoming_data(message)
+        is_accepted = is_accepted_response(handel_response)
+        accepted += is_accepted
+        message_journal.mark(record_id, is_accepted, result_committed(handel_response))
 
-    await set_server_running(False)
+    log_info(
+        f"Journal replay finished, ({accepted}) of ({len(pending)}) messages accepted.",
+        source=SOURCE,
+    )
+
+
+async def drain_result_spool(interval):
+    """
+    Writes the results spooled while the database was down once it is reachable
+    again, oldest first, and publishes a "spool" event for each rejected one.
+    Runs until cancelled, the database work runs on a separate thread.
+    """
+    while True:
+        await asyncio.sleep(interval)
+
+        # Results held by the writer are older than the spooled ones, they go first
+        if result_spool.has_pending and db_breaker.is_available() and not result_writer.is_retrying:
+            try:
+                rejected = await asyncio.to_thread(drain_spooled_results)
+            except Exception as e:
+                log_error(f"Error draining the result spool: {e}", source=SOURCE)
+                continue
+
+            # Acknowledged to the analyzer when spooled, the laboratory has to enter them by hand
+            for spooled in rejected:
+                log_error(
+                    f"Spooled result message NO.:{spooled['msg_id']} from {spooled['sender']}"
+                    " was acknowledged but rejected when written.",
+                    source=SOURCE,
+                )
+                event_broadcaster.publish("spool", spooled)
 
 
 async def client_connected(reader, writer):
@@ -134,13 +288,49 @@ async def client_connected(reader, writer):
         server_tasks.remove(task)
 
 
-async def start_server():
-    await run_server()  # Start the server asynchronously
+async def start_server(host=None, port=None):
+    """
+    Starts run_server as a background task on the running event loop.
+    Returns as soon as the socket is bound or the start failed, the server keeps
+    running until stop_server is called.
+
+    Args:
+        host (str): Address to listen on, defaults to SERVER_HOST from the configuration.
+        port (int): Port to listen on, defaults to SERVER_PORT from the configuration.
+
+    Returns:
+        tuple: (started, message), started is False when the server could not be started.
+    """
+    global server_task, stop_event
+
+    if server_task is not None and not server_task.done():
+        log_info("Server is already running", source=SOURCE)
+        return False, "Server is already running"
+
+    set_server_state(SERVER_STARTING)
+
+    # Create a new stop_event for the current event loop
+    stop_event = asyncio.Event()
+
+    ready = asyncio.get_running_loop().create_future()
+    server_task = asyncio.create_task(run_server(ready, host, port))
+
+    # The caller may be cancelled (e.g. the HTTP client went away), the server task is not
+    return await asyncio.shield(ready)
 
 
 async def stop_server():
-    global stop_event
+    """
+    Signals the server to stop and waits until it has shut down.
+
+    Returns:
+        tuple: (stopped, message), stopped is False when the server was not running.
+    """
+    if server_task is None or server_task.done():
+        return False, "Server is not running"
+
+    log_info("Stopping server...", source=SOURCE)
+    stop_event.set()  # Set the stop event to signal shutdown
+    await asyncio.shield(server_task)
 
-    if stop_event:
-        log_info("Stopping server...", source=SOURCE)
-        stop_event.set()  # Set the stop event to signal shutdown
+    return True, "Server stopped successfully."
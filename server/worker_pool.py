@@ -0,0 +1,162 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from log.logger import log_info, log_error
+from setting.config import get_config
+
+
+# Define the source for logging purposes
+SOURCE = "Server"
+
+
+class WorkerPoolFullError(Exception):
+    """
+    Raised when a job is submitted while every worker is busy and the queue is full.
+    """
+
+
+class MessageWorkerPool:
+    """
+    A bounded thread pool shared by all client connections for message processing.
+
+    Jobs run on a fixed number of worker threads. At most `workers + queue_size`
+    jobs are accepted at once; further jobs are rejected with WorkerPoolFullError
+    instead of piling up behind a slow database.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = None
+        self._lock = Lock()
+        self._pending = 0  # Jobs accepted and not finished (queued + active)
+        self._active = 0  # Jobs currently running on a worker
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    def start(self, workers=None, queue_size=None):
+        """
+        Starts the worker threads, optionally with a new size.
+        """
+        with self._lock:
+            if self._executor is not None:
+                return
+
+            if workers is not None:
+                self.workers = workers
+            if queue_size is not None:
+                self.queue_size = queue_size
+
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="MessageWorker"
+            )
+
+        log_info(
+            f"Message worker pool started with ({self.workers}) workers and a queue of ({self.queue_size}).",
+            source=SOURCE,
+        )
+
+    def shutdown(self, wait=False):
+        """
+        Stops accepting jobs and releases the worker threads.
+        """
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+            log_info("Message worker pool stopped.", source=SOURCE)
+
+    async def run(self, function, *args, timeout=None):
+        """
+        Runs a function on the worker pool and awaits its result without blocking the event loop.
+
+        Args:
+            function (callable): The blocking function to run.
+            *args: Arguments passed to the function.
+            timeout (float): Seconds to wait for the result, None to wait forever.
+
+        Returns:
+            The return value of the function.
+
+        Raises:
+            WorkerPoolFullError: If all workers are busy and the queue is full.
+            asyncio.TimeoutError: If the result is not ready within the timeout.
+        """
+        self.start()  # No-op when the server already started the pool
+
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self._rejected += 1
+                raise WorkerPoolFullError(
+                    f"Worker pool is full ({self._pending} messages in progress)."
+                )
+            self._pending += 1
+            executor = self._executor
+
+        try:
+            future = executor.submit(self._run_job, function, *args)
+        except Exception:
+            self._finish_job(None)
+            raise
+        future.add_done_callback(self._finish_job)
+
+        try:
+            # The worker keeps running after a timeout; its slot is released when it finishes
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise
+
+    def _run_job(self, function, *args):
+        """
+        Runs a job on a worker thread and keeps the active count.
+        """
+        with self._lock:
+            self._active += 1
+        try:
+            return function(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _finish_job(self, future):
+        """
+        Releases the slot of a finished job and records its outcome.
+        """
+        with self._lock:
+            self._pending -= 1
+            if future is None or future.cancelled() or future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+        if future is not None and not future.cancelled() and future.exception() is not None:
+            log_error(f"Error in message worker: {future.exception()}", source=SOURCE)
+
+    def stats(self):
+        """
+        Returns the current size and counters of the pool.
+        """
+        with self._lock:
+            return {
+                "running": self._executor is not None,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "active": self._active,
+                "queued": self._pending - self._active,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+
+cfg = get_config()  # Load configuration from file
+
+# Worker pool shared by every client connection
+worker_pool = MessageWorkerPool(cfg["WORKER_COUNT"], cfg["WORKER_QUEUE_SIZE"])
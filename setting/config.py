@@ -5,10 +5,16 @@ import os
 import json
 import base64
 import secrets
-import pyodbc
+from copy import deepcopy
+from threading import Lock
 from log.logger import log_info, log_error, log_warning
 from typing import Dict, Any, List, Optional, Tuple
 
+try:
+    import pyodbc
+except ImportError:  # Only needed for SQL Server, e.g. not when running on SQLite
+    pyodbc = None
+
 
 SOURCE = "Config"
 
@@ -47,16 +53,73 @@ TEST_FINISH_CODE = False
 # Default database settings
 DB_USER = "sa"  # Encrypt
 DB_PASSWORD = "123456"  # Encrypt
-DB_TYPE = "local"
+DB_TYPE = "local"  # "local" or "online" SQL Server, "sqlite" for a local SQLite file
 DB_DRIVE = "ODBC Driver 17 for SQL Server"
 DB_HOST = "localhost"
 DB_PORT = 1433
 DB_NAME = "patients"
+DB_SQLITE_PATH = "patients.sqlite3"  # Database file used when DB_TYPE is "sqlite"
+
+# Database connection pool settings
+DB_POOL_MIN_SIZE = 1  # Idle connections kept open
+DB_POOL_MAX_SIZE = 8  # Connections open at the same time
+DB_POOL_IDLE_TIMEOUT = 300  # Seconds before an idle connection is closed
+DB_POOL_CHECKOUT_TIMEOUT = 10  # Seconds to wait for a free connection
+DB_POOL_HEALTH_CHECK_AFTER = 30  # Idle seconds after which a connection is tested on checkout
 
 # server setting
 SERVER_HOST = "192.168.1.103"
 SERVER_PORT = 4000
 
+# message processing worker pool
+WORKER_COUNT = 4  # Threads that parse messages and run the database work
+WORKER_QUEUE_SIZE = 32  # Messages allowed to wait for a free worker
+RESPONSE_TIMEOUT = 10  # Seconds to wait for a message response
+DEVICE_QUEUE_SIZE = 32  # Messages of one analyzer waiting to be processed before its reads pause
+
+# inbound message journal, replayed on start when a message was not processed
+JOURNAL_ENABLED = True
+JOURNAL_DIR = "journal"
+JOURNAL_SEGMENT_SIZE = 8 * 1024 * 1024  # Bytes written to a segment file before a new one starts
+JOURNAL_FSYNC_BATCH = 64  # Records written with a single fsync at most
+JOURNAL_REPLAY_LIMIT = 3  # Failed attempts before a journaled message is no longer replayed
+JOURNAL_MESSAGE_TYPES = ["ORU^R01"]  # Message types journaled before processing
+
+# responses kept to answer retransmitted messages again without processing them
+RESPONSE_CACHE_SIZE = 1024  # Responses kept at most, 0 disables the cache
+RESPONSE_CACHE_TTL = 600  # Seconds a response is kept
+RESPONSE_CACHE_MESSAGE_TYPES = ["ORU^R01"]  # Message types whose responses are kept
+
+# patient info answered to the ORM^O01 sample queries without the database
+PATIENT_INFO_CACHE_SIZE = 4096  # Patients kept at most, 0 disables the cache
+PATIENT_INFO_CACHE_TTL = 300  # Seconds a patient info is kept
+
+# worklist of the pending tests loaded at server start to answer the ORM^O01 sample queries
+WORKLIST_ENABLED = True
+WORKLIST_REFRESH_INTERVAL = 30  # Seconds between the loads of the newly requested tests
+WORKLIST_RELOAD_INTERVAL = 3600  # Seconds between the full reloads, dropping the finished tests
+
+# write-behind of the results, written in batches by a background writer
+RESULT_WRITE_BEHIND = False
+RESULT_BATCH_SIZE = 64  # Results written in one transaction at most
+RESULT_BATCH_INTERVAL = 0.05  # Seconds a batch waits for more results after the first one, with ACK_MODE "journal"
+ACK_MODE = "commit"  # "commit": ACK once the result is written, "journal": once it is journaled and queued
+RESULT_RETRY_INTERVAL = 5  # Seconds between the retries of acknowledged results while the database is unavailable
+
+# circuit breaker failing the database calls fast while the database is unreachable
+DB_BREAKER_FAILURE_THRESHOLD = 3  # Consecutive connection failures before the breaker opens
+DB_BREAKER_RESET_TIMEOUT = 30  # Seconds the breaker stays open before the database is tried again
+
+# local outbox of the results received while the database is unreachable
+RESULT_SPOOL_ENABLED = True
+RESULT_SPOOL_PATH = "spool/results.sqlite3"
+RESULT_SPOOL_DRAIN_INTERVAL = 5  # Seconds between the checks for spooled results to write
+RESULT_SPOOL_DRAIN_BATCH = 100  # Spooled results read from the outbox at a time
+
+# ORU^R01 and ORM^O01 messages are tokenized lazily instead of parsed with hl7.parse
+HL7_FAST_PARSE = True
+HL7_VALIDATE_RESPONSES = False  # Debug only: parse and validate every response sent
+
 APP_USER = "admin"
 APP_PASSWORD = "123"
 
@@ -93,6 +156,37 @@ default_config_data = {
     "TEST_FINISH_CODE": TEST_FINISH_CODE,
     "SERVER_HOST": SERVER_HOST,
     "SERVER_PORT": SERVER_PORT,
+    "WORKER_COUNT": WORKER_COUNT,
+    "WORKER_QUEUE_SIZE": WORKER_QUEUE_SIZE,
+    "RESPONSE_TIMEOUT": RESPONSE_TIMEOUT,
+    "DEVICE_QUEUE_SIZE": DEVICE_QUEUE_SIZE,
+    "JOURNAL_ENABLED": JOURNAL_ENABLED,
+    "JOURNAL_DIR": JOURNAL_DIR,
+    "JOURNAL_SEGMENT_SIZE": JOURNAL_SEGMENT_SIZE,
+    "JOURNAL_FSYNC_BATCH": JOURNAL_FSYNC_BATCH,
+    "JOURNAL_REPLAY_LIMIT": JOURNAL_REPLAY_LIMIT,
+    "JOURNAL_MESSAGE_TYPES": JOURNAL_MESSAGE_TYPES,
+    "RESPONSE_CACHE_SIZE": RESPONSE_CACHE_SIZE,
+    "RESPONSE_CACHE_TTL": RESPONSE_CACHE_TTL,
+    "RESPONSE_CACHE_MESSAGE_TYPES": RESPONSE_CACHE_MESSAGE_TYPES,
+    "PATIENT_INFO_CACHE_SIZE": PATIENT_INFO_CACHE_SIZE,
+    "PATIENT_INFO_CACHE_TTL": PATIENT_INFO_CACHE_TTL,
+    "WORKLIST_ENABLED": WORKLIST_ENABLED,
+    "WORKLIST_REFRESH_INTERVAL": WORKLIST_REFRESH_INTERVAL,
+    "WORKLIST_RELOAD_INTERVAL": WORKLIST_RELOAD_INTERVAL,
+    "RESULT_WRITE_BEHIND": RESULT_WRITE_BEHIND,
+    "RESULT_BATCH_SIZE": RESULT_BATCH_SIZE,
+    "RESULT_BATCH_INTERVAL": RESULT_BATCH_INTERVAL,
+    "ACK_MODE": ACK_MODE,
+    "RESULT_RETRY_INTERVAL": RESULT_RETRY_INTERVAL,
+    "DB_BREAKER_FAILURE_THRESHOLD": DB_BREAKER_FAILURE_THRESHOLD,
+    "DB_BREAKER_RESET_TIMEOUT": DB_BREAKER_RESET_TIMEOUT,
+    "RESULT_SPOOL_ENABLED": RESULT_SPOOL_ENABLED,
+    "RESULT_SPOOL_PATH": RESULT_SPOOL_PATH,
+    "RESULT_SPOOL_DRAIN_INTERVAL": RESULT_SPOOL_DRAIN_INTERVAL,
+    "RESULT_SPOOL_DRAIN_BATCH": RESULT_SPOOL_DRAIN_BATCH,
+    "HL7_FAST_PARSE": HL7_FAST_PARSE,
+    "HL7_VALIDATE_RESPONSES": HL7_VALIDATE_RESPONSES,
     "API_PORT": API_PORT,
     "API_IP": API_IP,
     "DB_TYPE": DB_TYPE,
@@ -100,6 +194,12 @@ default_config_data = {
     "DB_HOST": DB_HOST,
     "DB_PORT": DB_PORT,
     "DB_NAME": DB_NAME,
+    "DB_SQLITE_PATH": DB_SQLITE_PATH,
+    "DB_POOL_MIN_SIZE": DB_POOL_MIN_SIZE,
+    "DB_POOL_MAX_SIZE": DB_POOL_MAX_SIZE,
+    "DB_POOL_IDLE_TIMEOUT": DB_POOL_IDLE_TIMEOUT,
+    "DB_POOL_CHECKOUT_TIMEOUT": DB_POOL_CHECKOUT_TIMEOUT,
+    "DB_POOL_HEALTH_CHECK_AFTER": DB_POOL_HEALTH_CHECK_AFTER,
     "DB_USER": DB_USER,
     "DB_PASSWORD": DB_PASSWORD,
     "APP_USER": APP_USER,
@@ -108,6 +208,14 @@ default_config_data = {
 }
 
 
+# Process-wide caches, the config is reloaded only when config.json or key.key change
+_config_cache: Optional[Dict[str, Any]] = None
+_config_cache_stamp: Optional[Tuple] = None
+_config_lock = Lock()
+_fernet_cache: Dict[bytes, Fernet] = {}
+_sql_drivers_cache: Optional[List[str]] = None
+
+
 def generate_secure_key() -> bytes:
     """Generate a secure encryption key using PBKDF2."""
     salt = secrets.token_bytes(SALT_LENGTH)
@@ -129,10 +237,18 @@ def validate_password(password: str) -> bool:
     return True
 
 
+def _get_fernet(key: bytes) -> Fernet:
+    """Return the Fernet instance for a key, creating it once."""
+    f = _fernet_cache.get(key)
+    if f is None:
+        f = _fernet_cache[key] = Fernet(key)
+    return f
+
+
 def encrypt_value(value: str, key: bytes) -> str:
     """Encrypt a string value using Fernet."""
     try:
-        f = Fernet(key)
+        f = _get_fernet(key)
         return f.encrypt(value.encode()).decode()
     except Exception as e:
         log_error(f"Encryption error: {e}", source=SOURCE)
@@ -142,7 +258,7 @@ def encrypt_value(value: str, key: bytes) -> str:
 def decrypt_value(encrypted_value: str, key: bytes) -> str:
     """Decrypt a string value using Fernet."""
     try:
-        f = Fernet(key)
+        f = _get_fernet(key)
         return f.decrypt(encrypted_value.encode()).decode()
     except Exception as e:
         log_error(f"Decryption error: {e}", source=SOURCE)
@@ -185,18 +301,48 @@ def _load_config(
         return {}
 
 
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Return the modification time and size of a file, None if it does not exist."""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def invalidate_config_cache() -> None:
+    """Drop the cached configuration so the next get_config reloads it from disk."""
+    global _config_cache, _config_cache_stamp
+    with _config_lock:
+        _config_cache = None
+        _config_cache_stamp = None
+
+
 def get_config() -> Dict[str, Any]:
     """Get the current configuration."""
-    config_data = _load_config(CONFIG_URL, encrypt_list, KEY_URL)
-    if not config_data:
-        config_data = default_config_data.copy()
+    global _config_cache, _config_cache_stamp
+
+    stamp = (_file_stamp(CONFIG_URL), _file_stamp(KEY_URL))
+
+    with _config_lock:
+        if _config_cache is None or stamp != _config_cache_stamp:
+            config_data = _load_config(CONFIG_URL, encrypt_list, KEY_URL)
+            if not config_data:
+                config_data = default_config_data.copy()
+
+            # Fill settings added after the config file was written with their defaults
+            for key, value in default_config_data.items():
+                config_data.setdefault(key, value)
+
+            # Ensure DB_DRIVE is valid
+            if not validate_sql_driver(config_data.get("DB_DRIVE", "")):
+                config_data["DB_DRIVE"] = get_default_sql_driver()
+                log_info(f"Updated DB_DRIVE to {config_data['DB_DRIVE']}", source=SOURCE)
 
-    # Ensure DB_DRIVE is valid
-    if not validate_sql_driver(config_data.get("DB_DRIVE", "")):
-        config_data["DB_DRIVE"] = get_default_sql_driver()
-        log_info(f"Updated DB_DRIVE to {config_data['DB_DRIVE']}", source=SOURCE)
+            _config_cache = config_data
+            _config_cache_stamp = stamp
 
-    return config_data.copy()
+        return deepcopy(_config_cache)
 
 
 def save_config(config_data_to_save: Dict[str, Any]) -> None:
@@ -261,6 +407,8 @@ def save_config(config_data_to_save: Dict[str, Any]) -> None:
         with open(CONFIG_URL, "w") as file:
             json.dump(existing_config, file, indent=4)
 
+        invalidate_config_cache()
+
         log_info("Configuration saved successfully.", source=SOURCE)
     except Exception as e:
         log_error(f"Error saving configuration: {e}", source=SOURCE)
@@ -270,14 +418,26 @@ def save_config(config_data_to_save: Dict[str, Any]) -> None:
 def get_available_sql_drivers() -> List[str]:
     """
     Get a list of available SQL Server drivers on the system.
+    The drivers are enumerated once per process.
     Returns a list of driver names.
     """
+    global _sql_drivers_cache
+
+    if _sql_drivers_cache is not None:
+        return list(_sql_drivers_cache)
+
+    if pyodbc is None:
+        log_warning("pyodbc is not installed, no SQL Server drivers available", source=SOURCE)
+        _sql_drivers_cache = []
+        return []
+
     try:
         drivers = pyodbc.drivers()
         sql_drivers = [driver for driver in drivers if "SQL Server" in driver]
         if not sql_drivers:
             log_warning("No SQL Server drivers found on the system", source=SOURCE)
-        return sql_drivers
+        _sql_drivers_cache = sql_drivers
+        return list(sql_drivers)
     except Exception as e:
         log_error(f"Error getting SQL drivers: {e}", source=SOURCE)
         return []
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+
+def pytest_configure(config):
+    # The modules create the configuration key and the log files in the working
+    # directory when imported, keep them out of the checkout
+    os.chdir(tempfile.mkdtemp(prefix="yourlis_tests_"))
@@ -0,0 +1,144 @@
+import pytest
+
+from database.circuit_breaker import (
+    CircuitBreaker,
+    DatabaseUnavailableError,
+    BREAKER_CLOSED,
+    BREAKER_OPEN,
+    BREAKER_HALF_OPEN,
+)
+from database.sqlconnection import ConnectionPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def new_breaker(clock, failure_threshold=3, reset_timeout=30):
+    return CircuitBreaker(failure_threshold, reset_timeout, clock=clock)
+
+
+def test_opens_after_consecutive_failures():
+    breaker = new_breaker(FakeClock())
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.check()  # Still closed
+    assert breaker.state == BREAKER_CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == BREAKER_OPEN
+    with pytest.raises(DatabaseUnavailableError):
+        breaker.check()
+    assert breaker.stats()["trips"] == 1
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_success_resets_the_consecutive_failures():
+    breaker = new_breaker(FakeClock())
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == BREAKER_CLOSED
+
+
+def test_half_open_lets_a_single_probe_through():
+    clock = FakeClock()
+    breaker = new_breaker(clock, failure_threshold=1)
+    breaker.record_failure()
+
+    clock.now = 29
+    assert not breaker.is_available()
+
+    clock.now = 30
+    assert breaker.is_available()
+    breaker.check()  # The probe
+    assert breaker.state == BREAKER_HALF_OPEN
+    assert not breaker.is_available()
+    with pytest.raises(DatabaseUnavailableError):
+        breaker.check()
+
+
+def test_successful_probe_closes():
+    clock = FakeClock()
+    breaker = new_breaker(clock, failure_threshold=1)
+    breaker.record_failure()
+
+    clock.now = 30
+    breaker.check()
+    breaker.record_success()
+
+    assert breaker.state == BREAKER_CLOSED
+    breaker.check()
+
+
+def test_failed_probe_opens_again_for_a_full_timeout():
+    clock = FakeClock()
+    breaker = new_breaker(clock, failure_threshold=3)
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now = 30
+    breaker.check()
+    breaker.record_failure()  # A single failure is enough in half open
+
+    assert breaker.state == BREAKER_OPEN
+    assert breaker.stats()["trips"] == 2
+    clock.now = 59
+    assert not breaker.is_available()
+    clock.now = 60
+    assert breaker.is_available()
+
+
+def test_check_without_probe_does_not_reserve_it():
+    clock = FakeClock()
+    breaker = new_breaker(clock, failure_threshold=1)
+    breaker.record_failure()
+
+    clock.now = 30
+    breaker.check(probe=False)
+
+    assert breaker.state == BREAKER_OPEN
+    breaker.check()  # The probe is still free
+    assert breaker.state == BREAKER_HALF_OPEN
+
+
+def test_pool_fails_fast_while_open():
+    clock = FakeClock()
+    breaker = new_breaker(clock, failure_threshold=2)
+    attempts = []
+
+    def connect():
+        attempts.append(clock.now)
+        raise OSError("server unreachable")
+
+    pool = ConnectionPool(
+        connect,
+        min_size=0,
+        max_size=4,
+        idle_timeout=60,
+        checkout_timeout=1,
+        health_check_after=60,
+        breaker=breaker,
+    )
+
+    for _ in range(4):
+        with pytest.raises(DatabaseUnavailableError):
+            pool.checkout()
+
+    assert len(attempts) == 2  # Not tried again while open
+    assert pool.stats()["size"] == 0  # The reserved slots were released
+
+    clock.now = 30
+    with pytest.raises(DatabaseUnavailableError):
+        pool.checkout()
+    assert len(attempts) == 3  # The half open probe
+    assert breaker.state == BREAKER_OPEN
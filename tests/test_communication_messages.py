@@ -0,0 +1,17 @@
+from server import client_handler
+from server.client_handler import add_communication_message, get_communication_messages
+
+
+def test_limit_returns_a_cursor_that_skips_nothing(monkeypatch):
+    monkeypatch.setattr(client_handler, "communication_messages", client_handler.deque(maxlen=100))
+    for number in range(5):
+        add_communication_message(("10.0.0.1", 5000), f"message {number}", "device")
+
+    first, since = get_communication_messages(0, limit=2)
+    second, since = get_communication_messages(since, limit=2)
+    third, since = get_communication_messages(since, limit=2)
+
+    received = [msg["message"] for msg in first + second + third]
+    assert received == [f"message {number}" for number in range(5)]
+    assert since == client_handler.get_communication_head()
+    assert get_communication_messages(since, limit=2)[0] == []
@@ -0,0 +1,163 @@
+import threading
+import time
+
+import pytest
+
+from database.sqlconnection import ConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, values=()):
+        if not self.connection.alive:
+            raise OSError("connection reset")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.connections = []
+
+    def connect(self):
+        connection = FakeConnection(len(self.connections) + 1)
+        self.connections.append(connection)
+        return connection
+
+
+def new_pool(database, max_size=2, idle_timeout=60, checkout_timeout=1, health_check_after=60):
+    return ConnectionPool(
+        database.connect,
+        min_size=0,
+        max_size=max_size,
+        idle_timeout=idle_timeout,
+        checkout_timeout=checkout_timeout,
+        health_check_after=health_check_after,
+    )
+
+
+def test_connections_are_reused():
+    database = FakeDatabase()
+    pool = new_pool(database)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert second is first
+    assert len(database.connections) == 1
+    assert pool.stats()["checkouts"] == 2
+
+
+def test_checkout_times_out_when_every_connection_is_in_use():
+    pool = new_pool(FakeDatabase(), max_size=1, checkout_timeout=0.05)
+    held = pool.checkout()
+
+    with pytest.raises(ConnectionError):
+        pool.checkout()
+    assert pool.stats()["timeouts"] == 1
+
+    pool.checkin(held)
+    assert pool.checkout() is held
+
+
+def test_checkin_wakes_a_waiting_checkout():
+    pool = new_pool(FakeDatabase(), max_size=1, checkout_timeout=5)
+    held = pool.checkout()
+    checked_out = []
+
+    waiting = threading.Thread(target=lambda: checked_out.append(pool.checkout()))
+    waiting.start()
+    time.sleep(0.05)
+    pool.checkin(held)
+    waiting.join(5)
+
+    assert checked_out == [held]
+
+
+def test_dead_connection_is_replaced_after_the_idle_health_check():
+    database = FakeDatabase()
+    pool = new_pool(database, health_check_after=0)
+
+    with pool.connection() as first:
+        pass
+    database.connections[0].alive = False
+
+    with pool.connection() as second:
+        pass
+
+    assert second is not first
+    assert database.connections[0].closed
+    assert pool.stats()["broken"] == 1
+    assert pool.stats()["size"] == 1
+
+
+def test_connection_that_raised_is_evicted():
+    database = FakeDatabase()
+    pool = new_pool(database)
+
+    with pytest.raises(OSError):
+        with pool.connection() as connection:
+            raise OSError("connection reset")
+
+    assert database.connections[0].closed
+    assert pool.stats()["size"] == 0
+
+    with pool.connection() as replacement:
+        pass
+    assert replacement is not connection
+
+
+def test_broken_connection_is_closed_on_checkin():
+    database = FakeDatabase()
+    pool = new_pool(database)
+
+    with pool.connection() as connection:
+        connection.mark_broken()
+
+    assert database.connections[0].closed
+    assert pool.stats()["idle"] == 0
+
+
+def test_idle_connections_are_closed_after_the_idle_timeout():
+    database = FakeDatabase()
+    pool = new_pool(database, idle_timeout=30)
+
+    first = pool.checkout()
+    second = pool.checkout()
+    pool.checkin(first)
+    pool.checkin(second)
+    first.last_used -= 60  # Idle past the timeout
+
+    with pool.connection() as connection:
+        pass
+
+    assert connection is second
+    assert database.connections[0].closed
+    assert pool.stats()["evicted"] == 1
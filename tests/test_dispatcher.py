@@ -0,0 +1,121 @@
+import asyncio
+
+from server.dispatcher import DeviceDispatcher
+
+
+def test_messages_of_a_device_are_handled_in_order():
+    async def scenario():
+        dispatcher = DeviceDispatcher(queue_size=4)
+        handled = []
+
+        async def handler(item):
+            await asyncio.sleep(0.001 * (item % 3))  # Uneven processing times
+            handled.append(item)
+
+        device = dispatcher.open("analyzer", handler)
+        for item in range(20):
+            assert await dispatcher.put(device, item)
+        await dispatcher.close(device)
+        return handled
+
+    assert asyncio.run(scenario()) == list(range(20))
+
+
+def test_devices_are_handled_in_parallel():
+    async def scenario():
+        dispatcher = DeviceDispatcher(queue_size=4)
+        started = asyncio.Event()
+        release = asyncio.Event()
+        handled = []
+
+        async def slow_handler(item):
+            started.set()
+            await release.wait()
+            handled.append(("slow", item))
+
+        async def fast_handler(item):
+            handled.append(("fast", item))
+
+        slow = dispatcher.open("slow", slow_handler)
+        fast = dispatcher.open("fast", fast_handler)
+
+        await dispatcher.put(slow, 1)
+        await started.wait()
+        await dispatcher.put(fast, 1)
+        await dispatcher.close(fast)  # Done while the slow device is still busy
+
+        release.set()
+        await dispatcher.close(slow)
+        return handled
+
+    assert asyncio.run(scenario()) == [("fast", 1), ("slow", 1)]
+
+
+def test_put_waits_while_the_queue_is_full():
+    async def scenario():
+        dispatcher = DeviceDispatcher(queue_size=2)
+        release = asyncio.Event()
+
+        async def handler(item):
+            await release.wait()
+
+        device = dispatcher.open("analyzer", handler)
+        await dispatcher.put(device, 1)
+        await asyncio.sleep(0)  # The handler takes item 1 and waits
+        await dispatcher.put(device, 2)
+        await dispatcher.put(device, 3)
+
+        blocked = asyncio.create_task(dispatcher.put(device, 4))
+        await asyncio.sleep(0.01)
+        was_blocked = not blocked.done()
+
+        release.set()
+        accepted = await blocked
+        await dispatcher.close(device)
+        return was_blocked, accepted, device.paused, device.processed
+
+    assert asyncio.run(scenario()) == (True, True, 1, 4)
+
+
+def test_a_failed_handler_stops_the_device():
+    async def scenario():
+        dispatcher = DeviceDispatcher(queue_size=2)
+        handled = []
+
+        async def handler(item):
+            if item == 2:
+                raise ConnectionResetError("client gone")
+            handled.append(item)
+
+        device = dispatcher.open("analyzer", handler)
+        results = [await dispatcher.put(device, item) for item in range(1, 6)]
+        await asyncio.sleep(0.01)
+        after_failure = await dispatcher.put(device, 6)
+        await dispatcher.close(device)
+        return handled, results[0], after_failure, dispatcher.stats()
+
+    handled, first, after_failure, stats = asyncio.run(scenario())
+    assert handled == [1]
+    assert first is True
+    assert after_failure is False
+    assert stats == {}  # Closed devices are no longer listed
+
+
+def test_close_without_drain_drops_the_queue():
+    async def scenario():
+        dispatcher = DeviceDispatcher(queue_size=8)
+        release = asyncio.Event()
+        handled = []
+
+        async def handler(item):
+            await release.wait()
+            handled.append(item)
+
+        device = dispatcher.open("analyzer", handler)
+        for item in range(3):
+            await dispatcher.put(device, item)
+        await asyncio.sleep(0)
+        await dispatcher.close(device, drain=False)
+        return handled
+
+    assert asyncio.run(scenario()) == []
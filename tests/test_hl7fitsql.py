@@ -0,0 +1,102 @@
+from copy import deepcopy
+
+import hl7
+import pytest
+
+import hl7msghandel.hl7dictionary as hl7dictionary
+from hl7msghandel.hl7fitsql import apply_hl7_plan, compile_hl7_plan, SQL_FIELD, MANUAL_FIELD
+from hl7msghandel.hl7message import IndexedHl7Message
+from hl7msghandel.hl7tokenizer import tokenize_hl7_message
+from tools.sample_messages import oru_r01_message, orm_o01_message
+
+
+ORU_DICTIONARIES = (
+    "RESULT_EXIST_HL7",
+    "CBC_RESULT_HL7",
+    "HGB_RESULT_HL7",
+    "PATIENT_INFO_ORU_HL7",
+    "PATIENT_TEST_HL7",
+    "RESULT_LOOKUP_HL7",
+)
+ORM_DICTIONARIES = ("PATIENT_INFO_ORM_HL7",)
+
+MESSAGES = {
+    "oru": oru_r01_message("100001", "1"),
+    "oru_histograms": oru_r01_message("100002", "2", histograms=True),
+    "orm": orm_o01_message("100003", "3"),
+}
+
+CASES = [
+    (message, dictionary)
+    for message, dictionaries in (
+        ("oru", ORU_DICTIONARIES),
+        ("oru_histograms", ORU_DICTIONARIES),
+        ("orm", ORM_DICTIONARIES),
+    )
+    for dictionary in dictionaries
+]
+
+PARSERS = {
+    "hl7.parse": lambda raw_message: IndexedHl7Message(hl7.parse(raw_message)),
+    "tokenizer": tokenize_hl7_message,
+}
+
+
+def deepcopy_mapping(hl7_message, hl7_dictionary, sql_data):
+    """
+    The mapping of the former update_hl7_dictionary: a deep copy of the dictionary
+    with each address replaced by its message value, the MANUAL items removed and
+    the values bound as str() by the query builders.
+    """
+    mapping = deepcopy(hl7_dictionary)
+
+    for part in ("COLUMN_NAME", "CONDITION"):
+        items = mapping[part]
+        for key, value in list(items.items()):
+            if value == SQL_FIELD:
+                items[key] = sql_data[key]
+            elif value == MANUAL_FIELD:
+                del items[key]
+            else:
+                items[key] = hl7_message.segments(value["S"])[int(value["N"])][int(value["F"])]
+
+    return (
+        {key: str(value) for key, value in mapping["COLUMN_NAME"].items()},
+        {key: str(value) for key, value in mapping["CONDITION"].items()},
+    )
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("message, dictionary", CASES)
+def test_plan_gives_the_deepcopy_mapping(message, dictionary, parser):
+    hl7_dictionary = getattr(hl7dictionary, dictionary)
+    raw_message = MESSAGES[message]
+    sql_data = {
+        key: f"sql {key}"
+        for key, value in hl7_dictionary["COLUMN_NAME"].items()
+        if value == SQL_FIELD
+    }
+
+    # The former path always read hl7.parse containers
+    expected_columns, expected_conditions = deepcopy_mapping(hl7.parse(raw_message), hl7_dictionary, sql_data)
+
+    hl7_values = apply_hl7_plan(PARSERS[parser](raw_message), compile_hl7_plan(hl7_dictionary), sql_data)
+
+    assert dict(zip(hl7_values.columns, hl7_values.values)) == expected_columns
+    assert list(hl7_values.columns) == list(expected_columns)  # Same column order
+    assert dict(zip(hl7_values.condition_columns, hl7_values.condition_values)) == expected_conditions
+
+
+def test_compiled_plans_match_their_dictionaries():
+    assert hl7dictionary.CBC_RESULT_PLAN == compile_hl7_plan(hl7dictionary.CBC_RESULT_HL7)
+    assert hl7dictionary.PATIENT_INFO_ORM_PLAN == compile_hl7_plan(hl7dictionary.PATIENT_INFO_ORM_HL7)
+
+
+def test_sql_and_manual_items_without_data_are_left_out():
+    hl7_message = tokenize_hl7_message(MESSAGES["oru"])
+
+    hl7_values = apply_hl7_plan(hl7_message, hl7dictionary.CBC_RESULT_PLAN)
+
+    assert "REQ_DATE" not in hl7_values.columns  # SQL item
+    assert "COMMENT" not in hl7_values.columns  # MANUAL item
+    assert hl7_values.values[hl7_values.columns.index("PATIENT_ID")] == "100001"
@@ -0,0 +1,105 @@
+import hl7
+import pytest
+
+from hl7msghandel.hl7message import IndexedHl7Message
+from hl7msghandel.hl7tokenizer import LazyHl7Message, tokenize_hl7_message
+from tools.sample_messages import oru_r01_message, orm_o01_message, ack_o02_message
+
+
+MESSAGES = {
+    "oru": oru_r01_message("100001", "1"),
+    "oru_histograms": oru_r01_message("100002", "2", histograms=True),
+    "orm": orm_o01_message("100003", "3"),
+    "ack": ack_o02_message("4"),
+}
+
+PARSERS = {
+    "indexed": lambda raw_message: IndexedHl7Message(hl7.parse(raw_message)),
+    # The ACK falls back to hl7.parse, like in parse_hl7_message
+    "lazy": lambda raw_message: tokenize_hl7_message(raw_message) or IndexedHl7Message(hl7.parse(raw_message)),
+}
+
+
+def segment_names(message):
+    return [str(segment[0]) for segment in message]
+
+
+@pytest.fixture(params=PARSERS)
+def parse(request):
+    return PARSERS[request.param]
+
+
+@pytest.mark.parametrize("name", MESSAGES)
+def test_segments_match_hl7_parse(parse, name):
+    reference = hl7.parse(MESSAGES[name])
+    message = parse(MESSAGES[name])
+
+    assert len(message) == len(reference)
+    assert segment_names(message) == segment_names(reference)
+    assert str(message) == str(reference)
+
+    for segment_id in set(segment_names(reference)):
+        assert message.has_segment(segment_id)
+        assert [str(segment) for segment in message.segments(segment_id)] == [
+            str(segment) for segment in reference.segments(segment_id)
+        ]
+        assert str(message.segment(segment_id)) == str(reference.segment(segment_id))
+
+
+@pytest.mark.parametrize("name", MESSAGES)
+def test_fields_match_hl7_parse(parse, name):
+    reference = hl7.parse(MESSAGES[name])
+    message = parse(MESSAGES[name])
+
+    for index, reference_segment in enumerate(reference):
+        segment = message[index]
+        assert len(segment) == len(reference_segment)
+        for field in range(len(reference_segment)):
+            assert str(segment[field]) == str(reference_segment[field])
+
+
+def test_components_match_hl7_parse(parse):
+    reference = hl7.parse(MESSAGES["oru"])
+    message = parse(MESSAGES["oru"])
+
+    # MSH-9 and OBX-3 are split into components by hl7.parse
+    for segment_id, field in (("MSH", 9), ("OBX", 3)):
+        reference_field = reference.segment(segment_id)[field]
+        components = str(message.segment(segment_id)[field]).split("^")
+        assert components == [str(component) for component in reference_field[0]]
+
+
+def test_missing_segment(parse):
+    message = parse(MESSAGES["oru"])
+
+    assert not message.has_segment("ORC")
+    with pytest.raises(KeyError):
+        message.segments("ORC")
+    with pytest.raises(KeyError):
+        message.segment("ORC")
+
+
+def test_indexed_message_keeps_the_hl7_containers():
+    reference = hl7.parse(MESSAGES["oru"])
+    message = IndexedHl7Message(reference)
+
+    assert message.segment("MSH") is reference.segment("MSH")
+    assert str(message.segment("MSH")[9][0][1]) == "R01"
+    assert message.segments("OBX")[8] is reference.segments("OBX")[8]
+
+
+@pytest.mark.parametrize("name, tokenized", [("oru", True), ("orm", True), ("ack", False)])
+def test_tokenizer_handles_only_the_fast_parse_types(name, tokenized):
+    message = tokenize_hl7_message(MESSAGES[name].encode())
+
+    assert isinstance(message, LazyHl7Message) is tokenized
+
+
+def test_lazy_segment_is_split_on_first_access():
+    message = tokenize_hl7_message(MESSAGES["oru_histograms"])
+    obx = message.segments("OBX")[-1]
+
+    assert obx._fields is None
+    assert obx[0] == "OBX"
+    assert obx._fields is not None
+    assert message.segments("OBX")[0]._fields is None
@@ -0,0 +1,70 @@
+import pytest
+
+import hl7msghandel.hl7responder as hl7responder
+import hl7msghandel.hl7template as hl7template
+from hl7msghandel.hl7template import ByteTemplate, TimestampCache
+
+
+def test_render_fills_the_fields_and_the_static_values():
+    template = ByteTemplate("MSH|{application}|{timestamp}|\rMSA|{ack_code}|{msg_id}|\r", application="YourLIS")
+
+    assert template.fields == ("timestamp", "ack_code", "msg_id")
+    assert template.render(timestamp=b"20240101120000", ack_code="AA", msg_id=12) == (
+        b"MSH|YourLIS|20240101120000|\rMSA|AA|12|\r"
+    )
+
+
+def test_render_parts_splices_the_same_bytes():
+    template = ByteTemplate("\x0bPID|{patient_id}|{name}|\r\x1c\r")
+    values = {"patient_id": "100001", "name": "Ali"}
+
+    parts = template.render_parts(**values)
+
+    assert b"".join(parts) == template.render(**values) == b"\x0bPID|100001|Ali|\r\x1c\r"
+    assert parts[0] is template.parts[0]  # The static parts are not copied
+
+
+def test_render_encodes_utf8_and_keeps_percent_signs():
+    template = ByteTemplate("OBX|{name}|100%|{unit}")
+
+    assert template.render(name="علي", unit=b"%") == "OBX|علي|100%|%".encode()
+
+
+def test_render_without_a_field_value_raises():
+    template = ByteTemplate("MSA|{ack_code}|{msg_id}|")
+
+    with pytest.raises(KeyError):
+        template.render(ack_code="AA")
+    with pytest.raises(KeyError):
+        template.render_parts(msg_id="1")
+
+
+def test_timestamp_is_formatted_once_per_second(monkeypatch):
+    now = [1704110400.2]
+    monkeypatch.setattr(hl7template.time, "time", lambda: now[0])
+    timestamps = TimestampCache()
+
+    first = timestamps.now()
+    now[0] += 0.5
+    assert timestamps.now() is first
+
+    now[0] += 1
+    second = timestamps.now()
+    assert second != first
+    assert len(second) == 14 and second.isdigit()
+
+
+def test_response_templates_validate():
+    assert hl7responder.validate_response_templates() is True
+
+
+def test_broken_response_template_fails_validation(monkeypatch):
+    broken = ByteTemplate(
+        hl7responder.RESPONSE_HEADER + "MSA|{ack_code}|{msg_id}||||0|\r\x1c\r",
+        application=hl7responder.APPLICATION_NAME,
+        version=hl7responder.VERSION,
+        msg_type="ACK^A01",
+    )
+    monkeypatch.setattr(hl7responder, "ACK_TEMPLATE", broken)
+
+    assert hl7responder.validate_response_templates() is False
@@ -0,0 +1,115 @@
+import asyncio
+
+from server.journal import MessageJournal, RECORD_HEADER, MESSAGE_HEADER
+
+
+def hl7_message(msg_id, sender="KT-60"):
+    return f"\x0bMSH|^~\\&|{sender}|Genrui|||20240101120000||ORU^R01|{msg_id}|P|2.3.1\r\x1c\r".encode()
+
+
+def new_journal(directory, segment_size=8 * 1024 * 1024):
+    journal = MessageJournal(str(directory), segment_size, 64, 3, ["ORU^R01"])
+    journal.open()
+    return journal
+
+
+def pending_ids(journal):
+    return [record_id for record_id, _ in journal.pending_messages()]
+
+
+def record_size(msg_id):
+    return RECORD_HEADER.size + MESSAGE_HEADER.size + len(msg_id) + len(hl7_message(msg_id))
+
+
+def test_marks_in_a_done_segment_survive_reopen(tmp_path):
+    # Segment 1: messages 1 and 2. Segment 2: mark(1), messages 3 and 4.
+    # Segment 3: mark(3), mark(4), message 5. Segment 2 has no pending message
+    # left but holds the mark that resolved message 1 of the kept segment 1.
+    journal = new_journal(tmp_path, segment_size=2 * record_size("1"))
+
+    async def write():
+        await journal.write_message(hl7_message("1"))
+        await journal.write_message(hl7_message("2"))
+        journal.mark(1, True)
+        await journal.write_message(hl7_message("3"))
+        await journal.write_message(hl7_message("4"))
+        journal.mark(3, True)
+        journal.mark(4, True)
+        await journal.write_message(hl7_message("5"))
+
+    asyncio.run(write())
+    assert journal.stats()["segment"] == 3
+    assert pending_ids(journal) == [2, 5]
+    journal.close()
+
+    reopened = new_journal(tmp_path)
+    assert pending_ids(reopened) == [2, 5]
+    reopened.close()
+
+
+def test_done_segments_are_deleted_oldest_first(tmp_path):
+    journal = new_journal(tmp_path, segment_size=1)  # Every record starts a new segment
+
+    async def write():
+        for msg_id in ("1", "2", "3"):
+            await journal.write_message(hl7_message(msg_id))
+        journal.mark(2, True)
+        journal.mark(1, True)
+        journal.mark(3, True)
+        await journal.write_message(hl7_message("4"))
+
+    asyncio.run(write())
+    journal.close()
+
+    reopened = new_journal(tmp_path)
+    assert pending_ids(reopened) == [4]
+    assert len(list(tmp_path.iterdir())) < 7  # The resolved prefix was deleted
+    reopened.close()
+
+
+def test_failed_messages_are_replayed_after_reopen(tmp_path):
+    journal = new_journal(tmp_path)
+
+    async def write():
+        await journal.write_message(hl7_message("1"))
+        await journal.write_message(hl7_message("2"))
+        journal.mark(1, False)
+        journal.mark(2, True)
+
+    asyncio.run(write())
+    journal.close()
+
+    reopened = new_journal(tmp_path)
+    assert [(record_id, message) for record_id, message in reopened.pending_messages()] == [
+        (1, hl7_message("1"))
+    ]
+    reopened.close()
+
+
+def test_resent_message_replaces_the_pending_copy_of_the_same_sender(tmp_path):
+    journal = new_journal(tmp_path)
+
+    async def write():
+        await journal.write_message(hl7_message("7", sender="KT-60"))
+        await journal.write_message(hl7_message("7", sender="KT-60"))
+
+    asyncio.run(write())
+    assert pending_ids(journal) == [2]
+    assert journal.find("7", "KT-60 Genrui") == {"record_id": 2, "pending": True}
+    journal.close()
+
+
+def test_same_message_id_of_another_sender_is_kept(tmp_path):
+    journal = new_journal(tmp_path)
+
+    async def write():
+        await journal.write_message(hl7_message("7", sender="KT-60"))
+        await journal.write_message(hl7_message("7", sender="BC-5150"))
+
+    asyncio.run(write())
+    assert pending_ids(journal) == [1, 2]
+    journal.close()
+
+    reopened = new_journal(tmp_path)
+    assert pending_ids(reopened) == [1, 2]
+    reopened.close()
@@ -0,0 +1,109 @@
+from server.mllp_framer import MLLPFramer, NO_FRAMES
+from tools.bench_mllp_framer import split_random
+from tools.sample_messages import sample_traffic
+
+
+FRAME_1 = b"\x0bMSH|^~\\&|KT-60|Genrui|||20240101120000||ORU^R01|1|P|2.3.1\r\x1c\r"
+FRAME_2 = b"\x0bMSH|^~\\&|KT-60|Genrui|||20240101120001||ORM^O01|2|P|2.3.1\r\x1c\r"
+
+
+def feed_all(framer, chunks):
+    frames = []
+    for chunk in chunks:
+        frames.extend(framer.feed(chunk))
+    return frames
+
+
+def frame(data):
+    """
+    The frame as the framer returns it, without the trailing carriage return.
+    """
+    return data[: data.index(b"\x1c") + 1]
+
+
+def test_whole_frame_in_one_chunk():
+    framer = MLLPFramer()
+
+    assert framer.feed(FRAME_1) == [frame(FRAME_1)]
+    assert framer.pending == 0
+
+
+def test_several_frames_in_one_chunk():
+    framer = MLLPFramer()
+
+    assert framer.feed(FRAME_1 + FRAME_2) == [frame(FRAME_1), frame(FRAME_2)]
+
+
+def test_frame_split_byte_by_byte():
+    framer = MLLPFramer()
+    traffic = FRAME_1 + FRAME_2
+
+    frames = feed_all(framer, [traffic[i : i + 1] for i in range(len(traffic))])
+
+    assert frames == [frame(FRAME_1), frame(FRAME_2)]
+    assert framer.pending == 0
+
+
+def test_start_marker_alone_in_a_chunk():
+    framer = MLLPFramer()
+
+    assert framer.feed(b"\x0b") == NO_FRAMES
+    assert framer.pending == 1
+    assert framer.feed(FRAME_1[1:]) == [frame(FRAME_1)]
+
+
+def test_end_marker_alone_in_a_chunk():
+    framer = MLLPFramer()
+    end = FRAME_1.index(b"\x1c")
+
+    assert framer.feed(FRAME_1[:end]) == NO_FRAMES
+    assert framer.feed(b"\x1c") == [frame(FRAME_1)]
+    assert framer.feed(b"\r") == NO_FRAMES
+    assert framer.pending == 0
+
+
+def test_frame_end_and_next_start_in_the_same_chunk():
+    framer = MLLPFramer()
+    split = len(FRAME_1) + 10
+    traffic = FRAME_1 + FRAME_2
+
+    assert framer.feed(traffic[:20]) == NO_FRAMES
+    assert framer.feed(traffic[20:split]) == [frame(FRAME_1)]
+    assert framer.feed(traffic[split:]) == [frame(FRAME_2)]
+
+
+def test_garbage_before_the_start_marker_is_dropped():
+    framer = MLLPFramer()
+
+    assert framer.feed(b"noise\r\n") == NO_FRAMES
+    assert framer.pending == 0
+    assert framer.feed(b"more noise" + FRAME_1) == [frame(FRAME_1)]
+
+
+def test_end_marker_without_start_marker_is_dropped():
+    framer = MLLPFramer()
+
+    assert framer.feed(b"stray\x1c\r" + FRAME_1) == [frame(FRAME_1)]
+    assert framer.pending == 0
+
+
+def test_reset_drops_the_incomplete_frame():
+    framer = MLLPFramer()
+
+    framer.feed(FRAME_1[:10])
+    framer.reset()
+
+    assert framer.pending == 0
+    assert framer.feed(FRAME_2) == [frame(FRAME_2)]
+
+
+def test_sample_traffic_split_into_random_reads():
+    traffic = sample_traffic(20, histograms=True)
+    expected = [message + b"\x1c" for message in traffic.split(b"\x1c\r") if message]
+
+    for min_size, max_size in ((1, 64), (64, 1024), (4096, 65536)):
+        framer = MLLPFramer()
+        chunks = split_random(traffic, min_size, max_size, seed=1)
+
+        assert feed_all(framer, chunks) == expected
+        assert framer.pending == 0
@@ -0,0 +1,114 @@
+import asyncio
+
+from server.response_cache import ResponseCache, is_accepted_response
+
+
+def hl7_message(msg_id, value="13.9", sender="Genrui", msg_type="ORU^R01"):
+    return (
+        f"\x0bMSH|^~\\&|{sender}|KT-60|||20240101120000||{msg_type}|{msg_id}|P|2.3.1\r"
+        f"OBX|1|NM|718-7^HGB^LN||{value}|g/dL\r\x1c\r"
+    ).encode()
+
+
+def ack(msg_id, code="AA"):
+    return (f"\x0bMSH|^~\\&|YourLIS|1.0|||20240101120000||ACK^R01|{msg_id}|P|2.3.1\rMSA|{code}|{msg_id}\r\x1c\r".encode(), "sender")
+
+
+class Processor:
+    """
+    Counts the processed messages and answers each with the next queued ack code.
+    """
+
+    def __init__(self, *codes, release=None):
+        self.codes = list(codes) or ["AA"]
+        self.release = release  # Event the processing waits for
+        self.processed = []
+
+    async def __call__(self, message):
+        self.processed.append(message)
+        if self.release is not None:
+            await self.release.wait()
+        code = self.codes.pop(0) if len(self.codes) > 1 else self.codes[0]
+        return ack(len(self.processed), code)
+
+
+def new_cache():
+    return ResponseCache(max_size=16, ttl=60, message_types=["ORU^R01"])
+
+
+def test_resent_message_gets_the_first_response():
+    async def scenario():
+        cache = new_cache()
+        process = Processor()
+
+        first = await cache.respond(hl7_message("1"), process)
+        second = await cache.respond(hl7_message("1"), process)
+        return first, second, process
+
+    first, second, process = asyncio.run(scenario())
+
+    assert second is first
+    assert len(process.processed) == 1
+
+
+def test_same_msh10_with_another_body_is_processed():
+    async def scenario():
+        cache = new_cache()
+        process = Processor()
+
+        await cache.respond(hl7_message("1", value="13.9"), process)
+        await cache.respond(hl7_message("1", value="14.2"), process)
+        await cache.respond(hl7_message("1", sender="Mindray"), process)
+        return process
+
+    assert len(asyncio.run(scenario()).processed) == 3
+
+
+def test_copy_joins_the_message_in_flight():
+    async def scenario():
+        cache = new_cache()
+        process = Processor(release=asyncio.Event())
+
+        first = asyncio.create_task(cache.respond(hl7_message("1"), process))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.respond(hl7_message("1"), process))
+        await asyncio.sleep(0)
+        assert cache.stats()["in_flight"] == 1
+
+        process.release.set()
+        return await first, await second, process, cache.stats()
+
+    first, second, process, stats = asyncio.run(scenario())
+
+    assert second is first
+    assert len(process.processed) == 1
+    assert stats["joined"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_rejected_response_is_not_cached():
+    async def scenario():
+        cache = new_cache()
+        process = Processor("AE", "AA")
+
+        first = await cache.respond(hl7_message("1"), process)
+        second = await cache.respond(hl7_message("1"), process)
+        return first, second, process
+
+    first, second, process = asyncio.run(scenario())
+
+    assert not is_accepted_response(first)
+    assert is_accepted_response(second)
+    assert len(process.processed) == 2
+
+
+def test_other_message_types_are_not_cached():
+    async def scenario():
+        cache = new_cache()
+        process = Processor()
+
+        for _ in range(2):
+            await cache.respond(hl7_message("1", msg_type="ORM^O01"), process)
+        return process
+
+    assert len(asyncio.run(scenario()).processed) == 2
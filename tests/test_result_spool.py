@@ -0,0 +1,50 @@
+from server.result_spool import ResultSpool
+
+
+def hl7_message(msg_id):
+    return f"\x0bMSH|^~\\&|KT-60|Genrui|||20240101120000||ORU^R01|{msg_id}|P|2.3.1\r\x1c\r".encode()
+
+
+def open_spool(tmp_path):
+    spool = ResultSpool(str(tmp_path / "spool" / "results.sqlite3"))
+    spool.open()
+    return spool
+
+
+def test_pending_messages_are_returned_oldest_first(tmp_path):
+    spool = open_spool(tmp_path)
+    ids = [spool.add(hl7_message(msg_id)) for msg_id in ("1", "2", "3")]
+
+    assert [spool_id for spool_id, _ in spool.pending(10)] == ids
+    assert [spool_id for spool_id, _ in spool.pending(2)] == ids[:2]
+    assert spool.pending(10)[0][1] == hl7_message("1")
+    spool.close()
+
+
+def test_marked_messages_leave_the_pending_list(tmp_path):
+    spool = open_spool(tmp_path)
+    first, second, third = (spool.add(hl7_message(msg_id)) for msg_id in ("1", "2", "3"))
+
+    spool.mark(first, accepted=True)
+    spool.mark(second, accepted=False)
+
+    assert [spool_id for spool_id, _ in spool.pending(10)] == [third]
+    assert spool.stats()["pending"] == 1
+    assert [(entry["id"], entry["msg_id"], entry["sender"]) for entry in spool.rejected_messages()] == [
+        (second, "2", "KT-60 Genrui")
+    ]
+    spool.close()
+
+
+def test_pending_messages_survive_reopen(tmp_path):
+    spool = open_spool(tmp_path)
+    first = spool.add(hl7_message("1"))
+    second = spool.add(hl7_message("2"))
+    spool.mark(first, accepted=True)
+    spool.close()
+
+    reopened = open_spool(tmp_path)
+    assert reopened.has_pending
+    assert [spool_id for spool_id, _ in reopened.pending(10)] == [second]
+    assert reopened.add(hl7_message("3")) > second  # Ids are not reused
+    reopened.close()
@@ -0,0 +1,227 @@
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import pytest
+
+import database.result_writer as result_writer_module
+from database.circuit_breaker import DatabaseUnavailableError
+from database.result_writer import ResultWriter, wait_committed, ACK_AFTER_COMMIT, ACK_AFTER_JOURNAL
+
+
+class FakeCursor:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def executemany(self, sql, rows):
+        self.pool.run(sql, list(rows))
+
+    def execute(self, sql, values):
+        self.pool.run(sql, [values])
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.uncommitted = []
+
+    def statement_cursor(self, sql):
+        return FakeCursor(self.pool)
+
+    def discard_statement_cursor(self, sql):
+        pass
+
+    def commit(self):
+        self.pool.committed.extend(self.uncommitted)
+        self.uncommitted = []
+
+    def rollback(self):
+        self.uncommitted = []
+
+    def mark_broken(self):
+        self.pool.broken += 1
+
+
+class FakePool:
+    """
+    Stands in for db_pool: records the executemany calls and the committed rows.
+    """
+
+    def __init__(self, bad_values=(), unavailable=0, block=None):
+        self.bad_values = bad_values  # Rows whose write fails
+        self.unavailable = unavailable  # Checkouts that fail before the database is back, -1 for all
+        self.block = block  # Event the writes wait for
+        self.calls = []
+        self.committed = []
+        self.broken = 0
+        self._connection = None
+
+    @contextmanager
+    def connection(self):
+        if self.unavailable:
+            self.unavailable -= 1
+            raise DatabaseUnavailableError("Database is unavailable.")
+        self._connection = FakeConnection(self)
+        yield self._connection
+
+    def run(self, sql, rows):
+        if self.block is not None:
+            self.block.wait(5)
+        self.calls.append((sql, rows))
+        if any(values in self.bad_values for values in rows):
+            raise ValueError("Bad row")
+        self._connection.uncommitted.extend(rows)
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    def install(**kwargs):
+        pool = FakePool(**kwargs)
+        monkeypatch.setattr(result_writer_module, "db_pool", pool)
+        return pool
+
+    return install
+
+
+def new_writer(ack_mode=ACK_AFTER_COMMIT, batch_size=10, batch_interval=0, retry_interval=0.01):
+    return ResultWriter(batch_size, batch_interval, ack_mode, retry_interval)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.001)
+
+
+def test_submit_during_stop_is_refused_and_queued_results_are_written(fake_pool):
+    release = threading.Event()
+    pool = fake_pool(block=release)
+    writer = new_writer()
+    writer.start()
+
+    queued = writer.submit("INSERT A", (1,))
+    wait_until(lambda: writer.stats()["queued"] == 0)  # Taken by the writer, blocked in the write
+
+    stopping = threading.Thread(target=writer.stop)
+    stopping.start()
+    wait_until(lambda: writer._queue is None)
+
+    # A worker finishing after stop took the queue gets None and writes directly
+    assert writer.submit("INSERT A", (2,)) is None
+
+    release.set()
+    stopping.join(5)
+
+    assert not stopping.is_alive()
+    assert queued.result(timeout=1) is True
+    assert pool.committed == [(1,)]
+
+
+def test_submit_after_stop_returns_none(fake_pool):
+    fake_pool()
+    writer = new_writer()
+    writer.start()
+    writer.stop()
+
+    assert writer.submit("INSERT A", (1,)) is None
+
+
+def test_wait_committed_returns_none_after_the_timeout():
+    committed = Future()
+    assert wait_committed(committed, 0.01) is None
+
+    committed.set_result(False)
+    assert wait_committed(committed, 0.01) is False
+
+
+def queued(sql, values):
+    return (sql, values, Future())
+
+
+def test_runs_group_consecutive_statements_with_the_same_sql():
+    batch = [queued("A", (1,)), queued("A", (2,)), queued("B", (3,)), queued("A", (4,))]
+
+    assert ResultWriter._runs(batch) == [("A", [(1,), (2,)]), ("B", [(3,)]), ("A", [(4,)])]
+
+
+def test_mixed_batch_is_written_as_runs_in_one_transaction(fake_pool):
+    pool = fake_pool()
+    writer = new_writer()
+    batch = [queued("A", (1,)), queued("A", (2,)), queued("B", (3,))]
+
+    assert writer._write_batch(batch) is True
+
+    assert pool.calls == [("A", [(1,), (2,)]), ("B", [(3,)])]
+    assert pool.committed == [(1,), (2,), (3,)]
+    assert [future.result() for _, _, future in batch] == [True, True, True]
+    assert writer.stats()["batches"] == 1
+    assert writer.stats()["largest_batch"] == 3
+
+
+def test_bad_row_does_not_fail_the_rest_of_the_batch(fake_pool):
+    pool = fake_pool(bad_values=[(2,)])
+    writer = new_writer()
+    batch = [queued("A", (1,)), queued("A", (2,)), queued("A", (3,))]
+
+    assert writer._write_batch(batch) is True
+
+    # The batch is rolled back and each row written on its own
+    assert pool.committed == [(1,), (3,)]
+    assert [future.result() for _, _, future in batch] == [True, False, True]
+    assert writer.stats()["failed"] == 1
+    assert writer.stats()["rows"] == 2
+
+
+def test_unavailable_batch_is_not_written_row_by_row(fake_pool):
+    pool = fake_pool(unavailable=1)
+    writer = new_writer()
+    batch = [queued("A", (1,)), queued("A", (2,))]
+
+    assert writer._write_batch(batch) is False
+
+    assert pool.calls == []
+    assert not any(future.done() for _, _, future in batch)
+
+
+def test_batch_fails_at_once_when_acknowledged_after_commit(fake_pool):
+    fake_pool(unavailable=-1)
+    writer = new_writer(ACK_AFTER_COMMIT)
+    writer.start()
+
+    committed = writer.submit("A", (1,))
+
+    assert committed.result(timeout=5) is False
+    assert writer.stats()["retries"] == 0
+    writer.stop()
+
+
+def test_batch_is_retried_until_the_database_is_back(fake_pool):
+    pool = fake_pool(unavailable=2)
+    writer = new_writer(ACK_AFTER_JOURNAL)
+    writer.start()
+
+    committed = writer.submit("A", (1,))
+
+    assert committed.result(timeout=5) is True
+    assert pool.committed == [(1,)]
+    assert writer.stats()["retries"] == 2
+    assert writer.stats()["retrying"] is False
+    writer.stop()
+
+
+def test_stop_during_a_retry_fails_the_held_results(fake_pool):
+    fake_pool(unavailable=-1)
+    writer = new_writer(ACK_AFTER_JOURNAL, retry_interval=60)
+    writer.start()
+
+    committed = writer.submit("A", (1,))
+    wait_until(lambda: writer.is_retrying)
+
+    started = time.monotonic()
+    writer.stop()
+
+    assert time.monotonic() - started < 5  # Does not wait for the retry interval
+    assert committed.result(timeout=0) is False
+    assert writer.stats()["failed"] == 1
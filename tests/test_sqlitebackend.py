@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import pytest
+
+import database.sqlqueries as sqlqueries
+from database.sqldbdictionary import HGB_RESULT_SQL
+from database.sqlitebackend import (
+    SqliteBackend,
+    get_patient_info,
+    get_patient_cbc_result,
+    to_sqlite_date,
+    CBC_TEST_CODE,
+    HGB_TEST_CODE,
+)
+
+
+FIRST_DATE = datetime(2024, 1, 1, 8, 30, 0)
+SECOND_DATE = datetime(2024, 1, 2, 9, 45, 15)
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    backend = SqliteBackend(str(tmp_path / "patients.sqlite3"))
+    monkeypatch.setattr(sqlqueries, "get_db_backend", lambda: backend)
+
+    connection = backend.connect()
+    connection.executemany(
+        "INSERT INTO patientinfo (patientid, patientnamear, patientsex, patientage, patientageunit, requestdate)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            ("P1", "Ali Hassan", "M", 30, "Y", to_sqlite_date(FIRST_DATE)),
+            ("P2", "Sara Ahmed", "F", 25, "Y", to_sqlite_date(SECOND_DATE)),
+            ("P3", "Omar Ali", "M", 40, "Y", to_sqlite_date(SECOND_DATE)),
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO patienttest (patientid, testcode, resultfinsh, requestdate) VALUES (?, ?, ?, ?)",
+        [
+            ("P1", CBC_TEST_CODE, 0, to_sqlite_date(FIRST_DATE)),
+            ("P2", HGB_TEST_CODE, 1, to_sqlite_date(SECOND_DATE)),
+            ("P3", 999, 0, to_sqlite_date(SECOND_DATE)),  # Not a CBC or HGB request
+        ],
+    )
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def upsert_hgb(connection, values):
+    statement = sqlqueries.get_statement("upsert", HGB_RESULT_SQL, tuple(values))
+    connection.execute(statement.sql, tuple(values[key] for key in statement.columns))
+    connection.commit()
+
+
+def test_upsert_inserts_then_updates_the_row(connection):
+    values = {"PATIENT_ID": "P1", "REQ_DATE": to_sqlite_date(FIRST_DATE), "HGB": 12.5, "HCT": 38.0, "MCHC": 32.0}
+    upsert_hgb(connection, values)
+    upsert_hgb(connection, dict(values, HGB=13.1, MCHC=33.5))
+
+    rows = connection.execute("SELECT patientid, hgb, hct, mchc FROM cbc").fetchall()
+    assert rows == [("P1", 13.1, 38.0, 33.5)]
+
+
+def test_cbc_result_procedure_returns_the_dates_as_datetimes(connection):
+    upsert_hgb(connection, {"PATIENT_ID": "P1", "REQ_DATE": to_sqlite_date(FIRST_DATE), "HGB": 12.5})
+
+    rows = get_patient_cbc_result(connection, {"PATIENT_ID": "P1"})
+
+    assert len(rows) == 1
+    assert rows[0]["Patient ID"] == "P1"
+    assert rows[0]["Hemoglobin (HGB)"] == 12.5
+    assert rows[0]["Requested Date"] == FIRST_DATE
+    assert get_patient_cbc_result(connection, {"PATIENT_ID": "P9"}) == []
+
+
+def patient_ids(rows):
+    return [row["Patient ID"] for row in rows]
+
+
+def test_patient_info_lists_only_cbc_and_hgb_requests(connection):
+    rows = get_patient_info(connection, {})
+
+    assert patient_ids(rows) == ["P1", "P2"]  # Oldest request first
+    assert [row["Requested Test"] for row in rows] == ["CBC", "Hgb"]
+    assert [row["Result State"] for row in rows] == ["Pending", "Completed"]
+    assert rows[0]["Requested Date"] == FIRST_DATE
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ({"PATIENT_ID": "P2"}, ["P2"]),
+        ({"PATIENT_NAME": "Ali"}, ["P1"]),
+        ({"PATIENT_ID": "P2", "PATIENT_NAME": "Ali"}, ["P1", "P2"]),
+        ({"START_DATE": SECOND_DATE}, ["P2"]),
+        ({"END_DATE": FIRST_DATE}, ["P1"]),
+        ({"START_DATE": FIRST_DATE, "END_DATE": SECOND_DATE}, ["P1", "P2"]),
+        ({"RESULT_FINISHED": True}, ["P2"]),
+        ({"RESULT_FINISHED": False}, ["P1"]),
+    ],
+)
+def test_patient_info_filters(connection, values, expected):
+    assert patient_ids(get_patient_info(connection, values)) == expected
@@ -0,0 +1,126 @@
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+import database.sqlqueries as sqlqueries
+from database.sqlbackend import DIALECT_MSSQL, DIALECT_SQLITE
+from database.sqlqueries import get_statement, statement_cache_info, _bind_values
+from hl7msghandel.hl7fitsql import Hl7Values
+
+
+SCHEMA = {
+    "TABLE_NAME": "Results",
+    "COLUMN_NAME": {"PID": "PatientId", "TEST": "TestCode", "VALUE": "Value", "UNIT": "Unit"},
+    "CONDITION": {"PID": "PatientId", "TEST": "TestCode"},
+}
+
+
+def test_statement_is_built_once_per_schema():
+    columns = ("PID", "TEST", "VALUE")
+    statement = get_statement("upsert", SCHEMA, columns)
+    hits = statement_cache_info()["hits"]
+
+    assert get_statement("upsert", SCHEMA, columns) is statement
+    assert statement_cache_info()["hits"] == hits + 1
+
+    # The cache is keyed on the schema dictionary, not its content
+    misses = statement_cache_info()["misses"]
+    assert get_statement("upsert", copy.deepcopy(SCHEMA), columns) == statement
+    assert statement_cache_info()["misses"] == misses + 1
+
+
+RESULT_SCHEMA = {
+    "TABLE_NAME": "[cbc]",
+    "COLUMN_NAME": {
+        "PATIENT_ID": "[patientid]",
+        "HGB": "[hgb]",
+        "HCT": "[hct]",
+        "MCHC": "[mchc]",
+    },
+    "CONDITION": {"PATIENT_ID": "[patientid]", "REQ_DATE": "[requestdate]"},
+}
+
+
+@pytest.fixture(params=[DIALECT_MSSQL, DIALECT_SQLITE])
+def dialect(request, monkeypatch):
+    use_dialect(monkeypatch, request.param)
+    return request.param
+
+
+def use_dialect(monkeypatch, dialect):
+    monkeypatch.setattr(sqlqueries, "get_db_backend", lambda: SimpleNamespace(dialect=dialect))
+
+
+def hl7_values(columns, conditions):
+    return Hl7Values(tuple(columns), tuple(columns.values()), tuple(conditions), tuple(conditions.values()))
+
+
+def test_insert_leaves_out_the_missing_columns(dialect):
+    statement = get_statement("insert", RESULT_SCHEMA, ("PATIENT_ID", "HCT"))
+
+    table = "[dbo].[cbc]" if dialect == DIALECT_MSSQL else "[cbc]"
+    assert statement.sql == f"INSERT INTO {table} ([patientid], [hct]) VALUES (?, ?);"
+    assert statement.columns == ("PATIENT_ID", "HCT")
+    assert statement.conditions == ()
+
+
+def test_update_binds_the_columns_then_the_conditions(monkeypatch):
+    use_dialect(monkeypatch, DIALECT_MSSQL)
+    statement = get_statement("update", RESULT_SCHEMA, ("HGB", "MCHC"))
+
+    assert statement.sql == (
+        "UPDATE [dbo].[cbc] SET [hgb] = ?,[mchc] = ? WHERE [patientid] = ? and [requestdate] = ? ;"
+    )
+    assert statement.columns == ("HGB", "MCHC")
+    assert statement.conditions == ("PATIENT_ID", "REQ_DATE")
+
+
+def test_merge_upsert_sql_and_parameter_order(monkeypatch):
+    use_dialect(monkeypatch, DIALECT_MSSQL)
+    statement = get_statement("upsert", RESULT_SCHEMA, ("PATIENT_ID", "HGB", "MCHC"))
+
+    # The condition columns already among the columns are bound once
+    assert statement.sql == (
+        "MERGE [dbo].[cbc] WITH (HOLDLOCK) AS target "
+        "USING (SELECT ? AS [patientid], ? AS [hgb], ? AS [mchc], ? AS [requestdate]) AS source "
+        "ON target.[patientid] = source.[patientid] and target.[requestdate] = source.[requestdate] "
+        "WHEN MATCHED THEN UPDATE SET target.[hgb] = source.[hgb], target.[mchc] = source.[mchc] "
+        "WHEN NOT MATCHED THEN INSERT ([patientid], [hgb], [mchc]) "
+        "VALUES (source.[patientid], source.[hgb], source.[mchc]);"
+    )
+    assert statement.columns == ("PATIENT_ID", "HGB", "MCHC")
+    assert statement.conditions == ("REQ_DATE",)
+
+
+def test_sqlite_upsert_sql_and_parameter_order(monkeypatch):
+    use_dialect(monkeypatch, DIALECT_SQLITE)
+    statement = get_statement("upsert", RESULT_SCHEMA, ("PATIENT_ID", "HCT"))
+
+    assert statement.sql == (
+        "INSERT INTO [cbc] ([patientid], [hct], [requestdate]) VALUES (?, ?, ?) "
+        "ON CONFLICT ([patientid], [requestdate]) DO UPDATE SET [hct] = excluded.[hct];"
+    )
+    assert statement.columns == ("PATIENT_ID", "HCT")
+    assert statement.conditions == ("REQ_DATE",)
+
+
+def test_upsert_of_condition_columns_only(dialect):
+    statement = get_statement("upsert", RESULT_SCHEMA, ("PATIENT_ID",))
+
+    assert statement.columns == ("PATIENT_ID",)
+    assert statement.conditions == ("REQ_DATE",)
+    if dialect == DIALECT_SQLITE:
+        assert statement.sql.endswith("ON CONFLICT ([patientid], [requestdate]) DO NOTHING;")
+
+
+def test_values_are_bound_in_the_statement_order(dialect):
+    statement = get_statement("upsert", RESULT_SCHEMA, ("PATIENT_ID", "HGB", "MCHC"))
+
+    # The message order of the values does not matter
+    values = hl7_values(
+        {"MCHC": 33.1, "PATIENT_ID": "P1", "HGB": 14.2},
+        {"REQ_DATE": "2024-01-01", "PATIENT_ID": "P1"},
+    )
+
+    assert _bind_values(statement, values) == ("P1", 14.2, 33.1, "2024-01-01")
@@ -0,0 +1,68 @@
+from cache.ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entry_expires_after_the_ttl():
+    clock = FakeClock()
+    cache = TTLCache(max_size=4, ttl=10, clock=clock)
+    cache.put("a", 1)
+
+    clock.now = 9.9
+    assert cache.get("a") == 1
+
+    clock.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_put_restarts_the_ttl():
+    clock = FakeClock()
+    cache = TTLCache(max_size=4, ttl=10, clock=clock)
+    cache.put("a", 1)
+
+    clock.now = 8
+    cache.put("a", 2)
+    clock.now = 15
+    assert cache.get("a") == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2, ttl=10, clock=FakeClock())
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_zero_size_cache_keeps_nothing():
+    cache = TTLCache(max_size=0, ttl=10, clock=FakeClock())
+    cache.put("a", 1)
+
+    assert cache.get("a", "missing") == "missing"
+
+
+def test_pop_and_stats():
+    cache = TTLCache(max_size=4, ttl=10, clock=FakeClock())
+    cache.put("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "missing") == "missing"
+
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["hit_ratio"]) == (0, 1, 1, 0.5)
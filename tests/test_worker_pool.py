@@ -0,0 +1,72 @@
+import asyncio
+import threading
+
+import pytest
+
+from server.worker_pool import MessageWorkerPool, WorkerPoolFullError
+
+
+def test_jobs_beyond_workers_and_queue_are_rejected():
+    async def scenario():
+        pool = MessageWorkerPool(workers=2, queue_size=1)
+        pool.start()
+        release = threading.Event()
+
+        jobs = [asyncio.create_task(pool.run(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0)  # The three jobs are accepted
+
+        with pytest.raises(WorkerPoolFullError):
+            await pool.run(release.wait, 5)
+        stats = pool.stats()
+
+        release.set()
+        await asyncio.gather(*jobs)
+        pool.shutdown(wait=True)
+        return stats, pool.stats()
+
+    busy, done = asyncio.run(scenario())
+
+    assert (busy["active"], busy["queued"], busy["rejected"]) == (2, 1, 1)
+    assert (done["active"], done["queued"], done["completed"]) == (0, 0, 3)
+
+
+def test_slot_is_released_once_a_timed_out_job_finishes():
+    async def scenario():
+        pool = MessageWorkerPool(workers=1, queue_size=0)
+        pool.start()
+        release = threading.Event()
+
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(release.wait, 5, timeout=0.01)
+
+        # The worker is still running the job, its slot is taken
+        with pytest.raises(WorkerPoolFullError):
+            await pool.run(sum, (1, 2))
+
+        release.set()
+        pool.shutdown(wait=True)
+        pool.start()
+        result = await pool.run(sum, (1, 2))
+        pool.shutdown(wait=True)
+        return result, pool.stats()
+
+    result, stats = asyncio.run(scenario())
+
+    assert result == 3
+    assert (stats["timed_out"], stats["rejected"], stats["completed"]) == (1, 1, 2)
+
+
+def test_failed_job_raises_and_is_counted():
+    def fail():
+        raise ValueError("bad message")
+
+    async def scenario():
+        pool = MessageWorkerPool(workers=1, queue_size=1)
+        with pytest.raises(ValueError):
+            await pool.run(fail)
+        pool.shutdown(wait=True)
+        return pool.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert (stats["failed"], stats["completed"], stats["queued"]) == (1, 0, 0)
@@ -0,0 +1,158 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import database.sqlqueries as sqlqueries
+import database.worklist as worklist_module
+from database.sqlbackend import DIALECT_SQLITE
+from database.sqldbdictionary import WORKLIST_SQL
+from database.worklist import Worklist
+
+
+def row(patient_id, day):
+    return {
+        "PATIENT_ID": patient_id,
+        "TEST_DATE": datetime(2024, 1, day),
+        "NAME": f"Patient {patient_id}",
+        "SEX": "Male",
+        "AGE": 30,
+        "AGE_UNIT": "Years",
+        "REQ_DATE": datetime(2024, 1, day),
+    }
+
+
+class FakeSelect:
+    """
+    Stands in for data_worklist_for, returns the queued results in order.
+    """
+
+    def __init__(self, *results, during=None):
+        self.results = list(results)
+        self.during = during  # Called while the rows are being selected
+        self.watermarks = []
+
+    def __call__(self, db_schema, condition_data, watermark=None):
+        self.watermarks.append(watermark)
+        if self.during is not None:
+            self.during()
+        return self.results.pop(0)
+
+
+@pytest.fixture
+def select(monkeypatch):
+    def install(*results, during=None):
+        fake = FakeSelect(*results, during=during)
+        monkeypatch.setattr(worklist_module, "data_worklist_for", fake)
+        return fake
+
+    return install
+
+
+def new_worklist():
+    return Worklist(refresh_interval=5, reload_interval=300)
+
+
+def test_load_translates_the_rows_and_sets_the_watermark(select):
+    fake = select([row("P1", 1), row("P2", 3), row("P3", 2)])
+    worklist = new_worklist()
+
+    assert worklist.load() is True
+
+    assert fake.watermarks == [None]
+    assert worklist.watermark == datetime(2024, 1, 3)
+    assert worklist.get("P1") == {
+        "NAME": "Patient P1",
+        "SEX": "M",
+        "AGE": 30,
+        "AGE_UNIT": "1",
+        "REQ_DATE": datetime(2024, 1, 1),
+    }
+    assert worklist.get("P9") is None
+    assert worklist.stats()["size"] == 3
+
+
+def test_failed_load_keeps_the_worklist_unloaded(select):
+    select(None)
+    worklist = new_worklist()
+
+    assert worklist.load() is False
+    assert not worklist.is_loaded
+    assert worklist.stats()["failures"] == 1
+
+
+def test_refresh_selects_from_the_watermark_and_only_moves_it_forward(select):
+    fake = select([row("P1", 2)], [row("P2", 3)], [row("P3", 1)], [])
+    worklist = new_worklist()
+    worklist.load()
+
+    worklist.refresh()
+    assert worklist.watermark == datetime(2024, 1, 3)
+
+    worklist.refresh()  # An older row does not move the watermark back
+    assert worklist.watermark == datetime(2024, 1, 3)
+
+    worklist.refresh()
+    assert fake.watermarks == [None, datetime(2024, 1, 2), datetime(2024, 1, 3), datetime(2024, 1, 3)]
+    assert [worklist.get(patient_id) is not None for patient_id in ("P1", "P2", "P3")] == [True, True, True]
+    assert worklist.stats()["refreshes"] == 3
+
+
+def test_invalidate_drops_the_entry(select):
+    select([row("P1", 1), row("P2", 1)])
+    worklist = new_worklist()
+    worklist.load()
+
+    worklist.invalidate("P1")
+
+    assert worklist.get("P1") is None
+    assert worklist.get("P2") is not None
+
+
+def test_invalidation_during_load_keeps_the_entry_out(select):
+    worklist = new_worklist()
+    select([row("P1", 1), row("P2", 1)], during=lambda: worklist.invalidate("P1"))
+
+    worklist.load()
+
+    # The selected row may predate the result written for it
+    assert worklist.get("P1") is None
+    assert worklist.get("P2") is not None
+
+
+def test_invalidation_during_refresh_keeps_the_entry_out(select):
+    worklist = new_worklist()
+    fake = select([row("P2", 1)], [row("P1", 2)])
+    worklist.load()
+
+    fake.during = lambda: worklist.invalidate("P1")
+    worklist.refresh()
+
+    assert worklist.get("P1") is None
+    assert worklist.watermark == datetime(2024, 1, 2)
+
+
+def test_invalidation_before_a_load_does_not_hide_the_new_rows(select):
+    worklist = new_worklist()
+    select([row("P1", 1)], [row("P1", 2)])
+    worklist.load()
+
+    worklist.invalidate("P1")
+    worklist.load()  # Selected after the result was written, the row is current
+
+    assert worklist.get("P1") is not None
+    assert worklist._invalidated == {}
+
+
+def test_worklist_statement_adds_the_watermark_condition(monkeypatch):
+    monkeypatch.setattr(sqlqueries, "get_db_backend", lambda: SimpleNamespace(dialect=DIALECT_SQLITE))
+
+    full = sqlqueries.get_statement("worklist", WORKLIST_SQL)
+    refresh = sqlqueries.get_statement("worklist", WORKLIST_SQL, ("WATERMARK",))
+
+    assert full.conditions == ("RESULT_STATE",)
+    assert refresh.conditions == ("RESULT_STATE", "WATERMARK")
+    assert "t.[requestdate] >= ?" not in full.sql
+    assert refresh.sql.endswith("and t.[requestdate] >= ? ORDER BY t.[requestdate];")
+    assert "INNER JOIN [patientinfo] j ON j.[patientid] = t.[patientid]" in full.sql
+    assert full.selected == ("PATIENT_ID", "TEST_DATE", "NAME", "SEX", "AGE", "AGE_UNIT", "REQ_DATE")
@@ -0,0 +1,15 @@
+"""
+Analyzer simulator and load generator for the MLLP server.
+
+Opens N concurrent connections acting as Genrui KT-60 analyzers that send ORM^O01
+queries and ORU^R01 CBC results at a configurable rate, whole, fragmented or
+coalesced on the wire, and reports the ACK/ORR round-trip percentiles and the
+throughput. By default the server is started in-process against a fake database
+or a new SQLite file, so nothing but this machine is needed.
+
+Usage:
+    python -m tools.analyzer_sim [--connections N] [--rate PER_SECOND] [--duration SECONDS]
+                                 [--framing whole|fragmented|coalesced|mixed] [--db fake|sqlite] [--db-latency-ms MS]
+                                 [--write-behind off|commit|journal]
+    python -m tools.analyzer_sim --host 192.168.1.103 --port 5000 ...   # A running server
+"""
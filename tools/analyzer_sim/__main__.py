@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import logging
+import socket
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from log.log_config import APPLICATION_NAME
+from tools.analyzer_sim import __doc__ as USAGE
+from tools.analyzer_sim.analyzer import Analyzer, LatencyStats, FRAMING_MODES, FRAMING_MIXED
+
+LOCAL_HOST = "127.0.0.1"
+
+# Requested samples created per analyzer in the SQLite database when the count is open ended
+SQLITE_SEED_SAMPLES = 20000
+
+
+def free_port():
+    """
+    Returns a TCP port that is currently free on the local host.
+    """
+    with socket.socket() as sock:
+        sock.bind((LOCAL_HOST, 0))
+        return sock.getsockname()[1]
+
+
+def seed_sqlite(backend, patient_ids):
+    """
+    Creates the patients and their CBC requests in the SQLite database.
+    """
+    from database.sqlitebackend import SQLITE_DATE_FORMAT
+    from setting.config import get_config
+
+    cbc_test_code = get_config()["CBC_TEST_CODE"]
+    request_date = datetime.now().strftime(SQLITE_DATE_FORMAT)
+
+    connection = backend.connect()
+    try:
+        connection.executemany(
+            "INSERT OR REPLACE INTO patientinfo VALUES (?, ?, ?, ?, ?, ?)",
+            ((patient_id, f"Patient {patient_id}", "Male", 30, "Years", request_date) for patient_id in patient_ids),
+        )
+        connection.executemany(
+            "INSERT INTO patienttest (patientid, testcode, resultfinsh, requestdate) VALUES (?, ?, 0, ?)",
+            ((patient_id, cbc_test_code, request_date) for patient_id in patient_ids),
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+async def start_local_server(args, work_dir, patient_ids):
+    """
+    Starts the MLLP server in this process against the fake or a new SQLite database.
+
+    Returns:
+        tuple: The port the server listens on and the database backend.
+    """
+    # Imported here so a run against a remote server does not load the server modules
+    from database.sqlconnection import db_pool, set_db_backend
+    from database.sqlitebackend import SqliteBackend
+    from server.journal import message_journal
+    from server.result_spool import result_spool
+    from database.result_writer import result_writer
+    from server.server import start_server
+    from tools.analyzer_sim.fake_db import FakeDatabase
+
+    if args.db == "sqlite":
+        backend = SqliteBackend(os.path.join(work_dir, "patients.sqlite3"))
+        seed_sqlite(backend, patient_ids)
+    else:
+        backend = FakeDatabase(args.db_latency_ms / 1000)
+
+    set_db_backend(backend)
+    db_pool.configure(health_check_after=float("inf"))
+    message_journal.directory = os.path.join(work_dir, "journal")  # Do not touch the journal of the real server
+    result_spool.path = os.path.join(work_dir, "spool.sqlite3")  # Nor its result spool
+
+    if args.write_behind != "off":
+        result_writer.start(ack_mode=args.write_behind)  # Stopped with the server
+
+    port = free_port()
+    started, message = await start_server(LOCAL_HOST, port)
+    if not started:
+        raise SystemExit(f"Could not start the server: {message}")
+    return port, backend
+
+
+def print_report(stats, elapsed, connections):
+    print(f"\n{connections} analyzers, {elapsed:.1f} s, {stats.sent} frames sent")
+    print(f"{'request':>10} {'count':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for request_type, row in stats.summary().items():
+        print(
+            f"{request_type:>10} {row['count']:>8} {row['p50']:>9.2f} {row['p90']:>9.2f}"
+            f" {row['p99']:>9.2f} {row['max']:>9.2f}"
+        )
+    print(f"Throughput: {stats.completed / elapsed:.1f} responses/s, {stats.sent / elapsed:.1f} frames/s")
+
+    if stats.errors:
+        print("Errors:")
+        for kind, count in stats.errors.most_common():
+            print(f"  {kind}: {count}")
+
+
+async def run(args):
+    host, port = args.host, args.port
+    server_stats = None
+
+    with tempfile.TemporaryDirectory(prefix="analyzer_sim_") as work_dir:
+        stats = LatencyStats()
+        analyzers = [
+            Analyzer(
+                number,
+                LOCAL_HOST if host is None else host,
+                port,
+                stats,
+                rate=args.rate,
+                samples=args.samples,
+                framing=args.framing,
+                max_fragment=args.max_fragment,
+                timeout=args.timeout,
+                histograms=args.histograms,
+            )
+            for number in range(1, args.connections + 1)
+        ]
+
+        if host is None:
+            samples = args.samples or (int(args.rate * args.duration) + 1 if args.rate else SQLITE_SEED_SAMPLES)
+            patient_ids = [
+                str(analyzer.first_patient_id + sample) for analyzer in analyzers for sample in range(samples)
+            ]
+            port, backend = await start_local_server(args, work_dir, patient_ids)
+            for analyzer in analyzers:
+                analyzer.port = port
+
+            if args.db == "sqlite":
+                print(f"In-process server on {LOCAL_HOST}:{port}, SQLite database with {len(patient_ids)} requests")
+            else:
+                print(f"In-process server on {LOCAL_HOST}:{port}, fake database latency {args.db_latency_ms} ms")
+
+        started = time.monotonic()
+        deadline = started + args.duration
+        await asyncio.gather(*(analyzer.run(deadline) for analyzer in analyzers))
+        elapsed = time.monotonic() - started
+
+        if args.host is None:
+            from server.server import stop_server
+            from server.worker_pool import worker_pool
+
+            server_stats = worker_pool.stats()
+            await stop_server()
+            server_stats["statements"] = getattr(backend, "statements", None)
+
+    print_report(stats, elapsed, args.connections)
+    if server_stats:
+        print(
+            f"Server: {server_stats['completed']} messages processed, {server_stats['failed']} failed,"
+            f" {server_stats['rejected']} rejected, {server_stats['timed_out']} timed out"
+            + (f", {server_stats['statements']} database statements" if server_stats["statements"] else "")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=USAGE.strip().splitlines()[0], formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", help="Server address, the server is started in-process when omitted")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=4, help="Simulated analyzers")
+    parser.add_argument("--rate", type=float, default=1.0, help="Samples per second per analyzer, 0 for no pause")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--samples", type=int, help="Stop each analyzer after this many samples")
+    parser.add_argument("--framing", choices=FRAMING_MODES, default=FRAMING_MIXED)
+    parser.add_argument("--max-fragment", type=int, default=64, help="Largest write of a fragmented frame")
+    parser.add_argument("--histograms", action="store_true", help="Send the histogram bitmaps with the results")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds to wait for a response")
+    parser.add_argument("--db", choices=("fake", "sqlite"), default="fake", help="Database of the in-process server")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="Fake database time per statement")
+    parser.add_argument(
+        "--write-behind",
+        choices=("off", "commit", "journal"),
+        default="off",
+        help="Batch the result writes of the in-process server, acknowledged after commit or after journal",
+    )
+    parser.add_argument("--log-level", default="WARNING", help="Level of the server log while running")
+    args = parser.parse_args()
+
+    logging.getLogger(APPLICATION_NAME).setLevel(args.log_level.upper())  # Measure the server, not the log
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
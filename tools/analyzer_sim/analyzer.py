@@ -0,0 +1,286 @@
+"""
+Simulated Genrui KT-60 analyzers and the latency statistics they collect.
+
+Each analyzer keeps one TCP connection open and runs the conversation of the real
+device for every sample: ORM^O01 query -> ORR^O02 patient info -> ACK^O02, then
+ORU^R01 result -> ACK^R01. The round trip of every query and result is timed from
+the first byte written to the complete response frame.
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+
+from server.mllp_framer import MLLPFramer
+from server.journal import read_msh_fields
+from tools.sample_messages import orm_o01_message, oru_r01_message, ack_o02_message
+
+# How the frames of a sample are written to the socket
+FRAMING_WHOLE = "whole"  # One write per frame
+FRAMING_FRAGMENTED = "fragmented"  # Every frame split into random small writes
+FRAMING_COALESCED = "coalesced"  # The ACK^O02 and the ORU^R01 in a single write
+FRAMING_MIXED = "mixed"  # A random one of the above per sample
+
+FRAMING_MODES = (FRAMING_WHOLE, FRAMING_FRAGMENTED, FRAMING_COALESCED, FRAMING_MIXED)
+
+# Expected response of each request
+RESPONSE_TYPES = {"ORM^O01": "ORR^O02", "ORU^R01": "ACK^R01"}
+
+READ_SIZE = 4096
+
+
+def percentile(sorted_samples, fraction):
+    """
+    Returns the nearest-rank percentile of already sorted samples.
+    """
+    if not sorted_samples:
+        return 0.0
+    index = max(0, int(round(fraction * len(sorted_samples))) - 1)
+    return sorted_samples[min(index, len(sorted_samples) - 1)]
+
+
+def read_ack_code(frame):
+    """
+    Returns the MSA-1 acknowledgment code of a response frame, None when missing.
+    """
+    start = frame.find(b"MSA|")
+    if start == -1:
+        return None
+    return frame[start + 4 : start + 6].decode(errors="replace")
+
+
+class LatencyStats:
+    """
+    Round-trip times and errors collected by all the analyzers of a run.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)  # request type -> round trips in seconds
+        self.errors = Counter()
+        self.sent = 0  # Frames written, including the ACK^O02 that get no response
+
+    def add(self, request_type, seconds):
+        self.samples[request_type].append(seconds)
+
+    def add_error(self, kind):
+        self.errors[kind] += 1
+
+    @property
+    def completed(self):
+        return sum(len(samples) for samples in self.samples.values())
+
+    def summary(self):
+        """
+        Returns the count and the p50/p90/p99/max round trip in milliseconds per request type.
+        """
+        summary = {}
+        for request_type, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            summary[request_type] = {
+                "count": len(ordered),
+                "p50": percentile(ordered, 0.50) * 1000,
+                "p90": percentile(ordered, 0.90) * 1000,
+                "p99": percentile(ordered, 0.99) * 1000,
+                "max": ordered[-1] * 1000,
+            }
+        return summary
+
+
+class Analyzer:
+    """
+    One simulated analyzer connection.
+
+    Example:
+        analyzer = Analyzer(1, "127.0.0.1", 5000, stats, rate=2)
+        await analyzer.run(time.monotonic() + 10)
+    """
+
+    def __init__(
+        self,
+        number,
+        host,
+        port,
+        stats,
+        rate=0.0,
+        samples=None,
+        framing=FRAMING_WHOLE,
+        max_fragment=64,
+        timeout=10.0,
+        histograms=False,
+    ):
+        """
+        Args:
+            number (int): The analyzer number, also selects its range of sample ids.
+            host (str): The MLLP server address.
+            port (int): The MLLP server port.
+            stats (LatencyStats): Where the round trips are recorded.
+            rate (float): Samples per second, 0 sends the next sample as soon as the last is answered.
+            samples (int): Stop after this many samples, None runs until the deadline.
+            framing (str): One of FRAMING_MODES.
+            max_fragment (int): Largest write when a frame is fragmented.
+            timeout (float): Seconds to wait for a response before reconnecting.
+            histograms (bool): Send the histogram bitmaps with the results.
+        """
+        self.number = number
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.rate = rate
+        self.samples = samples
+        self.framing = framing
+        self.max_fragment = max_fragment
+        self.timeout = timeout
+        self.histograms = histograms
+
+        self.random = random.Random(number)
+        self.first_patient_id = 100000 * number
+        self.next_msg_id = 1
+
+        self._writer = None
+        self._responses = None
+        self._read_task = None
+
+    async def run(self, deadline):
+        """
+        Sends samples until the deadline (time.monotonic) or the sample count is reached.
+        """
+        started = time.monotonic()
+        if self.rate:
+            # Spread the analyzers over the first interval instead of sending in lockstep
+            started += self.random.random() / self.rate
+
+        sample = 0
+        try:
+            while self.samples is None or sample < self.samples:
+                if self.rate:
+                    delay = started + sample / self.rate - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                if time.monotonic() >= deadline:
+                    break
+
+                try:
+                    if self._writer is None:
+                        await self.connect()
+                    await self.send_sample(str(self.first_patient_id + sample))
+                except (ConnectionError, OSError) as e:
+                    self.stats.add_error(type(e).__name__)
+                    await self.disconnect()
+                    await asyncio.sleep(0.5)  # Do not spin while the server is down
+                sample += 1
+        finally:
+            await self.disconnect()
+
+    async def connect(self):
+        reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        self._responses = asyncio.Queue()
+        self._read_task = asyncio.create_task(self.read_responses(reader, self._responses))
+
+    async def disconnect(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self._writer = None
+
+    @staticmethod
+    async def read_responses(reader, responses):
+        """
+        Frames the server responses, None is queued when the connection is closed.
+        """
+        framer = MLLPFramer()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                for frame in framer.feed(data):
+                    responses.put_nowait((time.perf_counter(), frame))
+        except (ConnectionError, OSError):
+            pass
+        responses.put_nowait(None)
+
+    async def send_sample(self, patient_id):
+        """
+        Runs the query and result conversation of one sample.
+        """
+        framing = self.framing
+        if framing == FRAMING_MIXED:
+            framing = self.random.choice(FRAMING_MODES[:-1])
+
+        query_id = self.new_msg_id()
+        query = orm_o01_message(patient_id, query_id).encode()
+        if not await self.request("ORM^O01", query, framing):
+            return
+
+        ack = ack_o02_message(query_id).encode()
+        result = oru_r01_message(patient_id, self.new_msg_id(), histograms=self.histograms).encode()
+
+        self.stats.sent += 1  # The ACK^O02 gets no response
+        if framing == FRAMING_COALESCED:
+            await self.request("ORU^R01", ack + result, framing)
+        else:
+            await self.write(ack, framing)
+            await self.request("ORU^R01", result, framing)
+
+    async def request(self, request_type, data, framing):
+        """
+        Writes a request and waits for its response.
+
+        Returns:
+            bool: True when the expected response was received.
+        """
+        self.stats.sent += 1
+        started = time.perf_counter()
+        await self.write(data, framing)
+
+        try:
+            response = await asyncio.wait_for(self._responses.get(), self.timeout)
+        except asyncio.TimeoutError:
+            # A late response would be taken for the next one, start over
+            self.stats.add_error(f"{request_type} timeout")
+            await self.disconnect()
+            return False
+
+        if response is None:
+            raise ConnectionResetError("Connection closed by the server")
+
+        received, frame = response
+        self.stats.add(request_type, received - started)
+
+        response_type, _ = read_msh_fields(frame)
+        if response_type != RESPONSE_TYPES[request_type]:
+            self.stats.add_error(f"{request_type} answered with {response_type}")
+            return False
+        if read_ack_code(frame) != "AA":
+            self.stats.add_error(f"{request_type} rejected")
+            return False
+        return True
+
+    async def write(self, data, framing):
+        """
+        Writes data to the server, in random small pieces when fragmented.
+        """
+        if framing != FRAMING_FRAGMENTED:
+            self._writer.write(data)
+            await self._writer.drain()
+            return
+
+        offset = 0
+        while offset < len(data):
+            size = self.random.randint(1, self.max_fragment)
+            self._writer.write(data[offset : offset + size])
+            await self._writer.drain()
+            await asyncio.sleep(0)  # Let the pieces leave as separate segments
+            offset += size
+
+    def new_msg_id(self):
+        msg_id = f"{self.number}{self.next_msg_id:06d}"
+        self.next_msg_id += 1
+        return msg_id
@@ -0,0 +1,144 @@
+"""
+In-memory stand-in for the LIS database used by the analyzer simulator.
+
+Answers the statements built by database/sqlqueries.py as if every sample had a
+CBC request waiting, and keeps the stored results so a resent result is seen as
+already existing. Each statement can cost a fixed round-trip time.
+"""
+
+import time
+from datetime import date
+from threading import Lock
+
+from database.sqlbackend import DatabaseBackend, DIALECT_MSSQL
+from setting.config import get_config
+
+cfg = get_config()  # Load configuration from file
+CBC_TEST_CODE = cfg["CBC_TEST_CODE"]
+TEST_FINISH_CODE = cfg["TEST_FINISH_CODE"]
+
+PATIENT_NAME = "Simulated Patient"
+
+
+class FakeDatabase(DatabaseBackend):
+    """
+    A database backend keeping the shared state of all fake connections.
+    The statements are answered as built for SQL Server.
+
+    Example:
+        set_db_backend(FakeDatabase(latency=0.002))
+    """
+
+    name = "fake"
+    dialect = DIALECT_MSSQL
+
+    def __init__(self, latency=0.0):
+        self.latency = latency  # Seconds slept per statement
+        self.results = {}  # patient id -> stored result values
+        self.statements = 0
+        self._lock = Lock()
+
+    def connect(self):
+        """
+        Opens a new connection, used as the connection factory of db_pool.
+        """
+        return FakeConnection(self)
+
+    def execute(self, sql, values):
+        """
+        Runs a statement and returns the rows it selects.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        return self._execute(sql, values)
+
+    def executemany(self, sql, rows):
+        """
+        Runs a statement once per row in a single round trip, like pyodbc fast_executemany.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        for values in rows:
+            self._execute(sql, values)
+
+    def _execute(self, sql, values):
+        statement = sql.lstrip().upper()
+        patient_id = values[0] if values else None
+
+        with self._lock:
+            self.statements += 1
+
+            if statement.startswith("SELECT 1"):
+                return [(1,)]  # Health check
+
+            if " INNER JOIN " in statement:
+                return []  # Worklist, the requests are not listed and each query finds its own
+
+            if statement.startswith("SELECT TOP 1"):
+                # Combined result lookup: test code, finished, patient exists, name, date, result exists
+                return [
+                    (
+                        CBC_TEST_CODE,
+                        TEST_FINISH_CODE,
+                        1,
+                        PATIENT_NAME,
+                        date.today().isoformat(),
+                        int(patient_id in self.results),
+                    )
+                ]
+
+            if statement.startswith("SELECT"):
+                # Patient info: name, sex, age, age unit, request date
+                return [(PATIENT_NAME, "Male", "30", "Years", date.today().isoformat())]
+
+            if statement.startswith(("MERGE", "INSERT", "UPDATE")):
+                self.results[patient_id] = values
+            elif statement.startswith("DELETE"):
+                self.results.pop(patient_id, None)
+
+            return []
+
+
+class FakeConnection:
+    """
+    A pyodbc like connection to a FakeDatabase.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    """
+    A pyodbc like cursor, only the methods used by querie_exe are provided.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.description = None
+        self._rows = []
+
+    def execute(self, sql, values=()):
+        self._rows = self.database.execute(sql, values)
+
+    def executemany(self, sql, rows):
+        self.database.executemany(sql, rows)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
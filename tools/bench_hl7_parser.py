@@ -0,0 +1,103 @@
+"""
+Micro-benchmark for the HL7 parsing done for each inbound message.
+
+Parses generated ORU^R01 results and ORM^O01 queries with hl7.parse (indexed by
+IndexedHl7Message) and with the lazy tokenizer, reads the values of the
+extraction plans used by the responder from both, and reports the time per
+message of each. The run stops if the two disagree on any extracted value.
+
+Usage:
+    python -m tools.bench_hl7_parser [--messages N] [--rounds N]
+"""
+
+import argparse
+import logging
+import time
+
+from hl7 import parse
+
+from log.log_config import APPLICATION_NAME
+from hl7msghandel.hl7dictionary import (
+    CBC_RESULT_PLAN,
+    HGB_RESULT_PLAN,
+    RESULT_LOOKUP_PLAN,
+    RESULT_EXIST_PLAN,
+    PATIENT_INFO_ORM_PLAN,
+)
+from hl7msghandel.hl7fitsql import apply_hl7_plan
+from hl7msghandel.hl7message import IndexedHl7Message
+from hl7msghandel.hl7tokenizer import tokenize_hl7_message
+from tools.sample_messages import oru_r01_message, orm_o01_message
+
+ORU_PLANS = (RESULT_LOOKUP_PLAN, RESULT_EXIST_PLAN, CBC_RESULT_PLAN, HGB_RESULT_PLAN)
+ORM_PLANS = (PATIENT_INFO_ORM_PLAN,)
+
+
+def hl7_parse(raw_message):
+    return IndexedHl7Message(parse(raw_message))
+
+
+def read_plans(parser, messages, plans):
+    """
+    Parses each message and extracts the values of the plans, like the responder does.
+    """
+    values = []
+    for raw_message in messages:
+        hl7_message = parser(raw_message)
+        values.append([apply_hl7_plan(hl7_message, plan) for plan in plans])
+    return values
+
+
+def run(parser, messages, plans, rounds):
+    """
+    Runs a parser over the messages and returns the best time and the extracted values.
+    """
+    best = None
+    values = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        values = read_plans(parser, messages, plans)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=500, help="Generated messages of each kind")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger(APPLICATION_NAME).setLevel(logging.WARNING)  # Measure the parsing, not the log
+
+    cases = (
+        ("ORU^R01", ORU_PLANS, lambda number, patient_id: oru_r01_message(patient_id, str(number))),
+        (
+            "ORU^R01+hist",
+            ORU_PLANS,
+            lambda number, patient_id: oru_r01_message(patient_id, str(number), histograms=True),
+        ),
+        ("ORM^O01", ORM_PLANS, lambda number, patient_id: orm_o01_message(patient_id, str(number))),
+    )
+
+    print(f"{'message':>14} {'bytes':>7} {'hl7.parse us/msg':>17} {'tokenizer us/msg':>17} {'speedup':>8}")
+
+    for name, plans, build in cases:
+        # The server hands the parser the frame bytes
+        messages = [build(number, str(100000 + number)).encode() for number in range(args.messages)]
+
+        parse_time, parse_values = run(hl7_parse, messages, plans, args.rounds)
+        tokenizer_time, tokenizer_values = run(tokenize_hl7_message, messages, plans, args.rounds)
+
+        if parse_values != tokenizer_values:
+            raise SystemExit(f"Parsers disagree on the values extracted from {name}")
+
+        print(
+            f"{name:>14} {len(messages[0]):>7} "
+            f"{parse_time / len(messages) * 1e6:>17.2f} {tokenizer_time / len(messages) * 1e6:>17.2f} "
+            f"{parse_time / tokenizer_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
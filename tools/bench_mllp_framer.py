@@ -0,0 +1,121 @@
+"""
+Micro-benchmark for the MLLP framer used by the client handler.
+
+Feeds captured (or generated) analyzer traffic split into random chunk sizes to the
+previous find/slice/del framing loop and to `MLLPFramer`, and reports the time per
+frame of each.
+
+Usage:
+    python -m tools.bench_mllp_framer [--capture FILE] [--messages N] [--histograms] [--rounds N]
+"""
+
+import argparse
+import random
+import time
+
+from server.mllp_framer import MLLPFramer, MESSAGE_START_MARKER, MESSAGE_END_MARKER
+from tools.sample_messages import sample_traffic
+
+
+def legacy_framer(chunks):
+    """
+    The framing loop previously used inline in handle_client_connection.
+    """
+    buffer = bytearray()
+    frames = []
+    for data in chunks:
+        buffer.extend(data)
+        while True:
+            start_index = buffer.find(MESSAGE_START_MARKER)
+            end_index = buffer.find(MESSAGE_END_MARKER, start_index)
+            if start_index == -1 or end_index == -1:
+                break
+            frames.append(bytes(buffer[start_index : end_index + 1]))
+            del buffer[: end_index + 1]
+    return frames
+
+
+def incremental_framer(chunks):
+    """
+    The same stream framed with MLLPFramer.
+    """
+    framer = MLLPFramer()
+    frames = []
+    for data in chunks:
+        frames.extend(framer.feed(data))
+    return frames
+
+
+def split_random(traffic, min_size, max_size, seed):
+    """
+    Splits the traffic into chunks of random sizes, like successive socket reads.
+    """
+    rng = random.Random(seed)
+    view = memoryview(traffic)
+    chunks = []
+    offset = 0
+    while offset < len(traffic):
+        size = rng.randint(min_size, max_size)
+        chunks.append(bytes(view[offset : offset + size]))
+        offset += size
+    return chunks
+
+
+def run(function, chunks, rounds):
+    """
+    Runs a framer over the chunks and returns the best time and the frames.
+    """
+    best = None
+    frames = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        frames = function(chunks)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capture", help="Raw MLLP traffic captured from an analyzer")
+    parser.add_argument("--messages", type=int, default=500, help="Generated patients when no capture is given")
+    parser.add_argument("--histograms", action="store_true", help="Generate results with histogram bitmaps")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, "rb") as file:
+            traffic = file.read()
+    else:
+        traffic = sample_traffic(args.messages, histograms=args.histograms)
+
+    print(f"Traffic: {len(traffic)} bytes")
+    print(f"{'chunk sizes':>16} {'frames':>8} {'legacy us/frame':>16} {'framer us/frame':>16} {'speedup':>8}")
+
+    # 4096-4096: every read filled up to BUFFER_SIZE_LIMIT, as on a busy connection
+    for min_size, max_size in (
+        (1, 64),
+        (64, 1024),
+        (1024, 4096),
+        (4096, 4096),
+        (4096, 65536),
+        (len(traffic), len(traffic)),
+    ):
+        chunks = split_random(traffic, min_size, max_size, args.seed)
+        legacy_time, legacy_frames = run(legacy_framer, chunks, args.rounds)
+        framer_time, framer_frames = run(incremental_framer, chunks, args.rounds)
+
+        if legacy_frames != framer_frames:
+            raise SystemExit("Framers disagree on the extracted frames")
+
+        count = max(len(framer_frames), 1)
+        print(
+            f"{f'{min_size}-{max_size}':>16} {len(framer_frames):>8} "
+            f"{legacy_time / count * 1e6:>16.2f} {framer_time / count * 1e6:>16.2f} "
+            f"{legacy_time / framer_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
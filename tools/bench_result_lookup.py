@@ -0,0 +1,130 @@
+"""
+Benchmark for the ORU^R01 database lookup.
+
+Compares the three separate SELECTs previously run by handel_result_message
+(test waiting list, patient info, result exists) with the single combined
+`data_lookup_for` query, against a fake connection that adds a fixed network
+round-trip time to every statement.
+
+Usage:
+    python -m tools.bench_result_lookup [--rtt-ms MS] [--messages N]
+"""
+
+import argparse
+import logging
+import time
+
+from log.log_config import APPLICATION_NAME
+from database.sqlconnection import db_pool
+from database.sqlqueries import data_select_for, data_lookup_for
+from database.sqldbdictionary import (
+    PATIENT_TEST_SQL,
+    PATIENT_INFO_SQL,
+    RESULT_EXIST_SQL,
+    RESULT_LOOKUP_SQL,
+)
+from hl7msghandel.hl7dictionary import (
+    PATIENT_TEST_PLAN,
+    PATIENT_INFO_ORU_PLAN,
+    RESULT_EXIST_PLAN,
+    RESULT_LOOKUP_PLAN,
+)
+from hl7msghandel.hl7parser import parse_hl7_message
+from tools.sample_messages import oru_r01_message
+
+
+class LatencyCursor:
+    """
+    Cursor that answers every SELECT with one row after sleeping for the round-trip time.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+
+    def execute(self, sql, values=()):
+        self.connection.round_trips += 1
+        time.sleep(self.connection.rtt)
+
+    def fetchall(self):
+        return [(56, False, 1, "Patient", "2025-01-01", 0)]
+
+    def close(self):
+        pass
+
+
+class LatencyConnection:
+    """
+    Connection whose statements each cost one network round trip.
+    """
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.round_trips = 0
+
+    def cursor(self):
+        return LatencyCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def separate_selects(hl7_message):
+    """
+    The lookups previously run one after another by handel_result_message.
+    """
+    data_select_for(PATIENT_TEST_SQL, PATIENT_TEST_PLAN, hl7_message)
+    data_select_for(PATIENT_INFO_SQL, PATIENT_INFO_ORU_PLAN, hl7_message)
+    data_select_for(RESULT_EXIST_SQL, RESULT_EXIST_PLAN, hl7_message)
+
+
+def combined_lookup(hl7_message):
+    """
+    The single query now used by handel_result_message.
+    """
+    data_lookup_for(RESULT_LOOKUP_SQL, RESULT_LOOKUP_PLAN, hl7_message)
+
+
+def run(function, messages, connection):
+    """
+    Runs a lookup for every message and returns (ms per message, round trips per message).
+    """
+    connection.round_trips = 0
+    started = time.perf_counter()
+    for hl7_message in messages:
+        function(hl7_message)
+    elapsed = time.perf_counter() - started
+    return elapsed / len(messages) * 1000, connection.round_trips / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="Simulated network round trip per statement")
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.getLogger(APPLICATION_NAME).setLevel(logging.WARNING)  # Measure the database, not the log
+
+    connection = LatencyConnection(args.rtt_ms / 1000)
+    db_pool.configure(connect=lambda: connection, health_check_after=float("inf"))
+
+    messages = [
+        parse_hl7_message(oru_r01_message(str(100000 + number), str(number)), "Benchmark")
+        for number in range(args.messages)
+    ]
+
+    print(f"Simulated round trip: {args.rtt_ms} ms, messages: {args.messages}")
+    print(f"{'lookup':>18} {'ms/message':>12} {'round trips':>12}")
+    for name, function in (("separate SELECTs", separate_selects), ("combined lookup", combined_lookup)):
+        per_message, round_trips = run(function, messages, connection)
+        print(f"{name:>18} {per_message:>12.3f} {round_trips:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
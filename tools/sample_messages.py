@@ -0,0 +1,150 @@
+"""
+Sample HL7 traffic as sent by a Genrui KT-60 hematology analyzer.
+
+The messages are framed with the MLLP start/end markers exactly as they arrive on
+the wire and are used by the benchmarks and the analyzer simulator.
+"""
+
+import base64
+import random
+from datetime import datetime
+
+MLLP_START = "\x0b"
+MLLP_END = "\x1c\r"
+
+SENDER_NAME = "Genrui"
+SENDER_VERSION = "KT-60"
+
+# OBX order used by the analyzer (must match the indexes in hl7dictionary.py)
+CBC_OBX_VALUES = (
+    ("6690-2", "WBC", "7.25", "10*9/L", "4.00-10.00"),
+    ("731-0", "LYM#", "2.10", "10*9/L", "0.80-4.00"),
+    ("8.0-0", "MID#", "0.45", "10*9/L", "0.10-1.50"),
+    ("751-8", "GRAN#", "4.70", "10*9/L", "2.00-7.00"),
+    ("736-9", "LYM%", "29.0", "%", "20.0-40.0"),
+    ("5905-5", "MID%", "6.2", "%", "3.0-15.0"),
+    ("770-8", "GRAN%", "64.8", "%", "50.0-70.0"),
+    ("789-8", "RBC", "4.82", "10*12/L", "3.50-5.50"),
+    ("718-7", "HGB", "13.9", "g/dL", "11.0-16.0"),
+    ("4544-3", "HCT", "41.6", "%", "37.0-54.0"),
+    ("787-2", "MCV", "86.3", "fL", "80.0-100.0"),
+    ("785-6", "MCH", "28.8", "pg", "27.0-34.0"),
+    ("786-4", "MCHC", "33.4", "g/dL", "32.0-36.0"),
+    ("788-0", "RDW-CV", "13.1", "%", "11.0-16.0"),
+    ("21000-5", "RDW-SD", "44.2", "fL", "35.0-56.0"),
+    ("777-3", "PLT", "256", "10*9/L", "100-300"),
+    ("32623-1", "MPV", "9.4", "fL", "6.5-12.0"),
+    ("32207-3", "PDW", "16.2", "", "9.0-17.0"),
+    ("10002-3", "PCT", "0.240", "%", "0.108-0.282"),
+    ("48386-7", "P-LCR", "23.5", "%", "11.0-45.0"),
+)
+
+
+def timestamp():
+    """
+    Returns the current time in HL7 format.
+    """
+    return datetime.now().strftime("%Y%m%d%H%M%S")
+
+
+# Histograms sent as base64 bitmaps after the numeric results
+HISTOGRAM_NAMES = ("WBC Histogram", "RBC Histogram", "PLT Histogram")
+HISTOGRAM_SIZE = 8 * 1024
+
+
+def histogram_data(seed, size=HISTOGRAM_SIZE):
+    """
+    Returns a base64 blob the size of an analyzer histogram bitmap.
+    """
+    rng = random.Random(seed)
+    return base64.b64encode(bytes(rng.getrandbits(8) for _ in range(size))).decode()
+
+
+def oru_r01_message(patient_id, msg_id, values=CBC_OBX_VALUES, histograms=False):
+    """
+    Builds an ORU^R01 CBC result message for a patient.
+
+    Args:
+        patient_id (str): The sample / patient id (PID-3).
+        msg_id (str): The message control id (MSH-10).
+        values (tuple): The OBX rows as (code, name, value, unit, range).
+        histograms (bool): Append the WBC/RBC/PLT histogram bitmaps.
+
+    Returns:
+        str: The MLLP framed HL7 message.
+    """
+    segments = [
+        f"MSH|^~\\&|{SENDER_NAME}|{SENDER_VERSION}|||{timestamp()}||ORU^R01|{msg_id}|P|2.3.1||||||UNICODE",
+        f"PID|1||{patient_id}|||||M",
+        f"OBR|1||{patient_id}|00001^Automated Count^99MRC||{timestamp()}|{timestamp()}|||||||{timestamp()}||||||||||HM||||||||Genrui",
+    ]
+    for index, (code, name, value, unit, range_) in enumerate(values, start=1):
+        segments.append(
+            f"OBX|{index}|NM|{code}^{name}^LN||{value}|{unit}|{range_}|N|||F"
+        )
+    if histograms:
+        for index, name in enumerate(HISTOGRAM_NAMES, start=len(values) + 1):
+            segments.append(
+                f"OBX|{index}|ED|{15000 + index}^{name}^99MRC||^Image^BMP^Base64^{histogram_data(index)}||||||F"
+            )
+
+    return MLLP_START + "\r".join(segments) + "\r" + MLLP_END
+
+
+def orm_o01_message(patient_id, msg_id):
+    """
+    Builds an ORM^O01 sample query sent when a tube is loaded.
+
+    Args:
+        patient_id (str): The sample / patient id (ORC-3).
+        msg_id (str): The message control id (MSH-10).
+
+    Returns:
+        str: The MLLP framed HL7 message.
+    """
+    segments = [
+        f"MSH|^~\\&|{SENDER_NAME}|{SENDER_VERSION}|||{timestamp()}||ORM^O01|{msg_id}|P|2.3.1||||||UNICODE",
+        f"ORC|RF||{patient_id}||IP",
+        "OBX|1|IS|08001^Take Mode^99MRC||O||||||F",
+    ]
+
+    return MLLP_START + "\r".join(segments) + "\r" + MLLP_END
+
+
+def ack_o02_message(msg_id):
+    """
+    Builds the ACK^O02 the analyzer sends after receiving the ORR^O02 patient info.
+
+    Args:
+        msg_id (str): The message control id of the ORR^O02 being acknowledged.
+
+    Returns:
+        str: The MLLP framed HL7 message.
+    """
+    segments = [
+        f"MSH|^~\\&|{SENDER_NAME}|{SENDER_VERSION}|||{timestamp()}||ACK^O02|{msg_id}|P|2.3.1||||||UNICODE",
+        f"MSA|AA|{msg_id}",
+    ]
+
+    return MLLP_START + "\r".join(segments) + "\r" + MLLP_END
+
+
+def sample_traffic(count, first_patient_id=100000, histograms=False):
+    """
+    Builds a stream of alternating ORM^O01 queries and ORU^R01 results.
+
+    Args:
+        count (int): Number of patients in the stream.
+        first_patient_id (int): The first sample id.
+        histograms (bool): Include the histogram bitmaps in the results.
+
+    Returns:
+        bytes: The concatenated MLLP frames.
+    """
+    frames = []
+    for number in range(count):
+        patient_id = str(first_patient_id + number)
+        frames.append(orm_o01_message(patient_id, str(2 * number + 1)))
+        frames.append(oru_r01_message(patient_id, str(2 * number + 2), histograms=histograms))
+
+    return "".join(frames).encode()